@@ -0,0 +1,180 @@
+"""Local stand-in for the SNS and SQS calls the services make.
+
+One HTTP server answers both APIs, so boto3 can be pointed at it with
+``AWS_ENDPOINT_URL``:
+
+- SNS (query protocol): ``Publish``. Every published message is delivered to
+  each queue subscribed to the topic as an SNS notification envelope, with
+  its message attributes, the way SNS delivers to SQS.
+- SQS (JSON protocol): ``GetQueueUrl``, ``SendMessage``, ``ReceiveMessage``,
+  ``DeleteMessage``.
+
+State is kept in memory; ``published`` counts publishes per topic.
+"""
+import hashlib
+import json
+import threading
+import uuid
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+from xml.sax.saxutils import escape
+
+ACCOUNT_ID = '000000000000'
+REGION = 'us-east-1'
+
+
+class AwsStandIn:
+    def __init__(self, host='127.0.0.1', port=0):
+        self._server = ThreadingHTTPServer((host, port), _handler(self))
+        self._server.daemon_threads = True
+        self._thread = None
+        self._lock = threading.Lock()
+        self.url = f'http://{host}:{self._server.server_address[1]}'
+        self.subscriptions = {}
+        self.queues = {}
+        self.published = {}
+
+    def topic(self, name):
+        return f'arn:aws:sns:{REGION}:{ACCOUNT_ID}:{name}'
+
+    def queue(self, name, topic_arn=None):
+        """Create a queue, subscribed to ``topic_arn`` if given; returns its URL."""
+        url = f'{self.url}/{ACCOUNT_ID}/{name}'
+        with self._lock:
+            self.queues.setdefault(url, {})
+            if topic_arn:
+                self.subscriptions.setdefault(topic_arn, []).append(url)
+        return url
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name='aws-standin', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def publish(self, topic_arn, message, attributes):
+        message_id = str(uuid.uuid4())
+        envelope = json.dumps({
+            'Type': 'Notification',
+            'MessageId': message_id,
+            'TopicArn': topic_arn,
+            'Message': message,
+            'Timestamp': datetime.now(timezone.utc).isoformat(timespec='milliseconds').replace('+00:00', 'Z'),
+            'MessageAttributes': {
+                name: {'Type': value.get('DataType', 'String'), 'Value': value.get('StringValue')}
+                for name, value in attributes.items()
+            }
+        })
+        with self._lock:
+            self.published[topic_arn] = self.published.get(topic_arn, 0) + 1
+            queues = list(self.subscriptions.get(topic_arn, ()))
+        for url in queues:
+            self.send(url, envelope, {})
+        return message_id
+
+    def send(self, url, body, attributes):
+        message_id = str(uuid.uuid4())
+        with self._lock:
+            if url not in self.queues:
+                raise KeyError(url)
+            self.queues[url][message_id] = {
+                'MessageId': message_id,
+                'ReceiptHandle': message_id,
+                'MD5OfBody': hashlib.md5(body.encode()).hexdigest(),
+                'Body': body,
+                'MessageAttributes': attributes
+            }
+        return message_id
+
+    def receive(self, url, max_messages=1):
+        with self._lock:
+            messages = list(self.queues[url].values())[:max_messages]
+        return messages
+
+    def delete(self, url, receipt_handle):
+        with self._lock:
+            self.queues[url].pop(receipt_handle, None)
+
+
+def _sns_attributes(form):
+    attributes = {}
+    index = 1
+    while f'MessageAttributes.entry.{index}.Name' in form:
+        prefix = f'MessageAttributes.entry.{index}'
+        attributes[form[f'{prefix}.Name']] = {
+            'DataType': form.get(f'{prefix}.Value.DataType', 'String'),
+            'StringValue': form.get(f'{prefix}.Value.StringValue')
+        }
+        index += 1
+    return attributes
+
+
+def _handler(standin):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, format, *args):
+            pass
+
+        def _reply(self, status, body, content_type):
+            body = body.encode()
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get('Content-Length') or 0)).decode()
+            target = self.headers.get('X-Amz-Target')
+            if target and target.startswith('AmazonSQS.'):
+                self._sqs(target.split('.', 1)[1], json.loads(body or '{}'))
+            else:
+                self._sns({key: values[0] for key, values in parse_qs(body).items()})
+
+        def _sns(self, form):
+            if form.get('Action') != 'Publish':
+                self._reply(400, '<ErrorResponse><Error><Type>Sender</Type><Code>InvalidAction</Code>'
+                                 f'<Message>{escape(str(form.get("Action")))} is not supported</Message></Error>'
+                                 '</ErrorResponse>', 'text/xml')
+                return
+            message_id = standin.publish(form.get('TopicArn'), form.get('Message', ''), _sns_attributes(form))
+            self._reply(200, '<PublishResponse xmlns="http://sns.amazonaws.com/doc/2010-03-31/">'
+                             f'<PublishResult><MessageId>{message_id}</MessageId></PublishResult>'
+                             f'<ResponseMetadata><RequestId>{uuid.uuid4()}</RequestId></ResponseMetadata>'
+                             '</PublishResponse>', 'text/xml')
+
+        def _sqs(self, action, data):
+            try:
+                if action == 'GetQueueUrl':
+                    url = f"{standin.url}/{ACCOUNT_ID}/{data['QueueName']}"
+                    if url not in standin.queues:
+                        raise KeyError(url)
+                    result = {'QueueUrl': url}
+                elif action == 'SendMessage':
+                    body = data['MessageBody']
+                    result = {
+                        'MessageId': standin.send(data['QueueUrl'], body, data.get('MessageAttributes') or {}),
+                        'MD5OfMessageBody': hashlib.md5(body.encode()).hexdigest()
+                    }
+                elif action == 'ReceiveMessage':
+                    result = {'Messages': standin.receive(data['QueueUrl'], data.get('MaxNumberOfMessages', 1))}
+                elif action == 'DeleteMessage':
+                    standin.delete(data['QueueUrl'], data['ReceiptHandle'])
+                    result = {}
+                else:
+                    self._reply(400, json.dumps({'__type': 'InvalidAction', 'message': f'{action} is not supported'}),
+                                'application/x-amz-json-1.0')
+                    return
+            except KeyError:
+                self._reply(400, json.dumps({'__type': 'com.amazonaws.sqs#QueueDoesNotExist',
+                                             'message': 'The specified queue does not exist.'}),
+                            'application/x-amz-json-1.0')
+                return
+            self._reply(200, json.dumps(result), 'application/x-amz-json-1.0')
+
+    return Handler
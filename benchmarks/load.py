@@ -0,0 +1,323 @@
+"""End-to-end load test of the five services.
+
+Boots the stack (see ``stack.py``), seeds restaurants with menus and
+delivery agents, then runs complete customer flows from --concurrency
+threads:
+
+    register -> login -> browse restaurants -> read a menu -> order -> pay
+    -> dispatch -> picked up -> delivered -> track the order
+
+Each flow is a new customer with their own card, so velocity limits are not
+what is measured. The first --warmup flows are not recorded. Prints
+p50/p95/p99 latency, errors and throughput per endpoint. --output writes the
+same numbers as JSON, to keep as a baseline; --compare checks a run against
+such a baseline and exits with status 1 if an endpoint's p95 (and p99, given
+100 samples) grew, its throughput fell, or its error rate rose by more than
+--tolerance. --server gunicorn serves every service under Gunicorn instead of
+the Werkzeug server.
+
+Usage:
+    python benchmarks/load.py --concurrency 8 --flows 200 --output baseline.json
+    python benchmarks/load.py --concurrency 8 --flows 200 --compare baseline.json
+    python benchmarks/load.py --concurrency 8 --flows 200 --server gunicorn
+"""
+import argparse
+import itertools
+import json
+import math
+import os
+import platform
+import random
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+import requests
+
+from stack import SERVERS, Stack
+
+CITY_CENTRE = (40.7128, -74.0060)
+CATEGORIES = ('mains', 'sides', 'drinks', 'desserts')
+
+
+class FlowError(Exception):
+    pass
+
+
+class Client:
+    """A requests session that records the latency of every call under its endpoint label."""
+
+    def __init__(self, samples):
+        self.session = requests.Session()
+        self.samples = samples
+        self.token = None
+
+    def call(self, label, method, url, expect, **kwargs):
+        if self.token:
+            kwargs.setdefault('headers', {})['Authorization'] = f'Bearer {self.token}'
+        start = time.perf_counter()
+        try:
+            response = self.session.request(method, url, timeout=30, **kwargs)
+        except requests.exceptions.RequestException as e:
+            self.samples.append((label, time.perf_counter() - start, False))
+            raise FlowError(f'{label}: {str(e)}')
+        ok = response.status_code == expect
+        self.samples.append((label, time.perf_counter() - start, ok))
+        if not ok:
+            raise FlowError(f'{label}: {response.status_code} {response.text[:200]}')
+        return response
+
+    def sign_up(self, urls, role, rng):
+        email = f'{role}-{uuid.uuid4().hex}@load.test'
+        self.call('POST /api/users/register', 'POST', f"{urls['user-service']}/api/users/register", 201, json={
+            'email': email, 'password': 'load-test-password', 'first_name': 'Load',
+            'last_name': f'{role.title()}{rng.randrange(10000)}', 'role': role
+        })
+        login = self.call('POST /api/users/login', 'POST', f"{urls['user-service']}/api/users/login", 200,
+                          json={'email': email, 'password': 'load-test-password'}).json()
+        self.token = login['access_token']
+        return login['user']
+
+
+def near_centre(rng, spread=0.05):
+    return CITY_CENTRE[0] + rng.uniform(-spread, spread), CITY_CENTRE[1] + rng.uniform(-spread, spread)
+
+
+def seed(urls, restaurants, items_per_restaurant, drivers, rng):
+    """Restaurants with menus and available delivery agents; returns what the flows need."""
+    owner = Client([])
+    owner.sign_up(urls, 'restaurant_owner', rng)
+    menus = {}
+    for number in range(restaurants):
+        latitude, longitude = near_centre(rng)
+        restaurant = owner.call('POST /api/restaurants', 'POST', f"{urls['restaurant-service']}/api/restaurants", 201,
+                                json={
+                                    'name': f'Load Test Kitchen {number}', 'address': f'{number} Load Street',
+                                    'phone_number': f'555-{number:04d}', 'email': f'kitchen-{uuid.uuid4().hex}@load.test',
+                                    'cuisine_type': rng.choice(('pizza', 'sushi', 'tacos', 'curry')),
+                                    'latitude': latitude, 'longitude': longitude
+                                }).json()
+        menus[restaurant['id']] = [
+            owner.call('POST /api/restaurants/<id>/menu', 'POST',
+                       f"{urls['restaurant-service']}/api/restaurants/{restaurant['id']}/menu", 201, json={
+                           'name': f'Dish {item}', 'price': round(rng.uniform(4, 30), 2),
+                           'category': CATEGORIES[item % len(CATEGORIES)]
+                       }).json()['id']
+            for item in range(items_per_restaurant)
+        ]
+
+    agents = {}
+    for _ in range(drivers):
+        driver = Client([])
+        driver.sign_up(urls, 'delivery_person', rng)
+        agent = driver.call('POST /api/delivery/agents', 'POST', f"{urls['delivery-service']}/api/delivery/agents",
+                            201, json={'vehicle_type': 'bicycle'}).json()
+        latitude, longitude = near_centre(rng)
+        driver.call('PUT /api/delivery/agents/location', 'PUT',
+                    f"{urls['delivery-service']}/api/delivery/agents/location", 200,
+                    json={'latitude': latitude, 'longitude': longitude})
+        agents[agent['id']] = driver.token
+    return {'menus': menus, 'agents': agents}
+
+
+def customer_flow(urls, world, rng, samples):
+    """One customer from sign-up to a delivered order; returns how it ended."""
+    customer = Client(samples)
+    customer.sign_up(urls, 'customer', rng)
+    restaurants = customer.call('GET /api/restaurants/', 'GET', f"{urls['restaurant-service']}/api/restaurants/",
+                                200).json()
+    restaurant_id = rng.choice([restaurant['id'] for restaurant in restaurants if restaurant['id'] in world['menus']])
+    menu = customer.call('GET /api/restaurants/<id>/menu', 'GET',
+                         f"{urls['restaurant-service']}/api/restaurants/{restaurant_id}/menu", 200).json()
+    latitude, longitude = near_centre(rng)
+    order = customer.call('POST /api/orders/', 'POST', f"{urls['order-service']}/api/orders/", 201, json={
+        'restaurant_id': restaurant_id,
+        'items': [{'menu_item_id': item['id'], 'quantity': rng.randint(1, 3)}
+                  for item in rng.sample(menu, min(len(menu), rng.randint(1, 3)))],
+        'delivery_address': f'{rng.randrange(1, 999)} Customer Avenue',
+        'delivery_latitude': latitude, 'delivery_longitude': longitude
+    }).json()
+    customer.call('POST /api/payments/', 'POST', f"{urls['payment-service']}/api/payments/", 201, json={
+        'order_id': order['id'], 'payment_method': 'card', 'order_quote': order.get('payment_quote'),
+        'payment_details': {'card_brand': 'visa', 'card_last4': f'{rng.randrange(10000):04d}',
+                            'card_exp_month': rng.randint(1, 12), 'card_exp_year': 2030, 'device_id': uuid.uuid4().hex}
+    })
+    task = customer.call('POST /api/delivery/tasks', 'POST', f"{urls['delivery-service']}/api/delivery/tasks", 201,
+                         json={'order_id': order['id']}).json()
+    if task['status'] != 'assigned':
+        return 'unassigned'
+    driver = Client(samples)
+    driver.token = world['agents'][task['agent_id']]
+    for status in ('picked_up', 'delivered'):
+        driver.call('PUT /api/delivery/tasks/<id>/status', 'PUT',
+                    f"{urls['delivery-service']}/api/delivery/tasks/{task['id']}/status", 200, json={'status': status})
+    customer.call('GET /api/orders/<id>', 'GET', f"{urls['order-service']}/api/orders/{order['id']}", 200)
+    return 'delivered'
+
+
+def run_flows(urls, world, count, concurrency, seed_value, duration=None):
+    """Run ``count`` flows (or as many as fit in ``duration`` seconds) from ``concurrency`` threads."""
+    counter = itertools.count()
+    lock = threading.Lock()
+    samples, flows, outcomes = [], [], {}
+    deadline = time.monotonic() + duration if duration else None
+
+    def worker(number):
+        rng = random.Random(f'{seed_value}-{number}')
+        while True:
+            with lock:
+                index = next(counter)
+            if (deadline is None and index >= count) or (deadline is not None and time.monotonic() >= deadline):
+                return
+            flow_samples = []
+            start = time.perf_counter()
+            try:
+                outcome = customer_flow(urls, world, rng, flow_samples)
+            except FlowError as e:
+                outcome = f"failed at {str(e).split(':', 1)[0]}"
+            elapsed = time.perf_counter() - start
+            with lock:
+                samples.extend(flow_samples)
+                flows.append((elapsed, outcome == 'delivered'))
+                outcomes[outcome] = outcomes.get(outcome, 0) + 1
+
+    threads = [threading.Thread(target=worker, args=(number,)) for number in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples, flows, outcomes, time.perf_counter() - start
+
+
+def percentile(ordered, p):
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)] if ordered else None
+
+
+def summarise(timings, errors, elapsed):
+    ordered = sorted(timings)
+    return {
+        'count': len(ordered),
+        'errors': errors,
+        'p50_ms': round(percentile(ordered, 50) * 1000, 2) if ordered else None,
+        'p95_ms': round(percentile(ordered, 95) * 1000, 2) if ordered else None,
+        'p99_ms': round(percentile(ordered, 99) * 1000, 2) if ordered else None,
+        'throughput_rps': round(len(ordered) / elapsed, 2)
+    }
+
+
+def build_report(samples, flows, outcomes, elapsed, meta):
+    by_label = {}
+    for label, seconds, ok in samples:
+        entry = by_label.setdefault(label, ([], [0]))
+        entry[0].append(seconds)
+        if not ok:
+            entry[1][0] += 1
+    return {
+        'meta': meta,
+        'elapsed_s': round(elapsed, 2),
+        'flows': dict(summarise([seconds for seconds, _ in flows], sum(1 for _, ok in flows if not ok), elapsed),
+                      outcomes=outcomes),
+        'endpoints': {label: summarise(timings, errors[0], elapsed)
+                      for label, (timings, errors) in sorted(by_label.items())}
+    }
+
+
+def print_report(report):
+    print(f"{'endpoint':38} {'count':>6} {'errors':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'req/s':>8}")
+    rows = list(report['endpoints'].items()) + [('flow (end to end)', report['flows'])]
+    for label, stats in rows:
+        print(f"{label:38} {stats['count']:>6} {stats['errors']:>6} {stats['p50_ms'] or 0:>8.1f} "
+              f"{stats['p95_ms'] or 0:>8.1f} {stats['p99_ms'] or 0:>8.1f} {stats['throughput_rps']:>8.1f}")
+    print(f"outcomes: {report['flows']['outcomes']}; {report['meta']['sns_published']} SNS notifications, "
+          f"{report['meta']['sqs_queued']} queued in SQS")
+
+
+def compare(report, baseline, tolerance):
+    """Regressions of ``report`` against ``baseline``, as readable lines."""
+    regressions = []
+    current = dict(report['endpoints'], **{'flow (end to end)': report['flows']})
+    for label, before in dict(baseline['endpoints'], **{'flow (end to end)': baseline['flows']}).items():
+        after = current.get(label)
+        if after is None or not after['count']:
+            regressions.append(f'{label}: not exercised')
+            continue
+        # With fewer than 100 samples the p99 is just the slowest call
+        for key in ('p95_ms', 'p99_ms') if after['count'] >= 100 else ('p95_ms',):
+            if before[key] and after[key] > before[key] * (1 + tolerance):
+                regressions.append(f'{label}: {key} {before[key]} -> {after[key]}')
+        if after['throughput_rps'] < before['throughput_rps'] * (1 - tolerance):
+            regressions.append(f"{label}: throughput {before['throughput_rps']} -> {after['throughput_rps']} req/s")
+        error_rate = (before['errors'] / before['count'] if before['count'] else 0, after['errors'] / after['count'])
+        if error_rate[1] > error_rate[0] + tolerance / 10:
+            regressions.append(f'{label}: error rate {error_rate[0]:.1%} -> {error_rate[1]:.1%}')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--flows', type=int, default=200)
+    parser.add_argument('--duration', type=float, default=None, help='Run for this many seconds instead of --flows.')
+    parser.add_argument('--warmup', type=int, default=None, help='Unrecorded flows first (default: --concurrency).')
+    parser.add_argument('--restaurants', type=int, default=20)
+    parser.add_argument('--menu-items', type=int, default=12)
+    parser.add_argument('--drivers', type=int, default=None, help='Delivery agents (default: 2 x --concurrency).')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--database-url', default=None,
+                        help='Database URL template with {service}, e.g. postgresql://.../{service}_db (default: SQLite).')
+    parser.add_argument('--server', choices=SERVERS, default='werkzeug',
+                        help='Serve with the Werkzeug server flask run uses, or with Gunicorn.')
+    parser.add_argument('--env', action='append', default=[], metavar='KEY=VALUE',
+                        help='Extra environment for every service, e.g. --env PASSWORD_HASH_METHOD=pbkdf2:sha256:1000')
+    parser.add_argument('--output', help='Write the results as JSON here.')
+    parser.add_argument('--compare', help='Baseline JSON to compare against.')
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    args = parser.parse_args()
+
+    env = dict(item.split('=', 1) for item in args.env)
+    with tempfile.TemporaryDirectory() as directory, Stack(directory, args.database_url, env, server=args.server) as stack:
+        rng = random.Random(args.seed)
+        start = time.perf_counter()
+        world = seed(stack.urls, args.restaurants, args.menu_items, args.drivers or 2 * args.concurrency, rng)
+        print(f'seeded {args.restaurants} restaurants and {len(world["agents"])} agents '
+              f'in {time.perf_counter() - start:.1f}s')
+
+        warmup = args.concurrency if args.warmup is None else args.warmup
+        if warmup:
+            run_flows(stack.urls, world, warmup, args.concurrency, f'{args.seed}-warmup')
+        published = sum(stack.aws.published.values())
+        queued = len(stack.aws.queues[stack.queue_url])
+        samples, flows, outcomes, elapsed = run_flows(stack.urls, world, args.flows, args.concurrency, args.seed,
+                                                      args.duration)
+        report = build_report(samples, flows, outcomes, elapsed, {
+            'started_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'concurrency': args.concurrency, 'flows': len(flows), 'warmup': warmup,
+            'restaurants': args.restaurants, 'menu_items': args.menu_items, 'drivers': len(world['agents']),
+            'database': args.database_url or 'sqlite', 'server': args.server, 'env': env, 'seed': args.seed,
+            'python': platform.python_version(), 'cpus': os.cpu_count(),
+            'sns_published': sum(stack.aws.published.values()) - published,
+            'sqs_queued': len(stack.aws.queues[stack.queue_url]) - queued
+        })
+
+    print_report(report)
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=2)
+        print(f'wrote {args.output}')
+    if args.compare:
+        with open(args.compare) as file:
+            regressions = compare(report, json.load(file), args.tolerance)
+        if regressions:
+            print(f'{len(regressions)} regressions against {args.compare} (tolerance {args.tolerance:.0%}):')
+            for line in regressions:
+                print(f'  {line}')
+            sys.exit(1)
+        print(f'no regressions against {args.compare} (tolerance {args.tolerance:.0%})')
+
+
+if __name__ == '__main__':
+    main()
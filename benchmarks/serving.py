@@ -0,0 +1,131 @@
+"""Throughput of the services under Gunicorn against the Werkzeug server ``flask run`` uses.
+
+For each --servers entry, boots the stack (see ``stack.py``), seeds a few
+restaurants and delivery agents, signs in one customer, and then sends
+requests from --concurrency threads for --duration seconds. Each thread cycles
+through one cheap endpoint per service:
+
+    GET /api/users/profile, GET /api/restaurants/, GET /api/restaurants/<id>/menu,
+    GET /api/orders/, GET /api/payments/, PUT /api/delivery/agents/location
+
+The first --warmup seconds are not recorded. Prints requests per second and
+p50/p99 latency per endpoint and in total for each server. The load generator
+runs on the same machine, so compare servers only with each other, not with
+production.
+
+Usage:
+    python benchmarks/serving.py --concurrency 16 --duration 20
+    python benchmarks/serving.py --servers gunicorn --env GUNICORN_WORKERS=1
+"""
+import argparse
+import itertools
+import os
+import random
+import tempfile
+import threading
+import time
+
+from load import Client, FlowError, seed, summarise
+from stack import SERVERS, Stack
+
+
+def requests_for(urls, world, customer, drivers):
+    restaurant_id = next(iter(world['menus']))
+    return [
+        ('GET /api/users/profile', customer, 'GET', f"{urls['user-service']}/api/users/profile", {}),
+        ('GET /api/restaurants/', customer, 'GET', f"{urls['restaurant-service']}/api/restaurants/", {}),
+        ('GET /api/restaurants/<id>/menu', customer, 'GET',
+         f"{urls['restaurant-service']}/api/restaurants/{restaurant_id}/menu", {}),
+        ('GET /api/orders/', customer, 'GET', f"{urls['order-service']}/api/orders/", {}),
+        ('GET /api/payments/', customer, 'GET', f"{urls['payment-service']}/api/payments/", {}),
+        ('PUT /api/delivery/agents/location', drivers, 'PUT',
+         f"{urls['delivery-service']}/api/delivery/agents/location", {'json': {'latitude': 40.71, 'longitude': -74.0}})
+    ]
+
+
+def hammer(plan, concurrency, duration):
+    """Cycle through ``plan`` from ``concurrency`` threads; returns the samples and elapsed seconds."""
+    samples = []
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def worker(number):
+        client = Client([])
+        for label, token, method, url, kwargs in itertools.islice(itertools.cycle(plan), number, None):
+            if time.monotonic() >= deadline:
+                break
+            client.token = token[number % len(token)] if isinstance(token, list) else token
+            try:
+                client.call(label, method, url, 200, **kwargs)
+            except FlowError:
+                pass
+        with lock:
+            samples.extend(client.samples)
+
+    threads = [threading.Thread(target=worker, args=(number,)) for number in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples, time.perf_counter() - start
+
+
+def run(server, args):
+    env = dict(item.split('=', 1) for item in args.env)
+    with tempfile.TemporaryDirectory() as directory, Stack(directory, args.database_url, env, server=server) as stack:
+        rng = random.Random(args.seed)
+        world = seed(stack.urls, 3, 10, args.drivers, rng)
+        customer = Client([])
+        customer.sign_up(stack.urls, 'customer', rng)
+        plan = requests_for(stack.urls, world, customer.token, list(world['agents'].values()))
+        if args.warmup:
+            hammer(plan, args.concurrency, args.warmup)
+        return hammer(plan, args.concurrency, args.duration)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--servers', default=','.join(SERVERS), help='Comma-separated, from: ' + ', '.join(SERVERS))
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=20.0)
+    parser.add_argument('--warmup', type=float, default=3.0)
+    parser.add_argument('--drivers', type=int, default=4)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--database-url', default=None,
+                        help='Database URL template with {service}, e.g. postgresql://.../{service}_db (default: SQLite).')
+    parser.add_argument('--env', action='append', default=[], metavar='KEY=VALUE',
+                        help='Extra environment for every service, e.g. --env GUNICORN_WORKERS=4')
+    args = parser.parse_args()
+
+    servers = args.servers.split(',')
+    for server in servers:
+        if server not in SERVERS:
+            parser.error(f'unknown server: {server}')
+
+    print(f'{os.cpu_count()} CPUs, {args.concurrency} client threads, {args.duration:.0f}s per server')
+    totals = {}
+    for server in servers:
+        samples, elapsed = run(server, args)
+        by_label = {}
+        for label, seconds, ok in samples:
+            timings, errors = by_label.setdefault(label, ([], [0]))
+            timings.append(seconds)
+            errors[0] += not ok
+        print(f"\n{server}\n{'endpoint':38} {'count':>7} {'errors':>6} {'p50 ms':>8} {'p99 ms':>8} {'req/s':>8}")
+        rows = [(label, summarise(timings, errors[0], elapsed)) for label, (timings, errors) in sorted(by_label.items())]
+        totals[server] = summarise([seconds for _, seconds, _ in samples],
+                                   sum(1 for _, _, ok in samples if not ok), elapsed)
+        for label, stats in rows + [('total', totals[server])]:
+            print(f"{label:38} {stats['count']:>7} {stats['errors']:>6} {stats['p50_ms'] or 0:>8.1f} "
+                  f"{stats['p99_ms'] or 0:>8.1f} {stats['throughput_rps']:>8.1f}")
+
+    if len(totals) > 1:
+        baseline = totals[servers[0]]['throughput_rps']
+        print()
+        for server in servers[1:]:
+            print(f"{server}: {totals[server]['throughput_rps'] / baseline:.2f}x the throughput of {servers[0]}")
+
+
+if __name__ == '__main__':
+    main()
@@ -33,15 +33,59 @@ def create_app(test_config=None):
             USER_SERVICE_URL=os.getenv('USER_SERVICE_URL', 'http://user-service:5000'),
             AWS_REGION=os.getenv('AWS_REGION', 'us-east-1'),
             SNS_TOPIC_ARN=os.getenv('SNS_TOPIC_ARN', ''),
-            SQS_QUEUE_URL=os.getenv('SQS_QUEUE_URL', '')
+            SQS_QUEUE_URL=os.getenv('SQS_QUEUE_URL', ''),
+            SERVICE_AUTH_TOKEN=os.getenv('SERVICE_AUTH_TOKEN'),
+            REVOCATION_SYNC_SECONDS=int(os.getenv('REVOCATION_SYNC_SECONDS', '5')),
+            REVOCATION_BLOOM_CAPACITY=int(os.getenv('REVOCATION_BLOOM_CAPACITY', '100000')),
+            REVOCATION_BLOOM_ERROR_RATE=float(os.getenv('REVOCATION_BLOOM_ERROR_RATE', '0.001')),
+            REVOCATION_SYNC_OVERLAP=int(os.getenv('REVOCATION_SYNC_OVERLAP', '100')),
+            REVOCATION_INITIAL_SYNC_TIMEOUT=float(os.getenv('REVOCATION_INITIAL_SYNC_TIMEOUT', '5')),
+            JWKS_URL=os.getenv('JWKS_URL'),
+            JWKS_REFRESH_SECONDS=int(os.getenv('JWKS_REFRESH_SECONDS', '300')),
+            JWT_ACCEPT_HS256=os.getenv('JWT_ACCEPT_HS256', 'false').lower() == 'true',
+            TRACE_EXPORTER=os.getenv('TRACE_EXPORTER', 'none'),
+            TRACE_FILE=os.getenv('TRACE_FILE', 'traces.ndjson'),
+            TRACE_SAMPLE_RATE=float(os.getenv('TRACE_SAMPLE_RATE', '0.1')),
+            TRACE_EXPORT_INTERVAL=float(os.getenv('TRACE_EXPORT_INTERVAL', '5')),
+            SQL_PROFILER=os.getenv('SQL_PROFILER', 'false').lower() == 'true',
+            SQL_PROFILER_N_PLUS_ONE_THRESHOLD=int(os.getenv('SQL_PROFILER_N_PLUS_ONE_THRESHOLD', '5')),
+            SQL_PROFILER_SLOW_MS=float(os.getenv('SQL_PROFILER_SLOW_MS', '100')),
+            DB_POOL_SIZE=int(os.getenv('DB_POOL_SIZE', '5')),
+            DB_POOL_MAX_OVERFLOW=int(os.getenv('DB_POOL_MAX_OVERFLOW', '10')),
+            DB_POOL_TIMEOUT=int(os.getenv('DB_POOL_TIMEOUT', '30')),
+            DB_POOL_RECYCLE=int(os.getenv('DB_POOL_RECYCLE', '1800')),
+            DB_POOL_PRE_PING=os.getenv('DB_POOL_PRE_PING', 'true').lower() == 'true',
+            DB_POOL_WARM=int(os.getenv('DB_POOL_WARM', '2')),
+            DB_PGBOUNCER=os.getenv('DB_PGBOUNCER', 'false').lower() == 'true',
+            DB_STATEMENT_TIMEOUT_MS=int(os.getenv('DB_STATEMENT_TIMEOUT_MS', '0'))
         )
     else:
         app.config.update(test_config)
     
     # Initialize extensions
+    from .db_pool import engine_options
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(app.config))
     db.init_app(app)
     jwt.init_app(app)
     migrate.init_app(app, db)
+
+    from .jwks import init_jwks
+    init_jwks(app, jwt)
+
+    from .revocation import init_revocation
+    init_revocation(app, jwt)
+
+    from .instrumentation import init_instrumentation
+    init_instrumentation(app)
+
+    from .tracing import init_tracing
+    init_tracing(app, 'delivery-service')
+
+    from .profiler import init_profiler
+    init_profiler(app)
+
+    from .db_pool import init_db_pool
+    init_db_pool(app, db)
     
     # Create database tables
     with app.app_context():
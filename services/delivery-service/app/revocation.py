@@ -0,0 +1,194 @@
+"""Revoked-token checks for ``@jwt_required`` endpoints.
+
+User Service records the JTI of every revoked token. Each service keeps a
+local copy as a Bloom filter plus an exact set, synced in the background
+every ``REVOCATION_SYNC_SECONDS``. A token that misses the Bloom filter is
+known not to be revoked after a few hash probes, with no I/O. Only filter
+hits, which are real revocations plus a small false positive rate, consult
+the exact set.
+
+A revocation reaches other services within one sync interval. Feed ids are
+assigned before commit, so a revocation can become visible after a higher id
+has already been synced; each sync therefore re-reads the last
+``REVOCATION_SYNC_OVERLAP`` ids, which is harmless because adding a JTI twice
+is a no-op. Until the first sync of a process has run, token checks wait for it
+(up to ``REVOCATION_INITIAL_SYNC_TIMEOUT`` seconds) rather than accept tokens
+revoked before the restart. If User Service cannot be reached, the last synced
+list stays in force. ``REVOCATION_SYNC_SECONDS=0`` disables the background sync.
+"""
+import hashlib
+import logging
+import math
+import os
+import threading
+import time
+from datetime import datetime
+
+import requests
+from flask import current_app
+
+logger = logging.getLogger(__name__)
+
+
+class BloomFilter:
+    def __init__(self, capacity, error_rate=0.001):
+        self.capacity = max(capacity, 1)
+        self.error_rate = error_rate
+        self.size = max(int(-self.capacity * math.log(error_rate) / (math.log(2) ** 2)), 8)
+        self.hashes = max(int(round(self.size / self.capacity * math.log(2))), 1)
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _hashes(self, key):
+        # Double hashing: k probes derived from the two halves of one digest
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        return int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+
+    def add(self, key):
+        h1, h2 = self._hashes(key)
+        for i in range(self.hashes):
+            position = (h1 + i * h2) % self.size
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key):
+        h1, h2 = self._hashes(key)
+        bits, size = self._bits, self.size
+        for i in range(self.hashes):
+            position = (h1 + i * h2) % size
+            if not bits[position >> 3] & (1 << (position & 7)):
+                # Most tokens are not revoked and stop at the first or second probe
+                return False
+        return True
+
+
+def fetch_revocations_over_http(app):
+    """Build a fetcher that pages through User Service's revocation feed."""
+    def fetch(since_id):
+        response = requests.get(
+            f"{app.config['USER_SERVICE_URL']}/api/users/revocations",
+            params={'since': since_id},
+            headers={'X-Service-Token': app.config.get('SERVICE_AUTH_TOKEN') or ''},
+            timeout=5
+        )
+        response.raise_for_status()
+        return response.json()['revocations']
+    return fetch
+
+
+class RevocationList:
+    def __init__(self, fetch=None, sync_seconds=0, capacity=100000, error_rate=0.001,
+                 overlap=100, initial_sync_timeout=5):
+        self.fetch = fetch
+        self.sync_seconds = sync_seconds
+        self.overlap = overlap
+        self.initial_sync_timeout = initial_sync_timeout
+        self.error_rate = error_rate
+        self._lock = threading.Lock()
+        self._expires = {}
+        self._bloom = BloomFilter(capacity, error_rate)
+        self._last_id = 0
+        self._thread = None
+        self._thread_pid = None
+        self._first_sync = threading.Event()
+        self.last_synced = None
+
+    @classmethod
+    def from_config(cls, app, fetch=None):
+        return cls(
+            fetch=fetch or fetch_revocations_over_http(app),
+            sync_seconds=app.config.get('REVOCATION_SYNC_SECONDS', 0),
+            capacity=app.config.get('REVOCATION_BLOOM_CAPACITY', 100000),
+            error_rate=app.config.get('REVOCATION_BLOOM_ERROR_RATE', 0.001),
+            overlap=app.config.get('REVOCATION_SYNC_OVERLAP', 100),
+            initial_sync_timeout=app.config.get('REVOCATION_INITIAL_SYNC_TIMEOUT', 5)
+        )
+
+    def add(self, jti, expires_at=None, revocation_id=None):
+        with self._lock:
+            self._expires[jti] = expires_at
+            if len(self._expires) > self._bloom.capacity:
+                self._rebuild(self._bloom.capacity * 2)
+            else:
+                self._bloom.add(jti)
+            if revocation_id is not None:
+                self._last_id = max(self._last_id, revocation_id)
+
+    def _rebuild(self, capacity):
+        bloom = BloomFilter(capacity, self.error_rate)
+        for jti in self._expires:
+            bloom.add(jti)
+        self._bloom = bloom
+
+    def prune(self, now=None):
+        """Forget tokens that have expired anyway; rebuilds the filter if any were dropped."""
+        now = now or datetime.utcnow()
+        with self._lock:
+            expired = [jti for jti, expires_at in self._expires.items() if expires_at and expires_at <= now]
+            for jti in expired:
+                del self._expires[jti]
+            if expired:
+                self._rebuild(self._bloom.capacity)
+        return len(expired)
+
+    def sync(self):
+        """Pull revocations newer than the last one seen, minus the overlap window."""
+        since_id = max(self._last_id - self.overlap, 0)
+        while True:
+            batch = self.fetch(since_id)
+            for entry in batch:
+                since_id = max(since_id, entry['id'])
+                expires_at = entry.get('expires_at')
+                self.add(
+                    entry['jti'],
+                    datetime.fromisoformat(expires_at) if expires_at else None,
+                    entry['id']
+                )
+            if not batch:
+                break
+        self.prune()
+        self.last_synced = datetime.utcnow()
+
+    def _run(self, app):
+        while True:
+            try:
+                with app.app_context():
+                    self.sync()
+            except Exception as e:
+                logger.error(f"Error syncing revoked tokens: {str(e)}")
+            # Released after the first attempt either way; a failed one falls
+            # back to the list as it stands
+            self._first_sync.set()
+            time.sleep(self.sync_seconds)
+
+    def ensure_syncing(self):
+        # One sync thread per process, started lazily so it survives pre-fork servers
+        if not self.sync_seconds or (self._thread_pid == os.getpid() and self._thread.is_alive()):
+            return
+        with self._lock:
+            if self._thread_pid == os.getpid() and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(
+                target=self._run, args=(current_app._get_current_object(),),
+                name='revocation-sync', daemon=True
+            )
+            self._thread_pid = os.getpid()
+            self._thread.start()
+
+    def is_revoked(self, jti):
+        self.ensure_syncing()
+        if self.sync_seconds and not self._first_sync.is_set():
+            if not self._first_sync.wait(self.initial_sync_timeout):
+                logger.warning("Checking tokens before the first revocation sync finished")
+        if jti is None or jti not in self._bloom:
+            return False
+        return jti in self._expires
+
+    def __len__(self):
+        return len(self._expires)
+
+
+def init_revocation(app, jwt, fetch=None):
+    app.extensions['revocation'] = RevocationList.from_config(app, fetch)
+
+    @jwt.token_in_blocklist_loader
+    def check_if_token_revoked(jwt_header, jwt_payload):
+        return current_app.extensions['revocation'].is_revoked(jwt_payload.get('jti'))
@@ -1,6 +1,7 @@
 from flask import Blueprint, request, jsonify, current_app, make_response
 from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
 from .models import DeliveryAgent, DeliveryTask, db
+from .tracing import message_attributes
 from datetime import datetime
 import requests
 import logging
@@ -38,10 +39,14 @@ def notify_status_update(delivery_task):
             'delivery_status': delivery_task.status,
             'timestamp': datetime.utcnow().isoformat()
         }
-        sns.publish(
-            TopicArn=current_app.config['SNS_TOPIC_ARN'],
-            Message=json.dumps(message)
-        )
+        with current_app.extensions['tracer'].span('sns.publish', 'producer', {
+            'messaging.destination': current_app.config['SNS_TOPIC_ARN']
+        }):
+            sns.publish(
+                TopicArn=current_app.config['SNS_TOPIC_ARN'],
+                Message=json.dumps(message),
+                MessageAttributes=message_attributes()
+            )
     except Exception as e:
         logger.error(f"Error publishing to SNS: {str(e)}")
 
@@ -12,6 +12,8 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from app import create_app, db
 from app.models import DeliveryAgent, DeliveryTask
 
+pytest_plugins = ['app.query_budget']
+
 @pytest.fixture(scope='session')
 def app():
     """Create and configure a test application instance."""
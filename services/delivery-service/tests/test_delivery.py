@@ -1,3 +1,4 @@
+import json
 import pytest
 from app.models import DeliveryAgent, DeliveryTask
 from datetime import datetime
@@ -180,4 +181,32 @@ def test_complete_delivery_workflow(client, auth_headers, mock_sns_publish, samp
     assert datetime.fromisoformat(data['delivery_time'])
     
     # Verify agent is available again
-    assert sample_agent.is_available == True 
\ No newline at end of file
+    assert sample_agent.is_available == True
+
+
+def test_status_update_message_carries_trace_context(app, monkeypatch, sample_task):
+    """Test that SNS messages carry the request's traceparent for their consumers"""
+    import boto3
+    from app.routes import notify_status_update
+    from app.tracing import extract_message_context
+    published = []
+
+    class CapturingSNS:
+        def publish(self, **kwargs):
+            published.append(kwargs)
+
+    monkeypatch.setattr(boto3, 'client', lambda service, region_name: CapturingSNS())
+    trace_id = '4bf92f3577b34da6a3ce929d0e0e4736'
+    with app.test_request_context(headers={'traceparent': f'00-{trace_id}-00f067aa0ba902b7-01'}):
+        app.preprocess_request()
+        notify_status_update(sample_task)
+
+    attribute = published[0]['MessageAttributes']['traceparent']
+    assert attribute['DataType'] == 'String'
+    context = extract_message_context({'MessageAttributes': {'traceparent': attribute}})
+    assert context.trace_id == trace_id and context.sampled
+    # The same context is found in an SNS notification delivered through SQS
+    notification = {'Body': json.dumps({'Message': published[0]['Message'], 'MessageAttributes': {
+        'traceparent': {'Type': 'String', 'Value': attribute['StringValue']}
+    }})}
+    assert extract_message_context(notification) == context
@@ -0,0 +1,20 @@
+"""Authentication for internal service-to-service endpoints.
+
+Callers send the shared secret from ``SERVICE_AUTH_TOKEN`` in the
+``X-Service-Token`` header. If no token is configured, the endpoints are closed.
+"""
+import hmac
+from functools import wraps
+
+from flask import current_app, jsonify, request
+
+
+def service_auth_required(fn):
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        expected = current_app.config.get('SERVICE_AUTH_TOKEN')
+        supplied = request.headers.get('X-Service-Token', '')
+        if not expected or not hmac.compare_digest(supplied.encode('utf-8'), expected.encode('utf-8')):
+            return jsonify({'error': 'Service authentication required'}), 401
+        return fn(*args, **kwargs)
+    return wrapper
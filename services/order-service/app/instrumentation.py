@@ -0,0 +1,207 @@
+"""Request, database and downstream HTTP metrics in Prometheus text format.
+
+``init_instrumentation(app)`` records, per route (the URL rule, e.g.
+``/api/orders/<int:id>``) and method:
+
+- ``http_requests_total``: requests by status code
+- ``http_request_duration_seconds``: latency histogram
+- ``http_request_db_queries``: histogram of SQL statements per request
+- ``http_request_db_seconds_total``: time spent in SQL
+
+and, per target host and method, ``http_client_requests_total`` (by status,
+``error`` when no response came back) and the
+``http_client_request_duration_seconds`` histogram for every outbound
+``requests`` call. ``GET /metrics`` serves all of it, followed by the lines
+of any callable appended to ``Metrics.collectors``.
+
+Histograms use fixed buckets, so recording a request is a few dictionary
+updates and a bisect. Latency is measured until the view returns its
+response; for streamed responses that excludes sending the body. Metrics are
+kept per process: with several workers, scrape each one or aggregate them
+in Prometheus.
+"""
+import threading
+import time
+from bisect import bisect_left
+from urllib.parse import urlparse
+
+import requests
+from flask import Response, current_app, has_app_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+_local = threading.local()
+_hooks_installed = False
+_hooks_lock = threading.Lock()
+
+
+class Histogram:
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def render(self, name, labels):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {self.count}')
+        lines.append(f'{name}_sum{{{labels}}} {self.sum}')
+        lines.append(f'{name}_count{{{labels}}} {self.count}')
+        return lines
+
+
+def _labels(**labels):
+    return ','.join(f'{key}="{str(value)}"' for key, value in labels.items())
+
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = {}
+        self.latency = {}
+        self.db_queries = {}
+        self.db_seconds = {}
+        self.client_requests = {}
+        self.client_latency = {}
+        self.collectors = []
+
+    def record_request(self, method, route, status, seconds, queries, db_seconds):
+        key = (method, route)
+        with self._lock:
+            status_key = (method, route, status)
+            self.requests[status_key] = self.requests.get(status_key, 0) + 1
+            histogram = self.latency.get(key)
+            if histogram is None:
+                histogram = self.latency[key] = Histogram(LATENCY_BUCKETS)
+                self.db_queries[key] = Histogram(QUERY_COUNT_BUCKETS)
+                self.db_seconds[key] = 0.0
+            histogram.observe(seconds)
+            self.db_queries[key].observe(queries)
+            self.db_seconds[key] += db_seconds
+
+    def record_client_request(self, target, method, status, seconds):
+        key = (target, method)
+        with self._lock:
+            status_key = (target, method, status)
+            self.client_requests[status_key] = self.client_requests.get(status_key, 0) + 1
+            histogram = self.client_latency.get(key)
+            if histogram is None:
+                histogram = self.client_latency[key] = Histogram(LATENCY_BUCKETS)
+            histogram.observe(seconds)
+
+    def render(self):
+        with self._lock:
+            lines = [
+                '# HELP http_requests_total Requests handled, by route and status.',
+                '# TYPE http_requests_total counter'
+            ]
+            for (method, route, status), count in sorted(self.requests.items()):
+                lines.append(f'http_requests_total{{{_labels(method=method, route=route, status=status)}}} {count}')
+            lines += ['# HELP http_request_duration_seconds Request latency.',
+                      '# TYPE http_request_duration_seconds histogram']
+            for (method, route), histogram in sorted(self.latency.items()):
+                lines += histogram.render('http_request_duration_seconds', _labels(method=method, route=route))
+            lines += ['# HELP http_request_db_queries SQL statements executed per request.',
+                      '# TYPE http_request_db_queries histogram']
+            for (method, route), histogram in sorted(self.db_queries.items()):
+                lines += histogram.render('http_request_db_queries', _labels(method=method, route=route))
+            lines += ['# HELP http_request_db_seconds_total Time spent executing SQL.',
+                      '# TYPE http_request_db_seconds_total counter']
+            for (method, route), seconds in sorted(self.db_seconds.items()):
+                lines.append(f'http_request_db_seconds_total{{{_labels(method=method, route=route)}}} {seconds}')
+            lines += ['# HELP http_client_requests_total Outbound HTTP requests, by target and status.',
+                      '# TYPE http_client_requests_total counter']
+            for (target, method, status), count in sorted(self.client_requests.items()):
+                lines.append(f'http_client_requests_total{{{_labels(target=target, method=method, status=status)}}} '
+                             f'{count}')
+            lines += ['# HELP http_client_request_duration_seconds Outbound HTTP request latency.',
+                      '# TYPE http_client_request_duration_seconds histogram']
+            for (target, method), histogram in sorted(self.client_latency.items()):
+                lines += histogram.render('http_client_request_duration_seconds', _labels(target=target, method=method))
+        for collector in self.collectors:
+            lines += collector()
+        return '\n'.join(lines) + '\n'
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    _local.query_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(_local, 'query_started', None)
+    if started is not None and getattr(_local, 'queries', None) is not None:
+        _local.queries += 1
+        _local.db_seconds += time.perf_counter() - started
+
+
+def _timed_send(send):
+    def timed(session, prepared, **kwargs):
+        start = time.perf_counter()
+        status = 'error'
+        try:
+            response = send(session, prepared, **kwargs)
+            status = response.status_code
+            return response
+        finally:
+            if has_app_context():
+                metrics = current_app.extensions.get('metrics')
+                if metrics is not None:
+                    metrics.record_client_request(urlparse(prepared.url).hostname or '', prepared.method, status,
+                                                  time.perf_counter() - start)
+    timed.instrumented = True
+    return timed
+
+
+def _install_hooks():
+    """Process-wide hooks; they only feed the metrics of the app in context."""
+    global _hooks_installed
+    with _hooks_lock:
+        if _hooks_installed:
+            return
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        if not getattr(requests.Session.send, 'instrumented', False):
+            requests.Session.send = _timed_send(requests.Session.send)
+        _hooks_installed = True
+
+
+def init_instrumentation(app):
+    _install_hooks()
+    metrics = app.extensions['metrics'] = Metrics()
+
+    @app.before_request
+    def start_request_metrics():
+        _local.started = time.perf_counter()
+        _local.queries = 0
+        _local.db_seconds = 0.0
+
+    @app.after_request
+    def record_request_metrics(response):
+        started = getattr(_local, 'started', None)
+        if started is not None:
+            metrics.record_request(
+                request.method, request.url_rule.rule if request.url_rule else 'unmatched',
+                response.status_code, time.perf_counter() - started, _local.queries, _local.db_seconds
+            )
+            _local.started = _local.queries = None
+        return response
+
+    @app.route('/metrics')
+    def prometheus_metrics():
+        return Response(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+    return metrics
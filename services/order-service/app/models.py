@@ -18,6 +18,8 @@ class Order(db.Model):
     delivery_latitude = db.Column(db.Float, nullable=True)
     delivery_longitude = db.Column(db.Float, nullable=True)
     special_instructions = db.Column(db.Text)
+    menu_snapshot_digest = db.Column(db.String(64), nullable=True)  # Menu snapshot the order was priced from
+    menu_snapshot_version = db.Column(db.Integer, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
     
@@ -36,9 +38,28 @@ class Order(db.Model):
             logger.error(f"Error getting restaurant details: {str(e)}")
             return None
     
+    def to_summary(self):
+        """Compact projection returned to other services."""
+        return {
+            'id': self.id,
+            'customer_id': self.customer_id,
+            'restaurant_id': self.restaurant_id,
+            'status': self.status,
+            'total_amount': self.total_amount
+        }
+
     def to_dict(self):
-        # Get restaurant details including location
-        restaurant = self.get_restaurant_details()
+        from .snapshots import get_snapshot
+
+        # Orders priced from a menu snapshot are rendered from the local
+        # snapshot cache; older orders fall back to restaurant-service.
+        snapshot = get_snapshot(self.menu_snapshot_digest) if self.menu_snapshot_digest else None
+        if snapshot:
+            restaurant = snapshot['restaurant']
+            menu_items = snapshot['items_by_id']
+        else:
+            restaurant = self.get_restaurant_details()
+            menu_items = {}
         
         order_dict = {
             'id': self.id,
@@ -50,7 +71,9 @@ class Order(db.Model):
             'delivery_latitude': self.delivery_latitude,
             'delivery_longitude': self.delivery_longitude,
             'special_instructions': self.special_instructions,
-            'items': [item.to_dict() for item in self.items],
+            'menu_snapshot_digest': self.menu_snapshot_digest,
+            'menu_snapshot_version': self.menu_snapshot_version,
+            'items': [item.to_dict(menu_items.get(item.menu_item_id)) for item in self.items],
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
@@ -78,8 +101,8 @@ class OrderItem(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
     
-    def to_dict(self):
-        return {
+    def to_dict(self, menu_item=None):
+        item_dict = {
             'id': self.id,
             'order_id': self.order_id,
             'menu_item_id': self.menu_item_id,
@@ -88,4 +111,22 @@ class OrderItem(db.Model):
             'special_instructions': self.special_instructions,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
-        } 
\ No newline at end of file
+        }
+
+        # Name and category as they were on the menu when the order was placed
+        if menu_item:
+            item_dict.update({
+                'name': menu_item.get('name'),
+                'category': menu_item.get('category')
+            })
+
+        return item_dict
+
+class MenuSnapshotCache(db.Model):
+    __tablename__ = 'menu_snapshot_cache'
+    
+    digest = db.Column(db.String(64), primary_key=True)  # sha256 of payload, as published by Restaurant Service
+    restaurant_id = db.Column(db.Integer, nullable=False)
+    version = db.Column(db.Integer, nullable=False)
+    payload = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False) 
\ No newline at end of file
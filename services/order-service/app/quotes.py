@@ -0,0 +1,35 @@
+"""Signed payable-order quotes.
+
+When an order is created, the response carries a ``payment_quote``: an
+HS256 JWT signed with ``ORDER_QUOTE_SECRET`` that states the order id, the
+customer and the amount due, and expires after ``ORDER_QUOTE_TTL_SECONDS``
+(default 900). Payment Service shares the secret and verifies the quote
+locally, so paying for an order does not need a synchronous call back to
+this service (and through it to Restaurant Service). Quotes are only issued
+while ``ORDER_QUOTE_SECRET`` is set.
+"""
+import time
+
+import jwt
+
+QUOTE_AUDIENCE = 'payment-service'
+
+
+def issue_quote(order, secret, ttl_seconds=900, now=None):
+    now = int(time.time() if now is None else now)
+    return jwt.encode({
+        'order_id': order.id,
+        'customer_id': order.customer_id,
+        'amount': order.total_amount,
+        'aud': QUOTE_AUDIENCE,
+        'iat': now,
+        'exp': now + ttl_seconds
+    }, secret, algorithm='HS256')
+
+
+def quote_for(order, app):
+    """Quote for ``order`` under the app's config, or None when quotes are off."""
+    secret = app.config.get('ORDER_QUOTE_SECRET')
+    if not secret:
+        return None
+    return issue_quote(order, secret, app.config.get('ORDER_QUOTE_TTL_SECONDS', 900))
@@ -1,10 +1,17 @@
 from flask import Blueprint, request, jsonify, current_app, make_response
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from .models import Order, OrderItem, db
-from marshmallow import Schema, fields, validate, ValidationError
+from .streaming import stream_json_array, stream_ndjson
+from .snapshots import fetch_latest_snapshot, SnapshotUnavailable
+from .auth import service_auth_required
+from .db_pool import statement_timeout
+from .quotes import quote_for
+from marshmallow import EXCLUDE, Schema, fields, validate, ValidationError
 import requests
 import logging
 import json
+from datetime import datetime
+from sqlalchemy import func
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -33,19 +40,34 @@ order_item_schema = OrderItemSchema()
 
 order_bp = Blueprint('order', __name__)
 
-def get_user_details(user_id, app):
-    """Get user details from User Service"""
+def get_users_details(user_ids, app):
+    """Get details for many users from User Service in one request.
+
+    Returns a dict keyed by user id; unknown users are left out. Returns None
+    if User Service could not be reached.
+    """
+    ids = sorted({int(user_id) for user_id in user_ids})
+    if not ids:
+        return {}
     try:
-        response = requests.get(
-            f"{app.config['USER_SERVICE_URL']}/api/users/{user_id}",
-            headers={'Authorization': request.headers.get('Authorization')}
+        response = requests.post(
+            f"{app.config['USER_SERVICE_URL']}/api/users/batch",
+            json={'ids': ids},
+            headers={'X-Service-Token': app.config.get('SERVICE_AUTH_TOKEN') or ''}
         )
         response.raise_for_status()
-        return response.json()
+        return {user['id']: user for user in response.json()['users']}
     except requests.exceptions.RequestException as e:
         logger.error(f"Error getting user details: {str(e)}")
         return None
 
+def get_user_details(user_id, app):
+    """Get user details from User Service"""
+    users = get_users_details([user_id], app)
+    if users is None:
+        return None
+    return users.get(int(user_id))
+
 def get_restaurant_details(restaurant_id, app):
     """Get restaurant details from Restaurant Service"""
     try:
@@ -75,14 +97,71 @@ def get_menu_item_details(menu_item_id, restaurant_id, app):
 def get_orders():
     try:
         user_id = str(get_jwt_identity())  # Convert to string since customer_id is String(50)
-        orders = Order.query.filter_by(customer_id=user_id).all()
-        response = make_response(jsonify([order.to_dict() for order in orders]))
+        return stream_json_array(Order.query.filter_by(customer_id=user_id).order_by(Order.id))
+    except Exception as e:
+        logger.error("Error getting orders: %s", str(e))
+        return jsonify({'error': 'Failed to get orders'}), 500
+
+@order_bp.route('/batch', methods=['POST'])
+@service_auth_required
+def get_orders_batch():
+    """Resolve many order ids to their summaries for other services."""
+    try:
+        data = request.get_json(silent=True)
+        ids = data.get('ids') if isinstance(data, dict) else None
+        if not isinstance(ids, list) or not all(isinstance(i, int) and not isinstance(i, bool) for i in ids):
+            return jsonify({'error': 'ids must be a list of integers'}), 400
+        max_ids = current_app.config.get('ORDER_BATCH_MAX_IDS', 1000)
+        if len(ids) > max_ids:
+            return jsonify({'error': f'At most {max_ids} ids per request'}), 400
+
+        ids = list(dict.fromkeys(ids))
+        orders = {order.id: order.to_summary() for order in Order.query.filter(Order.id.in_(ids))} if ids else {}
+        response = make_response(jsonify({
+            'orders': [orders[order_id] for order_id in ids if order_id in orders],
+            'missing': [order_id for order_id in ids if order_id not in orders]
+        }))
         response.headers['Content-Type'] = 'application/json; charset=utf-8'
         return response
     except Exception as e:
-        logger.error("Error getting orders: %s", str(e))
+        logger.error("Error getting orders batch: %s", str(e))
         return jsonify({'error': 'Failed to get orders'}), 500
 
+@order_bp.route('/export', methods=['GET'])
+@service_auth_required
+@statement_timeout('DB_EXPORT_STATEMENT_TIMEOUT_MS')
+def export_orders():
+    """Stream ``(order_id, amount, status)`` rows in id order as NDJSON for reconciliation.
+
+    Covers ids above ``after_id`` up to ``max_id``. Without ``max_id`` the
+    range ends at the newest order created before ``created_before`` (default
+    now); the bound used is returned in ``X-Max-Order-Id``.
+    """
+    try:
+        after_id = request.args.get('after_id', 0, type=int)
+        max_id = request.args.get('max_id', type=int)
+        if max_id is None:
+            try:
+                created_before = datetime.fromisoformat(request.args['created_before']) \
+                    if 'created_before' in request.args else datetime.utcnow()
+            except ValueError:
+                return jsonify({'error': 'created_before must be an ISO 8601 datetime'}), 400
+            max_id = db.session.query(func.max(Order.id)).filter(
+                Order.id > after_id, Order.created_at < created_before
+            ).scalar() or after_id
+
+        query = db.session.query(Order.id, Order.total_amount, Order.status).filter(
+            Order.id > after_id, Order.id <= max_id
+        ).order_by(Order.id)
+        response = stream_ndjson(
+            query, lambda row: {'order_id': row.id, 'amount': row.total_amount, 'status': row.status}
+        )
+        response.headers['X-Max-Order-Id'] = str(max_id)
+        return response
+    except Exception as e:
+        logger.error("Error exporting orders: %s", str(e))
+        return jsonify({'error': 'Failed to export orders'}), 500
+
 @order_bp.route('/<int:id>', methods=['GET'])
 @jwt_required()
 def get_order(id):
@@ -120,12 +199,31 @@ def create_order():
                 'details': 'Items must be a non-empty list'
             }), 400
             
-        for item in data['items']:
-            if not isinstance(item, dict) or 'menu_item_id' not in item or 'quantity' not in item:
-                return jsonify({
-                    'error': 'Invalid item format',
-                    'details': 'Each item must have menu_item_id and quantity'
-                }), 400
+        # Quantities are priced below, so they must be positive integers
+        try:
+            items = [order_item_schema.load(item, unknown=EXCLUDE) for item in data['items']]
+        except ValidationError as e:
+            return jsonify({
+                'error': 'Invalid item format',
+                'details': e.messages
+            }), 400
+        
+        # Price the order from the restaurant's current menu snapshot
+        try:
+            snapshot = fetch_latest_snapshot(data['restaurant_id'], current_app)
+        except SnapshotUnavailable:
+            return jsonify({'error': 'Restaurant menu unavailable'}), 503
+        
+        menu_items = snapshot['items_by_id']
+        invalid_items = [
+            item['menu_item_id'] for item in items
+            if not menu_items.get(item['menu_item_id'], {}).get('is_available')
+        ]
+        if invalid_items:
+            return jsonify({
+                'error': 'Invalid menu items',
+                'menu_item_ids': invalid_items
+            }), 400
         
         # Get user ID from JWT
         user_id = str(get_jwt_identity())  # Convert to string since customer_id is String(50)
@@ -139,26 +237,35 @@ def create_order():
             delivery_longitude=data.get('delivery_longitude'),
             special_instructions=data.get('special_instructions'),
             status='pending',
-            total_amount=0.0  # This will be calculated later
+            total_amount=round(sum(
+                menu_items[item['menu_item_id']]['price'] * item['quantity'] for item in items
+            ), 2),
+            menu_snapshot_digest=snapshot['digest'],
+            menu_snapshot_version=snapshot['version']
         )
         
         db.session.add(order)
         db.session.flush()  # Get order ID without committing
         
         # Create order items
-        for item_data in data['items']:
+        for item_data in items:
             order_item = OrderItem(
                 order_id=order.id,
                 menu_item_id=item_data['menu_item_id'],
                 quantity=item_data['quantity'],
-                price_at_time=0.0,  # This will be fetched from restaurant service
+                price_at_time=menu_items[item_data['menu_item_id']]['price'],
                 special_instructions=item_data.get('special_instructions')
             )
             db.session.add(order_item)
         
         db.session.commit()
         
-        response = make_response(jsonify(order.to_dict()))
+        order_dict = order.to_dict()
+        # Lets Payment Service authorize the payment without calling back here
+        quote = quote_for(order, current_app)
+        if quote:
+            order_dict['payment_quote'] = quote
+        response = make_response(jsonify(order_dict))
         response.headers['Content-Type'] = 'application/json; charset=utf-8'
         return response, 201
         
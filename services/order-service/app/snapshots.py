@@ -0,0 +1,106 @@
+"""Local cache of Restaurant Service menu snapshots.
+
+Restaurant Service publishes immutable, content-addressed menu snapshots.
+Orders record the digest of the snapshot they were priced from, and the
+snapshot itself is kept in ``menu_snapshot_cache`` so rendering an order never
+needs to call Restaurant Service. Parsed snapshots are also memoised per
+process; since a digest always names the same bytes they never go stale.
+"""
+import hashlib
+import json
+import logging
+import threading
+
+import requests
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+
+from . import db
+from .models import MenuSnapshotCache
+
+logger = logging.getLogger(__name__)
+
+_parsed = {}
+_parsed_lock = threading.Lock()
+MAX_PARSED_SNAPSHOTS = 1024
+
+
+class SnapshotUnavailable(Exception):
+    pass
+
+
+def _parse(digest, payload):
+    document = json.loads(payload)
+    return {
+        'digest': digest,
+        'version': document['version'],
+        'restaurant': document['restaurant'],
+        'items_by_id': {item['id']: item for item in document['items']}
+    }
+
+
+def _remember(snapshot):
+    with _parsed_lock:
+        if len(_parsed) >= MAX_PARSED_SNAPSHOTS:
+            _parsed.pop(next(iter(_parsed)))
+        _parsed[snapshot['digest']] = snapshot
+    return snapshot
+
+
+def _download(path, app):
+    try:
+        response = requests.get(f"{app.config['RESTAURANT_SERVICE_URL']}{path}")
+        response.raise_for_status()
+    except requests.exceptions.RequestException as e:
+        logger.error(f"Error getting menu snapshot: {str(e)}")
+        raise SnapshotUnavailable(str(e))
+    digest = response.headers.get('X-Menu-Snapshot-Digest')
+    if not digest or hashlib.sha256(response.content).hexdigest() != digest:
+        raise SnapshotUnavailable('Menu snapshot digest mismatch')
+    return digest, response.content.decode('utf-8')
+
+
+def _store(digest, payload):
+    """Add a snapshot to the local cache inside the caller's transaction."""
+    if db.session.get(MenuSnapshotCache, digest) is not None:
+        return
+    snapshot = _parse(digest, payload)
+    try:
+        with db.session.begin_nested():
+            db.session.add(MenuSnapshotCache(
+                digest=digest,
+                restaurant_id=snapshot['restaurant']['id'],
+                version=snapshot['version'],
+                payload=payload
+            ))
+    except IntegrityError:
+        # Another request cached the same snapshot first
+        pass
+
+
+def fetch_latest_snapshot(restaurant_id, app):
+    """Fetch the current menu snapshot for pricing a new order."""
+    digest, payload = _download(f'/api/restaurants/{restaurant_id}/menu/snapshot', app)
+    with _parsed_lock:
+        cached = _parsed.get(digest)
+    _store(digest, payload)
+    return cached or _remember(_parse(digest, payload))
+
+
+def get_snapshot(digest):
+    """Resolve a snapshot by digest, from memory, then the local cache table.
+
+    Returns None if the snapshot cannot be found anywhere.
+    """
+    with _parsed_lock:
+        cached = _parsed.get(digest)
+    if cached:
+        return cached
+    row = db.session.get(MenuSnapshotCache, digest)
+    if row is not None:
+        return _remember(_parse(digest, row.payload))
+    try:
+        _, payload = _download(f'/api/restaurants/menu/snapshots/{digest}', current_app)
+    except SnapshotUnavailable:
+        return None
+    return _remember(_parse(digest, payload))
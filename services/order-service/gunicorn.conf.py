@@ -0,0 +1,81 @@
+"""Gunicorn settings, shared by every service.
+
+Run from the service directory with ``gunicorn 'app:create_app()'``; Gunicorn
+picks this file up from the working directory. Every setting can be
+overridden from the environment:
+
+- ``GUNICORN_BIND`` (``0.0.0.0:5000``)
+- ``GUNICORN_WORKER_CLASS``: ``sync`` (default) for CPU-bound services,
+  ``gthread`` or ``gevent`` for the IO-bound ones. ``gevent`` needs the
+  ``gevent`` package installed.
+- ``GUNICORN_WORKERS``: defaults to 2 x CPUs + 1 for ``sync`` workers and
+  CPUs + 1 otherwise, since ``gthread`` and ``gevent`` workers each serve
+  many requests at once.
+- ``GUNICORN_THREADS`` (4): threads per ``gthread`` worker.
+- ``GUNICORN_WORKER_CONNECTIONS`` (1000): concurrent requests per ``gevent`` worker.
+- ``GUNICORN_MAX_REQUESTS`` (2000) and ``GUNICORN_MAX_REQUESTS_JITTER`` (200):
+  a worker is replaced after serving about this many requests, which bounds
+  memory growth. The jitter keeps workers from restarting all at once. A
+  replaced ``gthread`` worker closes its kept-alive connections, so a request
+  that arrives on one at that moment is reset. Callers should retry idempotent
+  requests after a connection reset.
+- ``GUNICORN_KEEPALIVE`` (65): seconds an idle keep-alive connection stays
+  open. This is longer than a load balancer's usual 60 s idle timeout, so the
+  balancer closes idle connections first and never reuses one Gunicorn has
+  just closed. ``sync`` workers do not keep connections alive.
+- ``GUNICORN_TIMEOUT`` (30) and ``GUNICORN_GRACEFUL_TIMEOUT`` (30).
+
+The app is preloaded: ``create_app`` runs once in the master and workers fork
+from it, so they start fast and share memory. On SIGTERM, and on SIGHUP
+(reload), workers finish in-flight requests for up to the graceful timeout.
+A HUP re-forks the preloaded code, so deploy new code by starting a new
+master (a container replacement, or USR2 and then QUIT to the old master).
+"""
+import os
+
+
+def _cpus():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'sync')
+if worker_class == 'gevent':
+    # Patch before the preloaded app imports socket, ssl and threading
+    from gevent import monkey
+    monkey.patch_all()
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:5000')
+workers = int(os.getenv('GUNICORN_WORKERS', '0')) or (2 * _cpus() + 1 if worker_class == 'sync' else _cpus() + 1)
+threads = int(os.getenv('GUNICORN_THREADS', '4')) if worker_class == 'gthread' else 1
+worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', '1000'))
+preload_app = True
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', '2000'))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', '200'))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', '65'))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '30'))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', '30'))
+accesslog = os.getenv('GUNICORN_ACCESS_LOG')
+errorlog = '-'
+
+
+def post_fork(server, worker):
+    # Connections opened by create_app in the master must not be shared
+    # between workers; close=False leaves them to the master. Each worker
+    # then opens its own warm connections.
+    from app import db
+    from app.db_pool import warm_pool
+    app = server.app.wsgi()
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+            warm_pool(engine, app.config.get('DB_POOL_WARM', 0))
+
+
+def worker_exit(server, worker):
+    # Export spans still queued when a worker is recycled or shut down
+    tracer = server.app.wsgi().extensions.get('tracer')
+    if tracer is not None and tracer.processor is not None:
+        tracer.processor.flush()
@@ -0,0 +1,42 @@
+"""orders priced from menu snapshots
+
+Revision ID: 5e9b3a7c2d18
+Revises: 
+Create Date: 2026-10-19 14:06:52.381907
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5e9b3a7c2d18'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Orders placed before this revision have no snapshot and render from restaurant-service
+    with op.batch_alter_table('orders', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('menu_snapshot_digest', sa.String(length=64), nullable=True))
+        batch_op.add_column(sa.Column('menu_snapshot_version', sa.Integer(), nullable=True))
+
+    # create_app's create_all adds missing tables, so the cache may already exist
+    if sa.inspect(op.get_bind()).has_table('menu_snapshot_cache'):
+        return
+    op.create_table('menu_snapshot_cache',
+        sa.Column('digest', sa.String(length=64), nullable=False),
+        sa.Column('restaurant_id', sa.Integer(), nullable=False),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.Column('payload', sa.Text(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('digest')
+    )
+
+
+def downgrade():
+    op.drop_table('menu_snapshot_cache')
+    with op.batch_alter_table('orders', schema=None) as batch_op:
+        batch_op.drop_column('menu_snapshot_version')
+        batch_op.drop_column('menu_snapshot_digest')
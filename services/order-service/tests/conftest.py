@@ -10,6 +10,8 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')
 from app import create_app, db, jwt
 from app.models import Order, OrderItem
 
+pytest_plugins = ['app.query_budget']
+
 @pytest.fixture
 def app():
     app = create_app('test')
@@ -108,4 +110,37 @@ def mock_restaurant_service(app, monkeypatch):
     
     monkeypatch.setattr('app.models.requests.get', mock_get_restaurant)
     monkeypatch.setattr('app.routes.get_restaurant_details', mock_get_restaurant)
-    monkeypatch.setattr('app.routes.get_menu_item_details', mock_get_menu_item) 
\ No newline at end of file
+    monkeypatch.setattr('app.routes.get_menu_item_details', mock_get_menu_item)
+
+
+@pytest.fixture
+def mock_menu_snapshot(app, monkeypatch):
+    """Serve a menu snapshot the way Restaurant Service publishes it"""
+    import hashlib
+
+    payload = json.dumps({
+        'restaurant': {'id': 1, 'name': 'Test Restaurant', 'address': '123 Restaurant St',
+                       'latitude': 40.7128, 'longitude': -74.0060},
+        'items': [
+            {'id': 1, 'name': 'Test Item 1', 'price': 9.99, 'category': 'Main', 'is_available': True},
+            {'id': 2, 'name': 'Test Item 2', 'price': 6.00, 'category': 'Side', 'is_available': True},
+            {'id': 3, 'name': 'Sold Out', 'price': 4.00, 'category': 'Side', 'is_available': False}
+        ],
+        'version': 3
+    }, sort_keys=True, separators=(',', ':')).encode('utf-8')
+    digest = hashlib.sha256(payload).hexdigest()
+    calls = []
+
+    class MockResponse:
+        content = payload
+        headers = {'X-Menu-Snapshot-Digest': digest}
+
+        def raise_for_status(self):
+            pass
+
+    def mock_get(url, *args, **kwargs):
+        calls.append(url)
+        return MockResponse()
+
+    monkeypatch.setattr('app.snapshots.requests.get', mock_get)
+    return calls
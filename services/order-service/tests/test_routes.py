@@ -1,4 +1,5 @@
 import json
+import jwt
 from app.models import Order, OrderItem
 from app import db
 
@@ -131,4 +132,94 @@ def test_invalid_order_status(client, sample_order, auth_headers, mock_user_serv
         headers=auth_headers
     )
     
-    assert response.status_code == 422 
\ No newline at end of file
+    assert response.status_code == 422
+
+
+def test_create_order_priced_from_menu_snapshot(client, auth_headers, mock_menu_snapshot):
+    response = client.post('/api/orders/', json={
+        'restaurant_id': 1,
+        'delivery_address': '456 New St',
+        'items': [
+            {'menu_item_id': 1, 'quantity': 2},
+            {'menu_item_id': 2, 'quantity': 1}
+        ]
+    }, headers=auth_headers)
+
+    assert response.status_code == 201
+    assert response.json['total_amount'] == 25.98
+    assert response.json['menu_snapshot_version'] == 3
+    assert response.json['restaurant_name'] == 'Test Restaurant'
+    assert [(item['name'], item['price_at_time']) for item in response.json['items']] == [
+        ('Test Item 1', 9.99), ('Test Item 2', 6.00)
+    ]
+
+    # The payable-order quote states what Payment Service will charge
+    quote = jwt.decode(response.json['payment_quote'], 'test-order-quote-secret-0123456789',
+                       algorithms=['HS256'], audience='payment-service')
+    assert (quote['order_id'], quote['customer_id'], quote['amount']) == (response.json['id'], '1', 25.98)
+    assert quote['exp'] - quote['iat'] == 900
+
+    # Displaying the order afterwards needs no Restaurant Service call
+    calls_before = len(mock_menu_snapshot)
+    response = client.get(f"/api/orders/{response.json['id']}", headers=auth_headers)
+    assert response.json['items'][0]['name'] == 'Test Item 1'
+    assert len(mock_menu_snapshot) == calls_before
+
+def test_create_order_unavailable_menu_item(client, auth_headers, mock_menu_snapshot):
+    response = client.post('/api/orders/', json={
+        'restaurant_id': 1,
+        'delivery_address': '456 New St',
+        'items': [{'menu_item_id': 3, 'quantity': 1}, {'menu_item_id': 99, 'quantity': 1}]
+    }, headers=auth_headers)
+
+    assert response.status_code == 400
+    assert response.json['menu_item_ids'] == [3, 99]
+
+def test_create_order_rejects_invalid_quantities(client, auth_headers, mock_menu_snapshot):
+    for quantity in (0, -1, 'two', None):
+        response = client.post('/api/orders/', json={
+            'restaurant_id': 1,
+            'delivery_address': '456 New St',
+            'items': [{'menu_item_id': 1, 'quantity': quantity}]
+        }, headers=auth_headers)
+
+        assert response.status_code == 400
+        assert 'quantity' in response.json['details']
+    assert Order.query.count() == 0
+
+def test_get_orders_batch(client, sample_order):
+    headers = {'X-Service-Token': 'test-service-token'}
+    response = client.post('/api/orders/batch', json={'ids': [sample_order.id, 999, sample_order.id]}, headers=headers)
+    assert response.status_code == 200
+    assert response.json['orders'] == [{
+        'id': sample_order.id,
+        'customer_id': sample_order.customer_id,
+        'restaurant_id': sample_order.restaurant_id,
+        'status': sample_order.status,
+        'total_amount': sample_order.total_amount
+    }]
+    assert response.json['missing'] == [999]
+
+    assert client.post('/api/orders/batch', json={'ids': ['1']}, headers=headers).status_code == 400
+    assert client.post('/api/orders/batch', json={'ids': [1]}).status_code == 401
+
+def test_export_orders_ndjson(client, app):
+    from datetime import datetime, timedelta
+    now = datetime.utcnow()
+    for i, status in enumerate(['delivered', 'cancelled', 'delivered']):
+        db.session.add(Order(customer_id='1', restaurant_id=1, status=status, total_amount=10.0 + i,
+                             delivery_address='1 Test St', created_at=now - timedelta(hours=3 - i)))
+    db.session.commit()
+    headers = {'X-Service-Token': 'test-service-token'}
+
+    cutoff = (now - timedelta(hours=1, minutes=30)).isoformat()
+    response = client.get(f'/api/orders/export?created_before={cutoff}', headers=headers)
+    assert response.status_code == 200
+    assert response.headers['X-Max-Order-Id'] == '2'
+    rows = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert rows == [{'order_id': 1, 'amount': 10.0, 'status': 'delivered'},
+                    {'order_id': 2, 'amount': 11.0, 'status': 'cancelled'}]
+
+    response = client.get('/api/orders/export?after_id=2', headers=headers)
+    assert [json.loads(line)['order_id'] for line in response.get_data(as_text=True).splitlines()] == [3]
+    assert client.get('/api/orders/export').status_code == 401
@@ -1,4 +1,6 @@
 import os
+import json
+import click
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_jwt_extended import JWTManager
@@ -36,7 +38,54 @@ def create_app(test_config=None):
             JWT_ALGORITHM='HS256',
             JSON_AS_ASCII=False,
             JSONIFY_MIMETYPE='application/json; charset=utf-8',
-            ORDER_SERVICE_URL=os.getenv('ORDER_SERVICE_URL', 'http://order-service:5003')
+            ORDER_SERVICE_URL=os.getenv('ORDER_SERVICE_URL', 'http://order-service:5003'),
+            ORDER_QUOTE_SECRET=os.getenv('ORDER_QUOTE_SECRET'),
+            STREAM_YIELD_PER=int(os.getenv('STREAM_YIELD_PER', '500')),
+            PAYMENTS_PAGE_SIZE=int(os.getenv('PAYMENTS_PAGE_SIZE', '50')),
+            PAYMENTS_PAGE_MAX=int(os.getenv('PAYMENTS_PAGE_MAX', '200')),
+            USER_SERVICE_URL=os.getenv('USER_SERVICE_URL', 'http://user-service:5001'),
+            SERVICE_AUTH_TOKEN=os.getenv('SERVICE_AUTH_TOKEN'),
+            REVOCATION_SYNC_SECONDS=int(os.getenv('REVOCATION_SYNC_SECONDS', '5')),
+            REVOCATION_BLOOM_CAPACITY=int(os.getenv('REVOCATION_BLOOM_CAPACITY', '100000')),
+            REVOCATION_BLOOM_ERROR_RATE=float(os.getenv('REVOCATION_BLOOM_ERROR_RATE', '0.001')),
+            REVOCATION_SYNC_OVERLAP=int(os.getenv('REVOCATION_SYNC_OVERLAP', '100')),
+            REVOCATION_INITIAL_SYNC_TIMEOUT=float(os.getenv('REVOCATION_INITIAL_SYNC_TIMEOUT', '5')),
+            JWKS_URL=os.getenv('JWKS_URL'),
+            JWKS_REFRESH_SECONDS=int(os.getenv('JWKS_REFRESH_SECONDS', '300')),
+            JWT_ACCEPT_HS256=os.getenv('JWT_ACCEPT_HS256', 'false').lower() == 'true',
+            TRACE_EXPORTER=os.getenv('TRACE_EXPORTER', 'none'),
+            TRACE_FILE=os.getenv('TRACE_FILE', 'traces.ndjson'),
+            TRACE_SAMPLE_RATE=float(os.getenv('TRACE_SAMPLE_RATE', '0.1')),
+            TRACE_EXPORT_INTERVAL=float(os.getenv('TRACE_EXPORT_INTERVAL', '5')),
+            SQL_PROFILER=os.getenv('SQL_PROFILER', 'false').lower() == 'true',
+            SQL_PROFILER_N_PLUS_ONE_THRESHOLD=int(os.getenv('SQL_PROFILER_N_PLUS_ONE_THRESHOLD', '5')),
+            SQL_PROFILER_SLOW_MS=float(os.getenv('SQL_PROFILER_SLOW_MS', '100')),
+            DB_POOL_SIZE=int(os.getenv('DB_POOL_SIZE', '5')),
+            DB_POOL_MAX_OVERFLOW=int(os.getenv('DB_POOL_MAX_OVERFLOW', '10')),
+            DB_POOL_TIMEOUT=int(os.getenv('DB_POOL_TIMEOUT', '30')),
+            DB_POOL_RECYCLE=int(os.getenv('DB_POOL_RECYCLE', '1800')),
+            DB_POOL_PRE_PING=os.getenv('DB_POOL_PRE_PING', 'true').lower() == 'true',
+            DB_POOL_WARM=int(os.getenv('DB_POOL_WARM', '2')),
+            DB_PGBOUNCER=os.getenv('DB_PGBOUNCER', 'false').lower() == 'true',
+            DB_STATEMENT_TIMEOUT_MS=int(os.getenv('DB_STATEMENT_TIMEOUT_MS', '0')),
+            DB_EXPORT_STATEMENT_TIMEOUT_MS=int(os.getenv('DB_EXPORT_STATEMENT_TIMEOUT_MS', '120000')),
+            PAYMENT_PROVIDER=os.getenv('PAYMENT_PROVIDER', 'mock'),
+            PAYMENT_WORKERS=int(os.getenv('PAYMENT_WORKERS', '4')),
+            PAYMENT_QUEUE_MAX=int(os.getenv('PAYMENT_QUEUE_MAX', '1000')),
+            PAYMENT_WEBHOOK_URL=os.getenv('PAYMENT_WEBHOOK_URL'),
+            PAYMENT_WEBHOOK_SECRET=os.getenv('PAYMENT_WEBHOOK_SECRET'),
+            PAYMENT_CALLBACK_HOSTS=[
+                host.strip().lower() for host in os.getenv('PAYMENT_CALLBACK_HOSTS', '').split(',') if host.strip()
+            ],
+            MOCK_PROVIDER_LATENCY_MS=int(os.getenv('MOCK_PROVIDER_LATENCY_MS', '200')),
+            MOCK_PROVIDER_FAILURE_RATE=float(os.getenv('MOCK_PROVIDER_FAILURE_RATE', '0')),
+            LEDGER_SNAPSHOT_LAG_SECONDS=int(os.getenv('LEDGER_SNAPSHOT_LAG_SECONDS', '60')),
+            SETTLEMENT_CHUNK_SIZE=int(os.getenv('SETTLEMENT_CHUNK_SIZE', '1000')),
+            RECONCILIATION_DELAY_SECONDS=int(os.getenv('RECONCILIATION_DELAY_SECONDS', '3600')),
+            VELOCITY_BACKEND=os.getenv('VELOCITY_BACKEND', 'local'),
+            VELOCITY_REDIS_URL=os.getenv('VELOCITY_REDIS_URL', 'redis://redis:6379/0'),
+            VELOCITY_RULES=json.loads(os.getenv('VELOCITY_RULES')) if os.getenv('VELOCITY_RULES') else None,
+            VELOCITY_MAX_KEYS=int(os.getenv('VELOCITY_MAX_KEYS', '100000'))
         )
     else:
         # Load the test config if passed in
@@ -55,22 +104,112 @@ def create_app(test_config=None):
             JWT_ALGORITHM='HS256',
             JSON_AS_ASCII=False,
             JSONIFY_MIMETYPE='application/json; charset=utf-8',
-            ORDER_SERVICE_URL='http://order-service:5003'
+            ORDER_SERVICE_URL='http://order-service:5003',
+            ORDER_QUOTE_SECRET='test-order-quote-secret-0123456789',
+            USER_SERVICE_URL='http://user-service:5001',
+            SERVICE_AUTH_TOKEN='test-service-token',
+            REVOCATION_SYNC_SECONDS=0,
+            PAYMENT_PROVIDER='mock',
+            PAYMENT_WORKERS=0,
+            PAYMENT_CALLBACK_HOSTS=['shop.example.com'],
+            MOCK_PROVIDER_LATENCY_MS=0,
+            MOCK_PROVIDER_FAILURE_RATE=0.0,
+            VELOCITY_BACKEND='local',
+            TRACE_EXPORTER='memory',
+            TRACE_SAMPLE_RATE=1.0,
+            TRACE_EXPORT_INTERVAL=0,
+            SQL_PROFILER=True
         )
     
     # Initialize extensions
+    from .db_pool import engine_options
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(app.config))
     db.init_app(app)
     jwt.init_app(app)
     migrate.init_app(app, db)
+
+    from .jwks import init_jwks
+    init_jwks(app, jwt)
+
+    from .revocation import init_revocation
+    init_revocation(app, jwt)
+
+    from .instrumentation import init_instrumentation
+    init_instrumentation(app)
+
+    from .tracing import init_tracing
+    init_tracing(app, 'payment-service')
+
+    from .profiler import init_profiler
+    init_profiler(app)
+
+    from .db_pool import init_db_pool
+    init_db_pool(app, db)
     
     # Create database tables
     with app.app_context():
         # Import models to ensure they are registered with SQLAlchemy
-        from .models import Payment
+        from .models import Payment, LedgerEntry, BalanceSnapshot, SettlementRun, SettlementLine, Payout
+        from .models import ReconciliationRun, ReconciliationMismatch
         
         # Create tables
         db.create_all()
     
+    from .processing import PaymentProcessor, process_pending
+    app.extensions['payment_processor'] = PaymentProcessor.from_config(app)
+
+    from .velocity import VelocityLimiter
+    app.extensions['velocity'] = VelocityLimiter.from_config(app)
+
+    @app.cli.command('process-pending-payments')
+    @click.option('--older-than', default=60, help='Only payments pending for at least this many seconds.')
+    def process_pending_payments_command(older_than):
+        """Re-submit payments left pending by a crash or a full queue."""
+        processor = app.extensions['payment_processor']
+        count = process_pending(processor, older_than)
+        processor.shutdown(wait=True)
+        click.echo(f'Processed {count} pending payments')
+
+    @app.cli.command('snapshot-balances')
+    def snapshot_balances_command():
+        """Fold new ledger entries into the per-account balance snapshots."""
+        from .ledger import snapshot_balances
+        count = snapshot_balances(app.config.get('LEDGER_SNAPSHOT_LAG_SECONDS', 60))
+        click.echo(f'Updated {count} account balances')
+
+    @app.cli.command('settle')
+    @click.option('--start', required=True, type=click.DateTime(), help='First day of the period (inclusive).')
+    @click.option('--end', required=True, type=click.DateTime(), help='End of the period (exclusive).')
+    @click.option('--chunk-size', default=None, type=int, help='Payments per checkpoint.')
+    def settle_command(start, end, chunk_size):
+        """Pay restaurants out for the payments completed in a period."""
+        from .settlement import fetch_order_restaurants_over_http, settle
+        run = settle(start, end, fetch_order_restaurants_over_http(app),
+                     chunk_size or app.config.get('SETTLEMENT_CHUNK_SIZE', 1000))
+        click.echo(f'Settlement {run.id} {run.status}: {run.payment_count} payments, '
+                   f'{run.unresolved_count} with unknown orders')
+
+    @app.cli.command('reconcile')
+    @click.option('--created-before', type=click.DateTime(), default=None,
+                  help='Only orders created before this time (default: now minus RECONCILIATION_DELAY_SECONDS).')
+    @click.option('--after-order-id', type=int, default=None,
+                  help='Start after this order id instead of where the last run stopped.')
+    def reconcile_command(created_before, after_order_id):
+        """Match delivered orders against their payments and record mismatches."""
+        from sqlalchemy import func
+        from .models import ReconciliationMismatch
+        from .reconciliation import fetch_order_export_over_http, reconcile
+        run = reconcile(fetch_order_export_over_http(app), created_before, after_order_id,
+                        app.config.get('RECONCILIATION_DELAY_SECONDS', 3600),
+                        app.config.get('STREAM_YIELD_PER', 500))
+        click.echo(f'Reconciliation {run.id}: orders {run.after_order_id + 1}-{run.max_order_id}, '
+                   f'{run.orders_checked} orders, {run.payments_checked} payments, '
+                   f'{run.mismatch_count} mismatches')
+        for kind, count in db.session.query(ReconciliationMismatch.kind, func.count()).filter_by(
+            run_id=run.id
+        ).group_by(ReconciliationMismatch.kind):
+            click.echo(f'  {kind}: {count}')
+    
     # Register blueprints
     from .routes import payment_bp
     app.register_blueprint(payment_bp, url_prefix='/api/payments')
@@ -0,0 +1,173 @@
+"""Append-only double-entry ledger in integer minor units.
+
+Every money movement is posted as one transaction of two or more
+``LedgerEntry`` legs whose amounts sum to zero (debit positive, credit
+negative). Accounts:
+
+- ``clearing``: funds held at the payment provider
+- ``customer:<id>``: what a customer has paid, net of refunds (credit balance)
+- ``restaurant:<id>``: what has been paid out to a restaurant
+
+A completed charge debits ``clearing`` and credits the customer; a refund
+posts the reverse; a settlement payout debits the restaurant and credits
+``clearing``. Entries are never updated or deleted, so a correction is
+always a new posting.
+
+Balances are read as a ``BalanceSnapshot`` plus the sum of the account's
+entries above the snapshot's ``last_entry_id``. ``flask snapshot-balances``
+advances the snapshots incrementally: it only sums entries created since the
+previous run, and skips the last ``LEDGER_SNAPSHOT_LAG_SECONDS`` so an entry
+whose id was assigned before a slower transaction committed is never left
+behind the watermark.
+"""
+import uuid
+from datetime import datetime, timedelta
+from decimal import ROUND_HALF_UP, Decimal
+
+from sqlalchemy import event, func, insert
+
+from . import db
+from .models import BalanceSnapshot, LedgerEntry
+
+CLEARING_ACCOUNT = 'clearing'
+SNAPSHOT_CHUNK_SIZE = 500
+
+# ISO 4217 exponents; everything not listed has two decimal places
+MINOR_UNIT_EXPONENTS = {'JPY': 0, 'XOF': 0, 'XAF': 0, 'KWD': 3, 'BHD': 3}
+
+
+class LedgerError(Exception):
+    pass
+
+
+def customer_account(customer_id):
+    return f'customer:{customer_id}'
+
+
+def restaurant_account(restaurant_id):
+    return f'restaurant:{restaurant_id}'
+
+
+def to_minor(amount, currency='GHS'):
+    """Convert a decimal amount (float, str or Decimal) to integer minor units."""
+    exponent = MINOR_UNIT_EXPONENTS.get(currency, 2)
+    return int(Decimal(str(amount)).scaleb(exponent).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def from_minor(amount_minor, currency='GHS'):
+    return Decimal(amount_minor).scaleb(-MINOR_UNIT_EXPONENTS.get(currency, 2))
+
+
+@event.listens_for(LedgerEntry, 'before_update')
+def _reject_update(mapper, connection, target):
+    raise LedgerError('Ledger entries are append-only')
+
+
+@event.listens_for(LedgerEntry, 'before_delete')
+def _reject_delete(mapper, connection, target):
+    raise LedgerError('Ledger entries are append-only')
+
+
+def post(entry_type, legs, currency='GHS', payment_id=None):
+    """Add a balanced posting to the session; the caller commits it.
+
+    ``legs`` is a list of ``(account, amount_minor)`` pairs summing to zero.
+    Returns the transaction id shared by the legs.
+    """
+    if len(legs) < 2 or sum(amount for _, amount in legs) != 0:
+        raise LedgerError(f'Unbalanced {entry_type} posting: {legs}')
+    transaction_id = str(uuid.uuid4())
+    db.session.add_all([
+        LedgerEntry(
+            transaction_id=transaction_id, entry_type=entry_type, account=account,
+            amount_minor=amount, currency=currency, payment_id=payment_id
+        )
+        for account, amount in legs
+    ])
+    return transaction_id
+
+
+def post_charge(payment):
+    amount = to_minor(payment.amount, payment.currency)
+    return post('charge', [
+        (CLEARING_ACCOUNT, amount),
+        (customer_account(payment.customer_id), -amount)
+    ], payment.currency, payment.id)
+
+
+def post_refund(payment):
+    amount = to_minor(payment.amount, payment.currency)
+    return post('refund', [
+        (customer_account(payment.customer_id), amount),
+        (CLEARING_ACCOUNT, -amount)
+    ], payment.currency, payment.id)
+
+
+def post_payouts(payouts):
+    """Post many ``(restaurant_id, amount_minor, currency)`` payouts in one INSERT.
+
+    Returns the transaction id of each payout, in order.
+    """
+    transaction_ids, rows = [], []
+    now = datetime.utcnow()
+    for restaurant_id, amount_minor, currency in payouts:
+        transaction_id = str(uuid.uuid4())
+        transaction_ids.append(transaction_id)
+        for account, amount in ((restaurant_account(restaurant_id), amount_minor),
+                                (CLEARING_ACCOUNT, -amount_minor)):
+            rows.append({
+                'transaction_id': transaction_id, 'entry_type': 'payout', 'account': account,
+                'amount_minor': amount, 'currency': currency, 'payment_id': None, 'created_at': now
+            })
+    if rows:
+        db.session.execute(insert(LedgerEntry), rows)
+    return transaction_ids
+
+
+def balance(account, currency='GHS'):
+    """Current balance in minor units: snapshot plus the entries after it."""
+    snapshot = db.session.get(BalanceSnapshot, (account, currency))
+    base, after_id = (snapshot.balance_minor, snapshot.last_entry_id) if snapshot else (0, 0)
+    delta = db.session.query(func.coalesce(func.sum(LedgerEntry.amount_minor), 0)).filter(
+        LedgerEntry.account == account,
+        LedgerEntry.currency == currency,
+        LedgerEntry.id > after_id
+    ).scalar()
+    return base + delta
+
+
+def snapshot_balances(lag_seconds=60, now=None):
+    """Fold entries posted since the last run into the snapshots; returns accounts updated."""
+    now = now or datetime.utcnow()
+    previous = db.session.query(func.coalesce(func.max(BalanceSnapshot.last_entry_id), 0)).scalar()
+    # Newest entry old enough that every lower id has committed
+    high = db.session.query(LedgerEntry.id).filter(
+        LedgerEntry.id > previous,
+        LedgerEntry.created_at <= now - timedelta(seconds=lag_seconds)
+    ).order_by(LedgerEntry.id.desc()).limit(1).scalar()
+    if high is None:
+        return 0
+
+    deltas = db.session.query(
+        LedgerEntry.account, LedgerEntry.currency, func.sum(LedgerEntry.amount_minor)
+    ).filter(
+        LedgerEntry.id > previous, LedgerEntry.id <= high
+    ).group_by(LedgerEntry.account, LedgerEntry.currency).all()
+
+    accounts = sorted({account for account, _, _ in deltas})
+    snapshots = {}
+    for i in range(0, len(accounts), SNAPSHOT_CHUNK_SIZE):
+        for snapshot in BalanceSnapshot.query.filter(
+            BalanceSnapshot.account.in_(accounts[i:i + SNAPSHOT_CHUNK_SIZE])
+        ):
+            snapshots[(snapshot.account, snapshot.currency)] = snapshot
+
+    for account, currency, delta in deltas:
+        snapshot = snapshots.get((account, currency))
+        if snapshot is None:
+            snapshot = BalanceSnapshot(account=account, currency=currency, balance_minor=0)
+            db.session.add(snapshot)
+        snapshot.balance_minor += delta
+        snapshot.last_entry_id = high
+    db.session.commit()
+    return len(deltas)
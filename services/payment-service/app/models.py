@@ -3,6 +3,13 @@ from . import db
 
 class Payment(db.Model):
     __tablename__ = 'payments'
+    __table_args__ = (
+        # Reconciliation exports payments in (order_id, id) order
+        db.Index('ix_payments_order_id_id', 'order_id', 'id'),
+        # Payment history pages through one customer's payments newest first
+        db.Index('ix_payments_customer_created_id', 'customer_id', 'created_at', 'id'),
+        db.Index('ix_payments_customer_status_created_id', 'customer_id', 'status', 'created_at', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     order_id = db.Column(db.Integer, nullable=False)  # References order_id from Order Service
@@ -10,9 +17,11 @@ class Payment(db.Model):
     amount = db.Column(db.Float, nullable=False)
     currency = db.Column(db.String(3), nullable=False, default='GHS')
     payment_method = db.Column(db.String(20), nullable=False)  # card, mobile_money, cash
-    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, completed, failed, refunded
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, processing, completed, failed, refunded
     transaction_id = db.Column(db.String(100), unique=True)  # External payment provider's transaction ID
     payment_details = db.Column(db.JSON)  # Store additional payment details like card last 4 digits, etc.
+    callback_url = db.Column(db.String(500))  # Notified when processing finishes
+    failure_reason = db.Column(db.String(255))
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
     
@@ -27,6 +36,172 @@ class Payment(db.Model):
             'status': self.status,
             'transaction_id': self.transaction_id,
             'payment_details': self.payment_details,
+            'failure_reason': self.failure_reason,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
-        } 
\ No newline at end of file
+        } 
+
+
+class LedgerEntry(db.Model):
+    """One leg of a double-entry posting; rows are never updated or deleted."""
+    __tablename__ = 'ledger_entries'
+    __table_args__ = (
+        # Balance reads sum one account's entries above its snapshot watermark
+        db.Index('ix_ledger_entries_account_currency_id', 'account', 'currency', 'id'),
+    )
+
+    id = db.Column(db.BigInteger().with_variant(db.Integer, 'sqlite'), primary_key=True)
+    transaction_id = db.Column(db.String(36), nullable=False, index=True)  # Groups the legs of one posting
+    entry_type = db.Column(db.String(20), nullable=False)  # charge, refund, payout
+    account = db.Column(db.String(64), nullable=False)  # clearing, customer:<id>, restaurant:<id>
+    amount_minor = db.Column(db.BigInteger, nullable=False)  # Debit positive, credit negative
+    currency = db.Column(db.String(3), nullable=False, default='GHS')
+    payment_id = db.Column(db.Integer, index=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'transaction_id': self.transaction_id,
+            'entry_type': self.entry_type,
+            'account': self.account,
+            'amount_minor': self.amount_minor,
+            'currency': self.currency,
+            'payment_id': self.payment_id,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+
+class BalanceSnapshot(db.Model):
+    """Balance of an account over every ledger entry up to ``last_entry_id``."""
+    __tablename__ = 'balance_snapshots'
+
+    account = db.Column(db.String(64), primary_key=True)
+    currency = db.Column(db.String(3), primary_key=True)
+    balance_minor = db.Column(db.BigInteger, nullable=False, default=0)
+    last_entry_id = db.Column(db.BigInteger, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
+
+class SettlementRun(db.Model):
+    """One payout settlement over a period; ``last_payment_id`` is its resume checkpoint."""
+    __tablename__ = 'settlement_runs'
+    __table_args__ = (
+        db.UniqueConstraint('period_start', 'period_end', name='uq_settlement_runs_period'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    period_start = db.Column(db.DateTime, nullable=False)
+    period_end = db.Column(db.DateTime, nullable=False)  # Exclusive
+    status = db.Column(db.String(20), nullable=False, default='running')  # running, completed
+    last_payment_id = db.Column(db.Integer, nullable=False, default=0)
+    payment_count = db.Column(db.Integer, nullable=False, default=0)
+    unresolved_count = db.Column(db.Integer, nullable=False, default=0)  # Orders order-service did not know
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    completed_at = db.Column(db.DateTime)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'period_start': self.period_start.isoformat(),
+            'period_end': self.period_end.isoformat(),
+            'status': self.status,
+            'last_payment_id': self.last_payment_id,
+            'payment_count': self.payment_count,
+            'unresolved_count': self.unresolved_count,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'completed_at': self.completed_at.isoformat() if self.completed_at else None
+        }
+
+
+class SettlementLine(db.Model):
+    """Running per-restaurant total of a settlement run."""
+    __tablename__ = 'settlement_lines'
+
+    run_id = db.Column(db.Integer, db.ForeignKey('settlement_runs.id'), primary_key=True)
+    restaurant_id = db.Column(db.Integer, primary_key=True)
+    currency = db.Column(db.String(3), primary_key=True)
+    amount_minor = db.Column(db.BigInteger, nullable=False, default=0)
+    payment_count = db.Column(db.Integer, nullable=False, default=0)
+
+
+class Payout(db.Model):
+    __tablename__ = 'payouts'
+    __table_args__ = (
+        db.UniqueConstraint('run_id', 'restaurant_id', 'currency', name='uq_payouts_run_restaurant_currency'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    run_id = db.Column(db.Integer, db.ForeignKey('settlement_runs.id'), nullable=False)
+    restaurant_id = db.Column(db.Integer, nullable=False, index=True)
+    amount_minor = db.Column(db.BigInteger, nullable=False)
+    currency = db.Column(db.String(3), nullable=False, default='GHS')
+    payment_count = db.Column(db.Integer, nullable=False)
+    period_start = db.Column(db.DateTime, nullable=False)
+    period_end = db.Column(db.DateTime, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, paid
+    ledger_transaction_id = db.Column(db.String(36))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'run_id': self.run_id,
+            'restaurant_id': self.restaurant_id,
+            'amount_minor': self.amount_minor,
+            'currency': self.currency,
+            'payment_count': self.payment_count,
+            'period_start': self.period_start.isoformat(),
+            'period_end': self.period_end.isoformat(),
+            'status': self.status,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+
+class ReconciliationRun(db.Model):
+    """One pass matching orders ``after_order_id < id <= max_order_id`` against their payments."""
+    __tablename__ = 'reconciliation_runs'
+
+    id = db.Column(db.Integer, primary_key=True)
+    after_order_id = db.Column(db.Integer, nullable=False)
+    max_order_id = db.Column(db.Integer)
+    status = db.Column(db.String(20), nullable=False, default='running')  # running, completed, failed
+    orders_checked = db.Column(db.Integer, nullable=False, default=0)
+    payments_checked = db.Column(db.Integer, nullable=False, default=0)
+    mismatch_count = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    completed_at = db.Column(db.DateTime)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'after_order_id': self.after_order_id,
+            'max_order_id': self.max_order_id,
+            'status': self.status,
+            'orders_checked': self.orders_checked,
+            'payments_checked': self.payments_checked,
+            'mismatch_count': self.mismatch_count,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'completed_at': self.completed_at.isoformat() if self.completed_at else None
+        }
+
+
+class ReconciliationMismatch(db.Model):
+    __tablename__ = 'reconciliation_mismatches'
+
+    id = db.Column(db.Integer, primary_key=True)
+    run_id = db.Column(db.Integer, db.ForeignKey('reconciliation_runs.id'), nullable=False, index=True)
+    order_id = db.Column(db.Integer, nullable=False)
+    kind = db.Column(db.String(30), nullable=False)  # missing_payment, duplicate_payment, amount_mismatch, refunded_but_delivered, orphan_payment
+    details = db.Column(db.JSON)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'run_id': self.run_id,
+            'order_id': self.order_id,
+            'kind': self.kind,
+            'details': self.details,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
@@ -0,0 +1,190 @@
+"""Asynchronous payment processing.
+
+``create_payment`` only records a ``pending`` payment and hands its id to the
+``PaymentProcessor``. A background thread pool (``PAYMENT_WORKERS``) then
+processes it:
+
+1. It claims the payment with a conditional UPDATE (``pending`` ->
+   ``processing``). Only the worker that wins the claim calls the provider, so
+   duplicate submissions never charge twice.
+2. It charges through the configured provider.
+3. It writes the outcome (``completed`` or ``failed``). A completed charge
+   is posted to the ledger in the same commit.
+
+Status changes are then POSTed to ``PAYMENT_WEBHOOK_URL`` and to the
+payment's ``callback_url``. A callback URL must point at a host listed in
+``PAYMENT_CALLBACK_HOSTS``. Callbacks are signed with
+``PAYMENT_WEBHOOK_SECRET`` (HMAC-SHA256 in ``X-Payment-Signature``) and sent
+from a separate single-thread notifier, so a slow or failing receiver never
+holds up payment workers.
+
+Payments left ``pending`` by a full queue or a restart are re-submitted by
+``flask process-pending-payments``. A payment stuck in ``processing``
+means the process died in the middle of a provider call. Resolve it
+against the provider using its ``transaction_id`` rather than retrying it
+blindly. ``PAYMENT_WORKERS=0`` processes inline, right after the request
+has built its response (used by the tests).
+"""
+import hashlib
+import hmac
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from urllib.parse import urlparse
+
+import requests
+
+from . import db
+from .ledger import post_charge
+from .models import Payment
+from .providers import get_provider
+
+logger = logging.getLogger(__name__)
+
+
+class PaymentProcessor:
+    def __init__(self, app, provider, workers=4, max_queue=1000, webhook_url=None, webhook_secret=None,
+                 webhook_retries=3):
+        self.app = app
+        self.provider = provider
+        self.workers = workers
+        self.max_queue = max_queue
+        self.webhook_url = webhook_url
+        self.webhook_secret = webhook_secret
+        self.webhook_retries = webhook_retries
+        self._lock = threading.Lock()
+        self._executor = None
+        self._executor_pid = None
+        self._notifier = None
+        self._queued = 0
+
+    @classmethod
+    def from_config(cls, app):
+        config = app.config
+        return cls(
+            app,
+            get_provider(config),
+            workers=config.get('PAYMENT_WORKERS', 4),
+            max_queue=config.get('PAYMENT_QUEUE_MAX', 1000),
+            webhook_url=config.get('PAYMENT_WEBHOOK_URL'),
+            webhook_secret=config.get('PAYMENT_WEBHOOK_SECRET'),
+            webhook_retries=config.get('PAYMENT_WEBHOOK_RETRIES', 3)
+        )
+
+    def _get_executor(self):
+        # Created lazily and per process, so threads are never shared across a fork
+        with self._lock:
+            if self._executor is None or self._executor_pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='payment')
+                self._notifier = ThreadPoolExecutor(max_workers=1, thread_name_prefix='payment-notify')
+                self._executor_pid = os.getpid()
+                self._queued = 0
+            return self._executor
+
+    def submit(self, payment_id):
+        """Queue a committed pending payment; returns False if it was left for the sweeper."""
+        if not self.workers:
+            self.process(payment_id)
+            return True
+        executor = self._get_executor()
+        with self._lock:
+            if self._queued >= self.max_queue:
+                logger.warning(f"Payment queue full, leaving payment {payment_id} pending")
+                return False
+            self._queued += 1
+        executor.submit(self._process_queued, payment_id)
+        return True
+
+    def _process_queued(self, payment_id):
+        try:
+            self.process(payment_id)
+        finally:
+            with self._lock:
+                self._queued -= 1
+
+    def process(self, payment_id):
+        with self.app.app_context():
+            try:
+                # Claim the payment first; whoever loses the race does nothing
+                claimed = Payment.query.filter_by(id=payment_id, status='pending').update(
+                    {'status': 'processing', 'updated_at': datetime.utcnow()}, synchronize_session=False
+                )
+                db.session.commit()
+                if not claimed:
+                    return
+                payment = db.session.get(Payment, payment_id)
+                result = self.provider.charge(payment.to_dict())
+                payment.status = 'completed' if result.succeeded else 'failed'
+                payment.failure_reason = result.failure_reason
+                if result.transaction_id:
+                    payment.transaction_id = result.transaction_id
+                if result.succeeded:
+                    post_charge(payment)
+                db.session.commit()
+                self._notify_later(payment.to_dict(), payment.callback_url)
+            except Exception:
+                db.session.rollback()
+                logger.error(f"Error processing payment {payment_id}", exc_info=True)
+            finally:
+                db.session.remove()
+
+    def _notify_later(self, payment, callback_url):
+        if not self.workers:
+            self.notify(payment, callback_url)
+            return
+        self._get_executor()
+        self._notifier.submit(self.notify, payment, callback_url)
+
+    def notify(self, payment, callback_url=None):
+        targets = [url for url in (callback_url, self.webhook_url) if url]
+        if not targets:
+            return
+        body = json.dumps({'event': f"payment.{payment['status']}", 'payment': payment}, separators=(',', ':'))
+        headers = {'Content-Type': 'application/json'}
+        if self.webhook_secret:
+            headers['X-Payment-Signature'] = hmac.new(
+                self.webhook_secret.encode('utf-8'), body.encode('utf-8'), hashlib.sha256
+            ).hexdigest()
+        for url in targets:
+            for attempt in range(1, self.webhook_retries + 1):
+                try:
+                    requests.post(url, data=body, headers=headers, timeout=5).raise_for_status()
+                    break
+                except requests.exceptions.RequestException as e:
+                    logger.warning(f"Payment callback to {url} failed (attempt {attempt}): {str(e)}")
+                    if attempt < self.webhook_retries:
+                        time.sleep(0.5 * 2 ** (attempt - 1))
+
+    def shutdown(self, wait=True):
+        # Workers take the lock when they finish, so never wait while holding it
+        with self._lock:
+            executors = [self._executor, self._notifier] if self._executor_pid == os.getpid() else []
+            self._executor = None
+            self._notifier = None
+        for executor in executors:
+            if executor is not None:
+                executor.shutdown(wait=wait)
+
+
+def callback_url_allowed(url, allowed_hosts):
+    """True if ``url`` is http(s) and its host is in the configured allowlist."""
+    if not isinstance(url, str):
+        return False
+    parsed = urlparse(url)
+    return parsed.scheme in ('http', 'https') and (parsed.hostname or '').lower() in allowed_hosts
+
+
+def process_pending(processor, older_than_seconds=60):
+    """Re-submit payments that have been pending for a while; returns how many."""
+    cutoff = datetime.utcnow() - timedelta(seconds=older_than_seconds)
+    ids = [payment_id for (payment_id,) in db.session.query(Payment.id).filter(
+        Payment.status == 'pending', Payment.created_at <= cutoff
+    ).order_by(Payment.id)]
+    for payment_id in ids:
+        processor.submit(payment_id)
+    return len(ids)
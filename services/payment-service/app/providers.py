@@ -0,0 +1,56 @@
+"""Payment provider adapters.
+
+A provider takes a pending payment and reports whether the charge went
+through. ``PAYMENT_PROVIDER`` selects the adapter; the only one shipped is
+``mock``, which simulates a provider locally with configurable latency
+(``MOCK_PROVIDER_LATENCY_MS``) and failure rate (``MOCK_PROVIDER_FAILURE_RATE``).
+"""
+import random
+import time
+import uuid
+from collections import namedtuple
+
+ChargeResult = namedtuple('ChargeResult', ['succeeded', 'transaction_id', 'failure_reason'])
+
+
+class PaymentProvider:
+    name = None
+
+    def charge(self, payment):
+        """Charge a payment (a ``Payment.to_dict()``) and return a ChargeResult."""
+        raise NotImplementedError
+
+
+class MockProvider(PaymentProvider):
+    name = 'mock'
+
+    def __init__(self, latency_ms=0, failure_rate=0.0, seed=None):
+        self.latency_ms = latency_ms
+        self.failure_rate = failure_rate
+        self._random = random.Random(seed)
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            latency_ms=config.get('MOCK_PROVIDER_LATENCY_MS', 0),
+            failure_rate=config.get('MOCK_PROVIDER_FAILURE_RATE', 0.0)
+        )
+
+    def charge(self, payment):
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000.0)
+        if self._random.random() < self.failure_rate:
+            return ChargeResult(False, None, 'Declined by provider')
+        return ChargeResult(True, f'mock_{uuid.uuid4().hex}', None)
+
+
+PROVIDERS = {
+    MockProvider.name: MockProvider
+}
+
+
+def get_provider(config):
+    name = config.get('PAYMENT_PROVIDER', 'mock')
+    if name not in PROVIDERS:
+        raise ValueError(f'Unknown payment provider: {name}')
+    return PROVIDERS[name].from_config(config)
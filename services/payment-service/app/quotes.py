@@ -0,0 +1,34 @@
+"""Verification of Order Service's payable-order quotes.
+
+A quote is an HS256 JWT issued with a new order (``payment_quote`` in the
+create-order response) and signed with the ``ORDER_QUOTE_SECRET`` both
+services share. It carries ``order_id``, ``customer_id``, ``amount`` and
+``exp``. ``create_payment`` accepts it as ``order_quote``: a valid quote for
+the requested order replaces the ``GET /api/orders/<id>`` round trip, which
+in turn calls Restaurant Service. A missing, expired, forged or mismatched
+quote is not an error; the payment falls back to asking Order Service.
+"""
+import logging
+
+import jwt
+
+logger = logging.getLogger(__name__)
+
+QUOTE_AUDIENCE = 'payment-service'
+
+
+def order_from_quote(token, order_id, app):
+    """Order details (as ``GET /api/orders/<id>`` returns them) from a quote, or None."""
+    secret = app.config.get('ORDER_QUOTE_SECRET')
+    if not token or not secret:
+        return None
+    try:
+        claims = jwt.decode(token, secret, algorithms=['HS256'], audience=QUOTE_AUDIENCE,
+                            options={'require': ['exp', 'order_id', 'customer_id', 'amount']})
+    except jwt.InvalidTokenError as e:
+        logger.info(f"Ignoring order quote for order {order_id}: {str(e)}")
+        return None
+    if claims['order_id'] != order_id:
+        logger.info(f"Ignoring order quote for order {claims['order_id']} sent with order {order_id}")
+        return None
+    return {'id': claims['order_id'], 'customer_id': claims['customer_id'], 'total_amount': claims['amount']}
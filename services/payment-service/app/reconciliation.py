@@ -0,0 +1,187 @@
+"""Order/payment reconciliation.
+
+``flask reconcile`` checks that every delivered order has exactly one
+completed payment of the right amount. Orders live in Order Service's
+database, so they are read from its ``GET /api/orders/export`` NDJSON stream.
+Payments are read from this service in the same order (the rows
+``GET /api/payments/export`` serves). Both streams are sorted by order id and
+merge-joined, so memory holds one order's payments at a time, however large
+the window.
+
+Each run covers the orders after the previous completed run's
+``max_order_id``, up to the newest order created more than
+``RECONCILIATION_DELAY_SECONDS`` ago (default one hour, so payments in flight
+have settled). Order Service resolves that cutoff to an id bound, and both
+sides are read by the same id range, so consecutive runs neither overlap nor
+leave gaps.
+
+Mismatch kinds:
+
+- ``missing_payment``: a delivered order with no completed or refunded payment
+- ``refunded_but_delivered``: a delivered order whose payment was refunded
+- ``duplicate_payment``: an order with more than one completed payment
+- ``amount_mismatch``: the completed payment differs from the order total
+- ``orphan_payment``: a completed payment for an order Order Service does not have
+"""
+import json
+import logging
+from datetime import datetime, timedelta
+
+import requests
+from sqlalchemy import insert
+
+from . import db
+from .ledger import to_minor
+from .models import Payment, ReconciliationMismatch, ReconciliationRun
+
+logger = logging.getLogger(__name__)
+
+MISMATCH_BATCH_SIZE = 500
+
+
+class ReconciliationError(Exception):
+    pass
+
+
+def fetch_order_export_over_http(app):
+    """Build a fetcher returning ``(max_order_id, rows)`` from Order Service's export."""
+    def fetch(after_id, created_before):
+        try:
+            response = requests.get(
+                f"{app.config['ORDER_SERVICE_URL']}/api/orders/export",
+                params={'after_id': after_id, 'created_before': created_before.isoformat()},
+                headers={'X-Service-Token': app.config.get('SERVICE_AUTH_TOKEN') or ''},
+                stream=True,
+                timeout=30
+            )
+            response.raise_for_status()
+        except requests.exceptions.RequestException as e:
+            raise ReconciliationError(f'Could not export orders: {str(e)}')
+
+        def rows():
+            with response:
+                for line in response.iter_lines():
+                    if line:
+                        yield json.loads(line)
+        return int(response.headers['X-Max-Order-Id']), rows()
+    return fetch
+
+
+def payment_export_query(after_order_id, max_order_id):
+    return db.session.query(Payment.order_id, Payment.id, Payment.amount, Payment.currency, Payment.status).filter(
+        Payment.order_id > after_order_id, Payment.order_id <= max_order_id
+    ).order_by(Payment.order_id, Payment.id)
+
+
+def serialize_payment_row(row):
+    return {'order_id': row.order_id, 'payment_id': row.id, 'amount': row.amount,
+            'currency': row.currency, 'status': row.status}
+
+
+def _check_order(order, payments):
+    """Yield ``(kind, details)`` for one order and its payments."""
+    completed = [payment for payment in payments if payment['status'] == 'completed']
+    refunded = [payment for payment in payments if payment['status'] == 'refunded']
+    if order['status'] == 'delivered' and not completed:
+        if refunded:
+            yield 'refunded_but_delivered', {'payment_ids': [payment['payment_id'] for payment in refunded]}
+        else:
+            yield 'missing_payment', {'amount': order['amount']}
+    if len(completed) > 1:
+        yield 'duplicate_payment', {'payment_ids': [payment['payment_id'] for payment in completed]}
+    if len(completed) == 1:
+        payment = completed[0]
+        currency = payment.get('currency') or 'GHS'
+        if to_minor(payment['amount'], currency) != to_minor(order['amount'], currency):
+            yield 'amount_mismatch', {'payment_id': payment['payment_id'],
+                                      'order_amount': order['amount'], 'payment_amount': payment['amount']}
+
+
+def merge_join(orders, payments):
+    """Yield ``(order_id, kind, details)`` for two streams sorted by order id.
+
+    ``orders`` holds one dict per order; ``payments`` may hold several per order.
+    """
+    payments = iter(payments)
+    pending = next(payments, None)
+    for order in orders:
+        order_id = order['order_id']
+        # Payments for orders that sort before this one have no order
+        while pending is not None and pending['order_id'] < order_id:
+            if pending['status'] == 'completed':
+                yield pending['order_id'], 'orphan_payment', {'payment_id': pending['payment_id']}
+            pending = next(payments, None)
+        group = []
+        while pending is not None and pending['order_id'] == order_id:
+            group.append(pending)
+            pending = next(payments, None)
+        for kind, details in _check_order(order, group):
+            yield order_id, kind, details
+    while pending is not None:
+        if pending['status'] == 'completed':
+            yield pending['order_id'], 'orphan_payment', {'payment_id': pending['payment_id']}
+        pending = next(payments, None)
+
+
+class _Counted:
+    def __init__(self, rows):
+        self.rows = rows
+        self.count = 0
+
+    def __iter__(self):
+        for row in self.rows:
+            self.count += 1
+            yield row
+
+
+def reconcile(fetch_orders, created_before=None, after_order_id=None, delay_seconds=3600, batch_size=500):
+    """Run one incremental reconciliation; returns the finished run."""
+    if created_before is None:
+        created_before = datetime.utcnow() - timedelta(seconds=delay_seconds)
+    if after_order_id is None:
+        previous = ReconciliationRun.query.filter_by(status='completed').order_by(
+            ReconciliationRun.max_order_id.desc()
+        ).first()
+        after_order_id = previous.max_order_id if previous else 0
+
+    run = ReconciliationRun(after_order_id=after_order_id)
+    db.session.add(run)
+    db.session.commit()
+
+    try:
+        max_order_id, order_rows = fetch_orders(after_order_id, created_before)
+        run.max_order_id = max_order_id
+        db.session.commit()
+        orders = _Counted(order_rows)
+        # Payments are read on a connection of their own so mismatch inserts can commit meanwhile
+        with db.engine.connect() as connection:
+            result = connection.execution_options(stream_results=True, yield_per=batch_size).execute(
+                payment_export_query(after_order_id, max_order_id).statement
+            )
+            payments = _Counted(serialize_payment_row(row) for row in result)
+            batch = []
+            for order_id, kind, details in merge_join(orders, payments):
+                batch.append({'run_id': run.id, 'order_id': order_id, 'kind': kind,
+                              'details': details, 'created_at': datetime.utcnow()})
+                if len(batch) >= MISMATCH_BATCH_SIZE:
+                    db.session.execute(insert(ReconciliationMismatch), batch)
+                    run.mismatch_count += len(batch)
+                    db.session.commit()
+                    batch = []
+            if batch:
+                db.session.execute(insert(ReconciliationMismatch), batch)
+                run.mismatch_count += len(batch)
+            run.orders_checked = orders.count
+            run.payments_checked = payments.count
+            run.status = 'completed'
+            run.completed_at = datetime.utcnow()
+            db.session.commit()
+    except Exception:
+        db.session.rollback()
+        run.status = 'failed'
+        db.session.commit()
+        raise
+
+    logger.info(f"Reconciliation {run.id}: orders {after_order_id + 1}-{max_order_id}, "
+                f"{run.mismatch_count} mismatches")
+    return run
@@ -1,10 +1,21 @@
 from flask import Blueprint, request, jsonify, current_app, make_response
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from .models import Payment, db
+from .streaming import stream_ndjson
+from .processing import callback_url_allowed
+from .ledger import post_refund
+from .velocity import VelocityLimiter, card_fingerprint
+from .quotes import order_from_quote
+from .auth import service_auth_required
+from .db_pool import statement_timeout
+from .reconciliation import payment_export_query, serialize_payment_row
 from marshmallow import Schema, fields, validate, ValidationError
+from sqlalchemy import tuple_
 from sqlalchemy.exc import NoResultFound
+from datetime import datetime
 import requests
 import logging
+import base64
 import json
 import uuid
 
@@ -35,19 +46,86 @@ def get_order_details(order_id, app):
         logger.error(f"Error getting order details: {str(e)}")
         return None
 
+def encode_cursor(payment):
+    """Opaque cursor pointing just past ``payment`` in history order"""
+    raw = json.dumps([payment.created_at.isoformat(), payment.id])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+    created_at, payment_id = json.loads(raw)
+    return datetime.fromisoformat(created_at), int(payment_id)
+
+def payment_history_query(customer_id, status=None, payment_method=None, created_after=None,
+                          created_before=None, after=None):
+    """One customer's payments, newest first, resuming after ``(created_at, id)``.
+
+    Served by ``ix_payments_customer_created_id``, or by
+    ``ix_payments_customer_status_created_id`` when filtering on status.
+    """
+    query = Payment.query.filter(Payment.customer_id == customer_id)
+    if status:
+        query = query.filter(Payment.status == status)
+    if payment_method:
+        query = query.filter(Payment.payment_method == payment_method)
+    if created_after:
+        query = query.filter(Payment.created_at >= created_after)
+    if created_before:
+        query = query.filter(Payment.created_at < created_before)
+    if after:
+        # A row-value comparison lets the index seek straight to the cursor
+        query = query.filter(tuple_(Payment.created_at, Payment.id) < after)
+    return query.order_by(Payment.created_at.desc(), Payment.id.desc())
+
 @payment_bp.route('/', methods=['GET'])
 @jwt_required()
 def get_payments():
+    """Page through the caller's payments; ``X-Next-Cursor`` is set when more remain"""
     try:
         user_id = str(get_jwt_identity())
-        payments = Payment.query.filter_by(customer_id=user_id).all()
-        response = make_response(jsonify([payment.to_dict() for payment in payments]))
+        page_max = current_app.config.get('PAYMENTS_PAGE_MAX', 200)
+        limit = request.args.get('limit', current_app.config.get('PAYMENTS_PAGE_SIZE', 50), type=int)
+        if limit < 1 or limit > page_max:
+            return jsonify({'error': f'limit must be between 1 and {page_max}'}), 400
+        try:
+            after = decode_cursor(request.args['cursor']) if request.args.get('cursor') else None
+            created_after, created_before = (
+                datetime.fromisoformat(request.args[name]) if request.args.get(name) else None
+                for name in ('created_after', 'created_before')
+            )
+        except (ValueError, TypeError):
+            return jsonify({'error': 'Invalid cursor or date'}), 400
+        
+        # One extra row tells whether there is a next page
+        payments = payment_history_query(
+            user_id, request.args.get('status'), request.args.get('payment_method'),
+            created_after, created_before, after
+        ).limit(limit + 1).all()
+        
+        response = make_response(jsonify([payment.to_dict() for payment in payments[:limit]]))
         response.headers['Content-Type'] = 'application/json; charset=utf-8'
+        if len(payments) > limit:
+            response.headers['X-Next-Cursor'] = encode_cursor(payments[limit - 1])
         return response
     except Exception as e:
         logger.error("Error getting payments: %s", str(e))
         return jsonify({'error': 'Failed to get payments'}), 500
 
+@payment_bp.route('/export', methods=['GET'])
+@service_auth_required
+@statement_timeout('DB_EXPORT_STATEMENT_TIMEOUT_MS')
+def export_payments():
+    """Stream payments for orders ``after_order_id < order_id <= max_order_id`` as NDJSON."""
+    try:
+        after_order_id = request.args.get('after_order_id', 0, type=int)
+        max_order_id = request.args.get('max_order_id', type=int)
+        if max_order_id is None:
+            return jsonify({'error': 'max_order_id is required'}), 400
+        return stream_ndjson(payment_export_query(after_order_id, max_order_id), serialize_payment_row)
+    except Exception as e:
+        logger.error("Error exporting payments: %s", str(e))
+        return jsonify({'error': 'Failed to export payments'}), 500
+
 @payment_bp.route('/<int:id>', methods=['GET'])
 @jwt_required()
 def get_payment(id):
@@ -83,38 +161,59 @@ def create_payment():
                 'missing_fields': missing_fields
             }), 400
         
-        # Get order details
-        order = get_order_details(data['order_id'], current_app)
-        if not order:
-            return jsonify({'error': 'Order not found'}), 404
-        
         # Get user ID from JWT
         user_id = str(get_jwt_identity())
         
+        # Velocity rules run before the order lookup and any database work
+        details = data.get('payment_details') if isinstance(data.get('payment_details'), dict) else {}
+        rule = current_app.extensions['velocity'].check({
+            'customer': user_id,
+            'card': card_fingerprint(details),
+            'device': request.headers.get('X-Device-Id') or details.get('device_id')
+        })
+        if rule is not None:
+            logger.warning("Payment attempt by %s blocked by velocity rule %s", user_id, rule.name)
+            response = make_response(jsonify({'error': 'Too many payment attempts', 'rule': rule.name}), 429)
+            response.headers['Retry-After'] = str(VelocityLimiter.retry_after(rule))
+            return response
+        
+        # A valid quote from Order Service stands in for asking it
+        order = order_from_quote(data.get('order_quote'), data['order_id'], current_app)
+        if order is None:
+            order = get_order_details(data['order_id'], current_app)
+        if not order:
+            return jsonify({'error': 'Order not found'}), 404
+        
         # Verify user owns the order
         if order['customer_id'] != user_id:
             return jsonify({'error': 'Unauthorized'}), 403
         
-        # Create payment record
+        callback_url = data.get('callback_url')
+        if callback_url is not None and not callback_url_allowed(
+            callback_url, current_app.config.get('PAYMENT_CALLBACK_HOSTS', ())
+        ):
+            return jsonify({'error': 'callback_url host is not allowed'}), 400
+        
+        # Record the payment as pending in a single transaction; the provider
+        # is called by the background processor, not inside this request
         payment = Payment(
             order_id=data['order_id'],
             customer_id=user_id,
             amount=order['total_amount'],
             payment_method=data['payment_method'],
             payment_details=data.get('payment_details'),
+            callback_url=callback_url,
+            status='pending',
             transaction_id=str(uuid.uuid4())  # Generate a unique transaction ID
         )
         
         db.session.add(payment)
         db.session.commit()
         
-        # TODO: Integrate with actual payment provider
-        # For now, we'll simulate a successful payment
-        payment.status = 'completed'
-        db.session.commit()
-        
         response = make_response(jsonify(payment.to_dict()))
         response.headers['Content-Type'] = 'application/json; charset=utf-8'
+        response.headers['Location'] = f'/api/payments/{payment.id}'
+        current_app.extensions['payment_processor'].submit(payment.id)
         return response, 201
         
     except Exception as e:
@@ -126,23 +225,25 @@ def create_payment():
 @jwt_required()
 def refund_payment(id):
     try:
-        payment = Payment.query.filter_by(id=id).first()
-        if not payment:
-            return jsonify({'error': 'Payment not found'}), 404
-            
         user_id = str(get_jwt_identity())
         
-        # Verify user owns the payment
-        if payment.customer_id != user_id:
-            return jsonify({'error': 'Unauthorized'}), 403
+        # Another customer's payment is indistinguishable from a missing one
+        payment = Payment.query.filter_by(id=id, customer_id=user_id).first()
+        if not payment:
+            return jsonify({'error': 'Payment not found'}), 404
         
-        # Check if payment can be refunded
-        if payment.status != 'completed':
+        # Claim the refund; of two concurrent refunds only one reverses the ledger
+        claimed = Payment.query.filter_by(id=id, customer_id=user_id, status='completed').update(
+            {'status': 'refunded', 'updated_at': datetime.utcnow()}, synchronize_session=False
+        )
+        if not claimed:
+            db.session.rollback()
             return jsonify({'error': 'Payment cannot be refunded'}), 400
+        db.session.refresh(payment)
         
         # TODO: Integrate with actual payment provider for refund
-        # For now, we'll just update the status
-        payment.status = 'refunded'
+        # For now, we'll just reverse the ledger posting
+        post_refund(payment)
         db.session.commit()
         
         response = make_response(jsonify(payment.to_dict()))
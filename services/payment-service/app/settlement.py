@@ -0,0 +1,174 @@
+"""Restaurant payout settlement.
+
+``flask settle --start 2026-10-01 --end 2026-10-08`` pays restaurants for the
+payments completed in ``[start, end)``:
+
+1. Payments are streamed in id order through a server-side cursor on their
+   own connection, ``SETTLEMENT_CHUNK_SIZE`` rows at a time.
+2. The orders of a chunk are resolved to restaurants with one call to Order
+   Service's ``POST /api/orders/batch``.
+3. The chunk's per-restaurant totals are added to ``settlement_lines``, and
+   the run's checkpoint (``last_payment_id``) advances in the same commit.
+   Memory use is bounded by the chunk size, not the number of payments.
+4. Once the stream is exhausted, one ``Payout`` per restaurant and currency is
+   written together with its ledger posting, and the run is marked
+   ``completed`` in that same commit.
+
+A run that stops part way (crash, Order Service outage) resumes after its
+checkpoint when the same command is run again. Settling a completed period
+again is a no-op. Only payments that are ``completed`` when the stream
+reaches them are paid out, so settle a period once its payments have
+finished processing.
+"""
+import logging
+from collections import defaultdict
+from datetime import datetime
+
+import requests
+from sqlalchemy import bindparam, insert, select, tuple_, update
+
+from . import db
+from .ledger import post_payouts, to_minor
+from .models import Payment, Payout, SettlementLine, SettlementRun
+
+logger = logging.getLogger(__name__)
+
+ORDER_BATCH_SIZE = 1000
+
+_lines = SettlementLine.__table__
+_increment_line = update(_lines).where(
+    _lines.c.run_id == bindparam('run'),
+    _lines.c.restaurant_id == bindparam('restaurant'),
+    _lines.c.currency == bindparam('cur')
+).values(
+    amount_minor=_lines.c.amount_minor + bindparam('delta'),
+    payment_count=_lines.c.payment_count + bindparam('count')
+)
+
+
+class SettlementError(Exception):
+    pass
+
+
+def fetch_order_restaurants_over_http(app):
+    """Build a lookup resolving order ids to restaurant ids through Order Service."""
+    def lookup(order_ids):
+        restaurants = {}
+        for i in range(0, len(order_ids), ORDER_BATCH_SIZE):
+            try:
+                response = requests.post(
+                    f"{app.config['ORDER_SERVICE_URL']}/api/orders/batch",
+                    json={'ids': order_ids[i:i + ORDER_BATCH_SIZE]},
+                    headers={'X-Service-Token': app.config.get('SERVICE_AUTH_TOKEN') or ''},
+                    timeout=30
+                )
+                response.raise_for_status()
+            except requests.exceptions.RequestException as e:
+                raise SettlementError(f'Could not resolve orders: {str(e)}')
+            for order in response.json()['orders']:
+                restaurants[order['id']] = order['restaurant_id']
+        return restaurants
+    return lookup
+
+
+def _get_run(start, end):
+    run = SettlementRun.query.filter_by(period_start=start, period_end=end).first()
+    if run is None:
+        run = SettlementRun(period_start=start, period_end=end)
+        db.session.add(run)
+        db.session.commit()
+    return run
+
+
+def _apply_chunk(run, rows, lookup):
+    restaurants = lookup(sorted({row.order_id for row in rows}))
+    totals = defaultdict(lambda: [0, 0])
+    unresolved = 0
+    for row in rows:
+        restaurant_id = restaurants.get(row.order_id)
+        if restaurant_id is None:
+            unresolved += 1
+            continue
+        total = totals[(restaurant_id, row.currency)]
+        total[0] += to_minor(row.amount, row.currency)
+        total[1] += 1
+
+    if totals:
+        existing = set(db.session.execute(
+            select(SettlementLine.restaurant_id, SettlementLine.currency).where(
+                SettlementLine.run_id == run.id,
+                SettlementLine.restaurant_id.in_({restaurant_id for restaurant_id, _ in totals})
+            )
+        ).tuples())
+        changes = [
+            {'run': run.id, 'restaurant': restaurant_id, 'cur': currency, 'delta': amount_minor, 'count': count}
+            for (restaurant_id, currency), (amount_minor, count) in totals.items()
+        ]
+        updates = [change for change in changes if (change['restaurant'], change['cur']) in existing]
+        inserts = [change for change in changes if (change['restaurant'], change['cur']) not in existing]
+        if updates:
+            db.session.execute(_increment_line, updates)
+        if inserts:
+            db.session.execute(insert(SettlementLine), [
+                {'run_id': change['run'], 'restaurant_id': change['restaurant'], 'currency': change['cur'],
+                 'amount_minor': change['delta'], 'payment_count': change['count']}
+                for change in inserts
+            ])
+
+    run.last_payment_id = rows[-1].id
+    run.payment_count += len(rows)
+    run.unresolved_count += unresolved
+    db.session.commit()
+
+
+def _write_payouts(run, chunk_size):
+    after = (-1, '')
+    while True:
+        lines = db.session.execute(
+            select(SettlementLine.restaurant_id, SettlementLine.currency,
+                   SettlementLine.amount_minor, SettlementLine.payment_count).where(
+                SettlementLine.run_id == run.id,
+                tuple_(SettlementLine.restaurant_id, SettlementLine.currency) > after
+            ).order_by(SettlementLine.restaurant_id, SettlementLine.currency).limit(chunk_size)
+        ).all()
+        if not lines:
+            break
+        lines_to_pay = [line for line in lines if line.amount_minor > 0]
+        transaction_ids = post_payouts(
+            (line.restaurant_id, line.amount_minor, line.currency) for line in lines_to_pay
+        )
+        if lines_to_pay:
+            db.session.execute(insert(Payout), [
+                {'run_id': run.id, 'restaurant_id': line.restaurant_id, 'amount_minor': line.amount_minor,
+                 'currency': line.currency, 'payment_count': line.payment_count,
+                 'period_start': run.period_start, 'period_end': run.period_end, 'status': 'pending',
+                 'ledger_transaction_id': transaction_id, 'created_at': datetime.utcnow()}
+                for line, transaction_id in zip(lines_to_pay, transaction_ids)
+            ])
+        after = (lines[-1].restaurant_id, lines[-1].currency)
+
+
+def settle(start, end, lookup, chunk_size=1000):
+    """Settle ``[start, end)``, resuming an interrupted run; returns the run."""
+    run = _get_run(start, end)
+    if run.status == 'completed':
+        return run
+
+    query = select(Payment.id, Payment.order_id, Payment.amount, Payment.currency).where(
+        Payment.status == 'completed',
+        Payment.created_at >= start,
+        Payment.created_at < end,
+        Payment.id > run.last_payment_id
+    ).order_by(Payment.id)
+    # The stream has a connection of its own so checkpoint commits do not close it
+    with db.engine.connect() as connection:
+        result = connection.execution_options(stream_results=True, yield_per=chunk_size).execute(query)
+        for rows in result.partitions():
+            _apply_chunk(run, rows, lookup)
+            logger.info(f"Settlement {run.id}: checkpoint at payment {run.last_payment_id}")
+
+    _write_payouts(run, chunk_size)
+    run.status = 'completed'
+    run.completed_at = datetime.utcnow()
+    db.session.commit()
+    return run
@@ -0,0 +1,232 @@
+"""Sliding-window velocity checks for payment attempts.
+
+``create_payment`` asks the ``VelocityLimiter`` whether an attempt may go
+ahead before it looks up the order or touches the database. Each rule in
+``VELOCITY_RULES`` limits how many attempts one value of a dimension may make
+within a window:
+
+- ``customer``: the JWT identity
+- ``card``: a fingerprint of the card in ``payment_details`` (see
+  ``card_fingerprint``)
+- ``device``: the ``X-Device-Id`` header, or ``payment_details.device_id``
+
+A rule is a dict such as ``{"name": "card_hour", "dimension": "card",
+"limit": 10, "window_seconds": 3600, "buckets": 12}``. Attempts are counted
+in a ring of ``buckets`` fixed-width buckets per key, so memory per key is
+constant and a check costs a few dictionary lookups. Counts may run up to one
+bucket width (``window_seconds / buckets``) longer than the window. An attempt
+is counted against every rule only when all of them allow it, so rejected
+attempts do not extend a block.
+
+``VELOCITY_BACKEND`` selects where the counters live:
+
+- ``local`` (default): in process memory. Each worker counts on its own, so
+  the effective limit is multiplied by the number of workers.
+- ``redis``: one hash per key in ``VELOCITY_REDIS_URL``, shared by every
+  worker and instance. The check and the increments run as one Lua script.
+  Needs the ``redis`` package, which is not installed by default.
+"""
+import hashlib
+import math
+import threading
+import time
+from collections import namedtuple
+
+Rule = namedtuple('Rule', ['name', 'dimension', 'limit', 'window_seconds', 'buckets'])
+
+DIMENSIONS = ('customer', 'card', 'device')
+
+DEFAULT_RULES = [
+    {'name': 'customer_minute', 'dimension': 'customer', 'limit': 5, 'window_seconds': 60, 'buckets': 12},
+    {'name': 'customer_hour', 'dimension': 'customer', 'limit': 20, 'window_seconds': 3600, 'buckets': 12},
+    {'name': 'card_hour', 'dimension': 'card', 'limit': 10, 'window_seconds': 3600, 'buckets': 12},
+    {'name': 'device_minute', 'dimension': 'device', 'limit': 10, 'window_seconds': 60, 'buckets': 12},
+]
+
+
+def parse_rules(rules):
+    parsed = []
+    for rule in rules:
+        if rule['dimension'] not in DIMENSIONS:
+            raise ValueError(f"Unknown velocity dimension: {rule['dimension']}")
+        parsed.append(Rule(rule['name'], rule['dimension'], int(rule['limit']),
+                           float(rule['window_seconds']), int(rule.get('buckets', 12))))
+    return parsed
+
+
+def card_fingerprint(payment_details):
+    """Identify a card without keeping its details.
+
+    Prefers a provider-issued ``card_fingerprint``; otherwise hashes brand,
+    last four digits and expiry. Returns None when there is no card.
+    """
+    if not payment_details:
+        return None
+    if payment_details.get('card_fingerprint'):
+        return str(payment_details['card_fingerprint'])
+    if not payment_details.get('card_last4'):
+        return None
+    parts = [str(payment_details.get(field, '')).lower()
+             for field in ('card_brand', 'card_last4', 'card_exp_month', 'card_exp_year')]
+    return hashlib.sha256('|'.join(parts).encode()).hexdigest()[:32]
+
+
+class LocalBackend:
+    """Ring counters in process memory.
+
+    A window is ``[counts, total, current_bucket, expires_at]``. Idle windows
+    are dropped once there are more than ``max_keys`` of them.
+    """
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._windows = {}
+
+    @staticmethod
+    def _advance(window, current, buckets):
+        elapsed = current - window[2]
+        if elapsed <= 0:
+            return
+        counts = window[0]
+        if elapsed >= buckets:
+            counts[:] = [0] * buckets
+            window[1] = 0
+        else:
+            for bucket in range(window[2] + 1, current + 1):
+                index = bucket % buckets
+                window[1] -= counts[index]
+                counts[index] = 0
+        window[2] = current
+
+    def hit(self, checks, now):
+        """Count an attempt against every ``(key, rule)`` if all allow it.
+
+        Returns the index of the first check at its limit, or None.
+        """
+        with self._lock:
+            seen = []
+            for i, (key, rule) in enumerate(checks):
+                width = rule.window_seconds / rule.buckets
+                current = int(now // width)
+                window = self._windows.get(key)
+                if window is not None:
+                    self._advance(window, current, rule.buckets)
+                    if window[1] >= rule.limit:
+                        return i
+                elif rule.limit <= 0:
+                    return i
+                seen.append((key, rule, window, current))
+
+            for key, rule, window, current in seen:
+                if window is None:
+                    window = self._windows[key] = [[0] * rule.buckets, 0, current, 0]
+                window[0][current % rule.buckets] += 1
+                window[1] += 1
+                window[3] = now + rule.window_seconds
+            if len(self._windows) > self.max_keys:
+                self._evict(now)
+            return None
+
+    def _evict(self, now):
+        self._windows = {key: window for key, window in self._windows.items() if window[3] > now}
+        # Still full of live keys: drop the oldest tenth
+        overflow = len(self._windows) - int(self.max_keys * 0.9)
+        if overflow > 0:
+            for key in list(self._windows)[:overflow]:
+                del self._windows[key]
+
+    def __len__(self):
+        return len(self._windows)
+
+
+# KEYS: one hash per check. ARGV: limit, current bucket, buckets, ttl for each check.
+# Fields are bucket numbers; fields older than the window are deleted as they are read.
+_REDIS_HIT = """
+for i = 1, #KEYS do
+    local base = (i - 1) * 4
+    local limit = tonumber(ARGV[base + 1])
+    local oldest = tonumber(ARGV[base + 2]) - tonumber(ARGV[base + 3]) + 1
+    local fields = redis.call('HGETALL', KEYS[i])
+    local total = 0
+    for j = 1, #fields, 2 do
+        if tonumber(fields[j]) < oldest then
+            redis.call('HDEL', KEYS[i], fields[j])
+        else
+            total = total + tonumber(fields[j + 1])
+        end
+    end
+    if total >= limit then
+        return i
+    end
+end
+for i = 1, #KEYS do
+    local base = (i - 1) * 4
+    redis.call('HINCRBY', KEYS[i], ARGV[base + 2], 1)
+    redis.call('EXPIRE', KEYS[i], ARGV[base + 4])
+end
+return 0
+"""
+
+
+class RedisBackend:
+    """Ring counters shared through Redis; at most ``buckets`` fields per key."""
+
+    def __init__(self, client, prefix='velocity:'):
+        self.client = client
+        self.prefix = prefix
+        self._script = client.register_script(_REDIS_HIT)
+
+    @classmethod
+    def from_url(cls, url):
+        try:
+            import redis
+        except ImportError:
+            raise ValueError('VELOCITY_BACKEND=redis needs the redis package')
+        return cls(redis.Redis.from_url(url))
+
+    def hit(self, checks, now):
+        keys, args = [], []
+        for key, rule in checks:
+            width = rule.window_seconds / rule.buckets
+            keys.append(self.prefix + key)
+            args.extend([rule.limit, int(now // width), rule.buckets, math.ceil(rule.window_seconds + width)])
+        result = int(self._script(keys=keys, args=args))
+        return result - 1 if result else None
+
+
+class VelocityLimiter:
+    def __init__(self, rules, backend=None):
+        self.rules = parse_rules(rules)
+        self.backend = backend if backend is not None else LocalBackend()
+
+    @classmethod
+    def from_config(cls, app):
+        rules = app.config.get('VELOCITY_RULES')
+        name = app.config.get('VELOCITY_BACKEND', 'local')
+        if name == 'local':
+            backend = LocalBackend(app.config.get('VELOCITY_MAX_KEYS', 100000))
+        elif name == 'redis':
+            backend = RedisBackend.from_url(app.config['VELOCITY_REDIS_URL'])
+        else:
+            raise ValueError(f'Unknown velocity backend: {name}')
+        return cls(DEFAULT_RULES if rules is None else rules, backend)
+
+    def check(self, values, now=None):
+        """Count an attempt by ``values`` (dimension -> value).
+
+        Returns the first ``Rule`` the attempt would break, in which case
+        nothing is counted, or None. Rules whose dimension has no value are
+        skipped.
+        """
+        checks = [(f'{rule.name}:{values[rule.dimension]}', rule)
+                  for rule in self.rules if values.get(rule.dimension) is not None]
+        if not checks:
+            return None
+        index = self.backend.hit(checks, time.time() if now is None else now)
+        return None if index is None else checks[index][1]
+
+    @staticmethod
+    def retry_after(rule):
+        """Seconds until the oldest bucket of ``rule`` leaves the window."""
+        return max(1, math.ceil(rule.window_seconds / rule.buckets))
@@ -0,0 +1,113 @@
+"""Per-request overhead of the metrics instrumentation.
+
+Times --requests requests through the Flask test client to a bench route
+that runs --queries ``SELECT 1`` statements. It does this once with the
+instrumentation hooks installed and once with them removed (the request
+hooks and the SQLAlchemy cursor listeners). Runs alternate for --rounds
+rounds, and the medians are compared. The difference is the overhead a
+request pays for its metrics. It is within the run-to-run noise of the test
+client, so the same hook calls are also timed on their own ("hooks alone").
+
+Usage:
+    python benchmarks/bench_instrumentation.py --requests 5000 --queries 3 --rounds 5
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from flask import request
+from sqlalchemy import event, text
+from sqlalchemy.engine import Engine
+
+from app import create_app, db
+from app import instrumentation
+
+
+def per_request(client, count):
+    start = time.perf_counter()
+    for _ in range(count):
+        client.get('/bench')
+    return (time.perf_counter() - start) / count
+
+
+def set_hooks(app, hooks, enabled):
+    before, after = hooks
+    if enabled:
+        app.before_request_funcs.setdefault(None, []).append(before)
+        app.after_request_funcs.setdefault(None, []).append(after)
+        event.listen(Engine, 'before_cursor_execute', instrumentation._before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', instrumentation._after_cursor_execute)
+    else:
+        app.before_request_funcs[None].remove(before)
+        app.after_request_funcs[None].remove(after)
+        event.remove(Engine, 'before_cursor_execute', instrumentation._before_cursor_execute)
+        event.remove(Engine, 'after_cursor_execute', instrumentation._after_cursor_execute)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--queries', type=int, default=3)
+    parser.add_argument('--rounds', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(directory, 'bench.db')}"
+        os.environ['REVOCATION_SYNC_SECONDS'] = '0'
+        app = create_app()
+
+        @app.route('/bench')
+        def bench():
+            for _ in range(args.queries):
+                db.session.execute(text('SELECT 1'))
+            return 'ok'
+
+        hooks = (
+            next(f for f in app.before_request_funcs[None] if f.__name__ == 'start_request_metrics'),
+            next(f for f in app.after_request_funcs[None] if f.__name__ == 'record_request_metrics')
+        )
+        client = app.test_client()
+        per_request(client, 500)
+
+        timings = {True: [], False: []}
+        for _ in range(args.rounds):
+            for enabled in (False, True):
+                if not enabled:
+                    set_hooks(app, hooks, False)
+                timings[enabled].append(per_request(client, args.requests))
+                if not enabled:
+                    set_hooks(app, hooks, True)
+
+        plain = statistics.median(timings[False])
+        instrumented = statistics.median(timings[True])
+        print(f'{args.requests:,} requests x {args.rounds} rounds, {args.queries} queries each')
+        print(f'without metrics: {plain * 1e6:8.1f} us/request')
+        print(f'with metrics:    {instrumented * 1e6:8.1f} us/request')
+        print(f'overhead:        {(instrumented - plain) * 1e6:8.1f} us/request')
+
+        # The same hook calls without the test client's noise around them
+        response = app.response_class('ok')
+        with app.test_request_context('/bench'):
+            request.url_rule = next(app.url_map.iter_rules('bench'))
+            start = time.perf_counter()
+            for _ in range(100000):
+                hooks[0]()
+                for _ in range(args.queries):
+                    instrumentation._before_cursor_execute(None, None, None, None, None, False)
+                    instrumentation._after_cursor_execute(None, None, None, None, None, False)
+                hooks[1](response)
+            print(f'hooks alone:     {(time.perf_counter() - start) / 100000 * 1e6:8.1f} us/request')
+
+        metrics = app.extensions['metrics']
+        start = time.perf_counter()
+        body = metrics.render()
+        print(f'render /metrics ({body.count(chr(10))} lines): {(time.perf_counter() - start) * 1000:.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+"""Balance reads at ledger scale: naive summation vs snapshot plus delta.
+
+Fills a SQLite ledger with --entries legs (half on the hot ``clearing``
+account, the rest spread over --customers customer accounts), snapshots it,
+posts --delta more entries, then times:
+
+- "naive": SUM(amount_minor) over every entry of the account
+- "snapshot": BalanceSnapshot row plus the entries above its watermark
+- "snapshot run": folding the --delta new entries into the snapshots
+
+Usage:
+    python benchmarks/bench_ledger_balance.py --entries 10000000 --customers 100000 --delta 1000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import func
+
+from app import create_app, db
+from app.ledger import balance, snapshot_balances
+from app.models import LedgerEntry
+
+BATCH = 50000
+
+
+def fill(path, postings, customers, created_at, rng):
+    """Insert ``postings`` charges (two legs each) straight through sqlite3."""
+    connection = sqlite3.connect(path)
+    connection.execute('PRAGMA journal_mode=WAL')
+    connection.execute('PRAGMA synchronous=OFF')
+    stamp = created_at.isoformat(sep=' ')
+    rows = []
+    for i in range(postings):
+        transaction_id = uuid.UUID(int=rng.getrandbits(128)).hex
+        amount = rng.randint(500, 50000)
+        rows.append((transaction_id, 'charge', 'clearing', amount, 'GHS', i, stamp))
+        rows.append((transaction_id, 'charge', f'customer:{rng.randrange(customers)}', -amount, 'GHS', i, stamp))
+        if len(rows) >= BATCH:
+            connection.executemany(
+                'INSERT INTO ledger_entries (transaction_id, entry_type, account, amount_minor, currency, '
+                'payment_id, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)', rows
+            )
+            rows = []
+    if rows:
+        connection.executemany(
+            'INSERT INTO ledger_entries (transaction_id, entry_type, account, amount_minor, currency, '
+            'payment_id, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)', rows
+        )
+    connection.commit()
+    connection.close()
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        value = fn()
+        samples.append(time.perf_counter() - start)
+    return value, statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--entries', type=int, default=10000000)
+    parser.add_argument('--customers', type=int, default=100000)
+    parser.add_argument('--delta', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'ledger.db')
+        os.environ['DATABASE_URL'] = f'sqlite:///{path}'
+        app = create_app()
+
+        start = time.perf_counter()
+        fill(path, args.entries // 2, args.customers, datetime.utcnow() - timedelta(hours=1), rng)
+        print(f'loaded {args.entries:,} entries in {time.perf_counter() - start:.1f}s')
+
+        with app.app_context():
+            start = time.perf_counter()
+            snapshot_balances(lag_seconds=0)
+            print(f'initial snapshot of every account: {time.perf_counter() - start:.1f}s')
+
+        fill(path, args.delta // 2, args.customers, datetime.utcnow() - timedelta(minutes=5), rng)
+
+        with app.app_context():
+            customer = f'customer:{rng.randrange(args.customers)}'
+            print(f"{'account':<18} {'entries':>10} {'naive ms':>10} {'snapshot ms':>12}")
+            for account in ('clearing', customer):
+                naive_query = lambda: db.session.query(func.sum(LedgerEntry.amount_minor)).filter(
+                    LedgerEntry.account == account, LedgerEntry.currency == 'GHS'
+                ).scalar()
+                naive, naive_seconds = timed(naive_query, args.repeat)
+                fast, fast_seconds = timed(lambda: balance(account), args.repeat)
+                assert naive == fast, (account, naive, fast)
+                count = LedgerEntry.query.filter_by(account=account).count()
+                print(f'{account:<18} {count:>10,} {naive_seconds * 1000:>10.2f} {fast_seconds * 1000:>12.3f}')
+
+            start = time.perf_counter()
+            updated = snapshot_balances(lag_seconds=60)
+            print(f'incremental snapshot run over {args.delta:,} new entries ({updated} accounts): '
+                  f'{(time.perf_counter() - start) * 1000:.1f}ms')
+
+
+if __name__ == '__main__':
+    main()
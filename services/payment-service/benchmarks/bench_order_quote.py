@@ -0,0 +1,132 @@
+"""End-to-end create_payment latency: HTTP order lookup vs a signed order quote.
+
+Starts two local stub services on loopback:
+
+- a Restaurant Service stub answering ``GET /api/restaurants/<id>`` after
+  --restaurant-ms
+- an Order Service stub answering ``GET /api/orders/<id>`` after --order-ms
+  that, like ``Order.to_dict`` for an order without a cached menu snapshot,
+  calls the restaurant stub before replying
+
+then times ``POST /api/payments/`` against a Payment Service app on a
+temporary SQLite database, once per mode:
+
+- "http": no quote, so the payment looks the order up through the chain
+- "quote": the request carries a quote signed as Order Service issues it
+
+Usage:
+    python benchmarks/bench_order_quote.py --requests 500 --order-ms 5 --restaurant-ms 5
+"""
+import argparse
+import json
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import jwt
+import requests
+from werkzeug.serving import make_server
+from werkzeug.wrappers import Request, Response
+
+QUOTE_SECRET = 'bench-order-quote-secret-0123456789'
+AMOUNT = 57.5
+CUSTOMER_ID = 'bench'
+
+
+def serve(wsgi_app):
+    server = make_server('127.0.0.1', 0, wsgi_app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def restaurant_stub(delay):
+    @Request.application
+    def application(request):
+        time.sleep(delay)
+        return Response(json.dumps({'id': 1, 'name': 'Stub Restaurant'}), content_type='application/json')
+    return application
+
+
+def order_stub(delay, restaurant_url):
+    session = requests.Session()
+
+    @Request.application
+    def application(request):
+        order_id = int(request.path.rstrip('/').rsplit('/', 1)[-1])
+        time.sleep(delay)
+        restaurant = session.get(f'{restaurant_url}/api/restaurants/1', timeout=5).json()
+        return Response(json.dumps({'id': order_id, 'customer_id': CUSTOMER_ID, 'total_amount': AMOUNT,
+                                    'restaurant_name': restaurant['name']}), content_type='application/json')
+    return application
+
+
+def quote(order_id, customer_id):
+    now = int(time.time())
+    return jwt.encode({'order_id': order_id, 'customer_id': customer_id, 'amount': AMOUNT,
+                       'aud': 'payment-service', 'iat': now, 'exp': now + 900}, QUOTE_SECRET, algorithm='HS256')
+
+
+def run(client, token, count, first_order_id, with_quote):
+    headers = {'Authorization': f'Bearer {token}', 'Content-Type': 'application/json'}
+    samples = []
+    for order_id in range(first_order_id, first_order_id + count):
+        body = {'order_id': order_id, 'payment_method': 'card'}
+        if with_quote:
+            body['order_quote'] = quote(order_id, CUSTOMER_ID)
+        start = time.perf_counter()
+        response = client.post('/api/payments/', headers=headers, data=json.dumps(body))
+        samples.append(time.perf_counter() - start)
+        assert response.status_code == 201, response.data
+    samples.sort()
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--order-ms', type=float, default=5.0)
+    parser.add_argument('--restaurant-ms', type=float, default=5.0)
+    args = parser.parse_args()
+
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    restaurant = serve(restaurant_stub(args.restaurant_ms / 1000))
+    order = serve(order_stub(args.order_ms / 1000, f'http://127.0.0.1:{restaurant.server_port}'))
+
+    with tempfile.TemporaryDirectory() as directory:
+        os.environ.update({
+            'DATABASE_URL': f"sqlite:///{os.path.join(directory, 'payments.db')}",
+            'ORDER_SERVICE_URL': f'http://127.0.0.1:{order.server_port}',
+            'ORDER_QUOTE_SECRET': QUOTE_SECRET,
+            'PAYMENT_WORKERS': '0',
+            'MOCK_PROVIDER_LATENCY_MS': '0',
+            'REVOCATION_SYNC_SECONDS': '0',
+            'VELOCITY_RULES': '[]'
+        })
+        from app import create_app
+        from flask_jwt_extended import create_access_token
+        app = create_app()
+        with app.app_context():
+            token = create_access_token(identity=CUSTOMER_ID)
+        client = app.test_client()
+
+        # Warm up connections and the database before timing
+        run(client, token, 20, 10 ** 6, False)
+        print(f"{'mode':<6} {'requests':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'mean ms':>8}")
+        for offset, (mode, with_quote) in enumerate((('http', False), ('quote', True))):
+            samples = run(client, token, args.requests, (offset + 1) * 10 ** 7, with_quote)
+            print(f'{mode:<6} {len(samples):>8} {samples[len(samples) // 2] * 1000:>8.2f} '
+                  f'{samples[int(len(samples) * 0.95)] * 1000:>8.2f} '
+                  f'{samples[int(len(samples) * 0.99)] * 1000:>8.2f} {statistics.mean(samples) * 1000:>8.2f}')
+
+    order.shutdown()
+    restaurant.shutdown()
+
+
+if __name__ == '__main__':
+    main()
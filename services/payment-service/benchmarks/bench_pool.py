@@ -0,0 +1,123 @@
+"""Where the database connection pool runs out.
+
+Boots the app against a SQLite file with a pool of --pool-size connections
+plus --max-overflow, all of them warmed. Then, for each --concurrency level,
+that many threads check out a connection for --duration seconds, run
+``SELECT 1``, and hold the connection for --hold-ms to stand in for a
+request's queries. Prints checkouts per second, the checkout wait p50/p99 and
+the checkouts that gave up after --pool-timeout seconds. The wait includes
+the checkouts that gave up.
+
+Up to pool size plus overflow threads, every checkout finds a connection and
+throughput grows with the threads. Past it, throughput stays flat and the
+extra threads queue for a connection. The queue is not first come, first
+served: a thread that returns a connection can take it straight back, so a
+few waiters time out while most checkouts wait very little. The p99 wait and
+the timeouts are the signs of exhaustion, not the median.
+
+Usage:
+    python benchmarks/bench_pool.py --pool-size 5 --max-overflow 5 --hold-ms 20
+    python benchmarks/bench_pool.py --concurrency 10,20,40 --pool-timeout 2
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import text
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+
+from app import create_app, db
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def hammer(engine, concurrency, duration, hold):
+    """Check out connections from ``concurrency`` threads; returns waits, timeouts, peak checked out and elapsed."""
+    waits = []
+    timeouts = [0]
+    peak = [0]
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def worker():
+        own_waits = []
+        own_timeouts = 0
+        while time.monotonic() < deadline:
+            start = time.perf_counter()
+            try:
+                connection = engine.connect()
+            except PoolTimeoutError:
+                own_waits.append(time.perf_counter() - start)
+                own_timeouts += 1
+                continue
+            own_waits.append(time.perf_counter() - start)
+            with connection:
+                connection.execute(text('SELECT 1'))
+                checked_out = engine.pool.checkedout()
+                time.sleep(hold)
+            with lock:
+                peak[0] = max(peak[0], checked_out)
+        with lock:
+            waits.extend(own_waits)
+            timeouts[0] += own_timeouts
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return waits, timeouts[0], peak[0], time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pool-size', type=int, default=5)
+    parser.add_argument('--max-overflow', type=int, default=5)
+    parser.add_argument('--pool-timeout', type=int, default=1)
+    parser.add_argument('--hold-ms', type=float, default=20.0)
+    parser.add_argument('--concurrency', default='1,5,10,12,20,40,80,160,320,640')
+    parser.add_argument('--duration', type=float, default=3.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(directory, 'bench.db')}"
+        os.environ['REVOCATION_SYNC_SECONDS'] = '0'
+        os.environ['PAYMENT_WORKERS'] = '0'
+        os.environ['DB_POOL_SIZE'] = str(args.pool_size)
+        os.environ['DB_POOL_MAX_OVERFLOW'] = str(args.max_overflow)
+        os.environ['DB_POOL_TIMEOUT'] = str(args.pool_timeout)
+        os.environ['DB_POOL_WARM'] = str(args.pool_size)
+        app = create_app()
+        with app.app_context():
+            engine = db.engine
+
+        capacity = args.pool_size + args.max_overflow
+        print(f'pool {args.pool_size} + {args.max_overflow} overflow, {args.pool_timeout:g}s timeout, '
+              f'connections held {args.hold_ms:g} ms, {args.duration:g}s per level')
+        print(f"{'threads':>7} {'checkouts/s':>11} {'wait p50 ms':>11} {'wait p99 ms':>11} "
+              f"{'timeouts':>8} {'peak out':>8}")
+        for concurrency in (int(level) for level in args.concurrency.split(',')):
+            waits, timeouts, peak, elapsed = hammer(engine, concurrency, args.duration, args.hold_ms / 1000)
+            marker = '  <- exhausted' if concurrency > capacity else ''
+            print(f'{concurrency:>7} {(len(waits) - timeouts) / elapsed:>11.1f} {percentile(waits, 0.5) * 1000:>11.2f} '
+                  f'{percentile(waits, 0.99) * 1000:>11.2f} {timeouts:>8} {peak:>8}{marker}')
+
+        # The same waits as /metrics reports them
+        print()
+        print('\n'.join(line for line in app.extensions['metrics'].render().splitlines()
+                        if line.startswith(('db_pool_checkout_wait_seconds_count', 'db_pool_checkout_timeouts_total{'))))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""Payment throughput at different provider latencies: inline vs processor pool.
+
+"inline" charges the provider inside the request, as create_payment used to.
+"pool" commits the payment as pending, hands it to PaymentProcessor and
+returns; "accept" is how fast requests are answered and "settle" is how long
+until every payment has an outcome.
+
+Usage:
+    python benchmarks/bench_processing.py --payments 200 --latencies 0 50 200 --workers 4 16
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import create_app, db
+from app.models import Payment
+from app.processing import PaymentProcessor
+from app.providers import MockProvider
+
+
+def new_payment(i):
+    payment = Payment(order_id=i, customer_id='bench', amount=25.0, payment_method='card')
+    db.session.add(payment)
+    db.session.commit()
+    return payment
+
+
+def run_inline(app, provider, count):
+    start = time.perf_counter()
+    with app.app_context():
+        for i in range(count):
+            payment = new_payment(i)
+            result = provider.charge(payment.to_dict())
+            payment.status = 'completed' if result.succeeded else 'failed'
+            db.session.commit()
+    return time.perf_counter() - start
+
+
+def run_pool(app, provider, count, workers):
+    processor = PaymentProcessor(app, provider, workers=workers, max_queue=count)
+    start = time.perf_counter()
+    with app.app_context():
+        for i in range(count):
+            processor.submit(new_payment(i).id)
+    accepted = time.perf_counter() - start
+    processor.shutdown(wait=True)
+    settled = time.perf_counter() - start
+    with app.app_context():
+        assert Payment.query.filter(Payment.status.in_(['pending', 'processing'])).count() == 0
+    return accepted, settled
+
+
+def fresh_app(directory, name):
+    os.environ['DATABASE_URL'] = f'sqlite:///{os.path.join(directory, name)}.db'
+    return create_app()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--payments', type=int, default=200)
+    parser.add_argument('--latencies', type=int, nargs='+', default=[0, 50, 200])
+    parser.add_argument('--workers', type=int, nargs='+', default=[4, 16])
+    args = parser.parse_args()
+
+    print(f'{os.cpu_count()} CPU(s), {args.payments} payments, file-backed sqlite')
+    with tempfile.TemporaryDirectory() as directory:
+        for latency in args.latencies:
+            provider = MockProvider(latency_ms=latency)
+            elapsed = run_inline(fresh_app(directory, f'inline{latency}'), provider, args.payments)
+            print(f'latency {latency:4d}ms inline             {args.payments / elapsed:8.1f} payments/s')
+            for workers in args.workers:
+                accepted, settled = run_pool(fresh_app(directory, f'pool{latency}_{workers}'), provider,
+                                             args.payments, workers)
+                print(f'latency {latency:4d}ms pool workers={workers:<3} accept {args.payments / accepted:8.1f}/s'
+                      f'  settle {args.payments / settled:8.1f}/s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""Settlement of a large payment table: streaming job vs the naive approach.
+
+"streaming" runs ``settle()``: a server-side cursor, one batched order lookup
+per chunk and a checkpoint commit per chunk. "naive" loads every completed
+Payment as an ORM object and resolves each order with its own lookup call.
+Order Service is replaced by an in-process lookup that costs --lookup-ms per
+call, so the number of round trips shows up in the timings.
+
+The naive run is measured on the first --naive-payments rows only; at
+millions of rows it would take hours of lookups.
+
+Usage:
+    python benchmarks/bench_settlement.py --payments 5000000 --restaurants 20000 --chunk-size 1000
+"""
+import argparse
+import os
+import random
+import resource
+import sqlite3
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import create_app, db
+from app.ledger import to_minor
+from app.models import Payment, Payout
+from app.settlement import settle
+
+BATCH = 50000
+PERIOD_START = datetime(2026, 10, 1)
+
+
+def fill(path, count, rng):
+    connection = sqlite3.connect(path)
+    connection.execute('PRAGMA journal_mode=WAL')
+    connection.execute('PRAGMA synchronous=OFF')
+    rows = []
+    for i in range(count):
+        created_at = PERIOD_START + timedelta(seconds=rng.randrange(7 * 86400))
+        status = 'completed' if rng.random() < 0.95 else 'refunded'
+        rows.append((i + 1, 'bench', round(rng.uniform(5, 300), 2), 'GHS', 'card', status,
+                     created_at.isoformat(sep=' '), created_at.isoformat(sep=' ')))
+        if len(rows) >= BATCH:
+            connection.executemany(
+                'INSERT INTO payments (order_id, customer_id, amount, currency, payment_method, status, '
+                'created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)', rows
+            )
+            rows = []
+    if rows:
+        connection.executemany(
+            'INSERT INTO payments (order_id, customer_id, amount, currency, payment_method, status, '
+            'created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)', rows
+        )
+    connection.commit()
+    connection.close()
+
+
+def rss_mb():
+    with open('/proc/self/statm') as statm:
+        return int(statm.read().split()[1]) * resource.getpagesize() / 2 ** 20
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--payments', type=int, default=5000000)
+    parser.add_argument('--restaurants', type=int, default=20000)
+    parser.add_argument('--chunk-size', type=int, default=1000)
+    parser.add_argument('--lookup-ms', type=float, default=2.0)
+    parser.add_argument('--naive-payments', type=int, default=20000)
+    parser.add_argument('--seed', type=int, default=11)
+    args = parser.parse_args()
+
+    lookups = []
+    peak = [0.0]
+
+    def lookup(order_ids):
+        lookups.append(len(order_ids))
+        peak[0] = max(peak[0], rss_mb())
+        time.sleep(args.lookup_ms / 1000)
+        return {order_id: order_id % args.restaurants + 1 for order_id in order_ids}
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'payments.db')
+        os.environ['DATABASE_URL'] = f'sqlite:///{path}'
+        app = create_app()
+
+        start = time.perf_counter()
+        fill(path, args.payments, random.Random(args.seed))
+        print(f'loaded {args.payments:,} payments in {time.perf_counter() - start:.1f}s')
+
+        with app.app_context():
+            rss_before = peak[0] = rss_mb()
+            start = time.perf_counter()
+            run = settle(PERIOD_START, PERIOD_START + timedelta(days=7), lookup, args.chunk_size)
+            elapsed = time.perf_counter() - start
+            payouts = Payout.query.count()
+            print(f'streaming: {run.payment_count:,} payments -> {payouts:,} payouts in {elapsed:.1f}s '
+                  f'({run.payment_count / elapsed:,.0f} payments/s), {len(lookups):,} lookups, '
+                  f'peak RSS +{max(peak[0], rss_mb()) - rss_before:.0f} MB')
+
+            lookups.clear()
+            db.session.expunge_all()
+            rss_before = peak[0] = rss_mb()
+            start = time.perf_counter()
+            payments = Payment.query.filter(
+                Payment.status == 'completed', Payment.id <= args.naive_payments
+            ).all()
+            totals = defaultdict(int)
+            for payment in payments:
+                restaurant_id = lookup([payment.order_id])[payment.order_id]
+                totals[restaurant_id] += to_minor(payment.amount, payment.currency)
+            elapsed = time.perf_counter() - start
+            print(f'naive:     {len(payments):,} payments -> {len(totals):,} totals in {elapsed:.1f}s '
+                  f'({len(payments) / elapsed:,.0f} payments/s), {len(lookups):,} lookups, '
+                  f'peak RSS +{max(peak[0], rss_mb()) - rss_before:.0f} MB')
+            db.session.remove()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""Per-request cost of tracing at different sample rates.
+
+Runs the tracing hooks of one request directly, without the noise of a
+test client around them: the request span hooks, --queries SQL statements
+(the cursor event listeners) and one outbound HTTP call (the wrapped
+``Session.send``, around a stub send that returns at once). Spans go to the
+file exporter in batches, as they would in production. Prints the cost per
+request at each sample rate and the number of spans exported.
+
+Usage:
+    python benchmarks/bench_tracing.py --requests 50000 --queries 3
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import requests
+from requests.models import Response
+from app import create_app
+from app import tracing
+
+HOOKS = ('start_request_span', 'tag_request_span', 'end_request_span')
+
+
+class StubConnection:
+    def __init__(self):
+        self.info = {}
+
+
+def stub_send(session, prepared, **kwargs):
+    response = Response()
+    response.status_code = 200
+    return response
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=50000)
+    parser.add_argument('--queries', type=int, default=3)
+    parser.add_argument('--rates', default='0,0.1,1')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        os.environ.update({
+            'DATABASE_URL': f"sqlite:///{os.path.join(directory, 'bench.db')}",
+            'REVOCATION_SYNC_SECONDS': '0',
+            'TRACE_EXPORTER': 'file',
+            'TRACE_FILE': os.path.join(directory, 'traces.ndjson'),
+            'TRACE_EXPORT_INTERVAL': '1'
+        })
+        app = create_app()
+        registries = (app.before_request_funcs, app.after_request_funcs, app.teardown_request_funcs)
+        start_span, tag_span, end_span = [
+            next(f for f in registry[None] if f.__name__ == name) for registry, name in zip(registries, HOOKS)
+        ]
+        send = tracing._traced_send(stub_send)
+        prepared = requests.Request('GET', 'http://order-service/api/orders/1').prepare()
+        connection = StubConnection()
+        response = app.response_class('ok')
+        tracer = app.extensions['tracer']
+
+        print(f'{args.requests:,} requests, {args.queries} queries + 1 HTTP call each')
+        print(f"{'sample rate':>12} {'us/request':>11}")
+        for rate in [float(rate) for rate in args.rates.split(',')]:
+            tracer.sample_rate = rate
+            with app.test_request_context('/api/payments/'):
+                start = time.perf_counter()
+                for _ in range(args.requests):
+                    start_span()
+                    for _ in range(args.queries):
+                        tracing._before_cursor_execute(connection, None, 'SELECT 1', (), None, False)
+                        tracing._after_cursor_execute(connection, None, 'SELECT 1', (), None, False)
+                    send(None, prepared)
+                    tag_span(response)
+                    end_span(None)
+                elapsed = time.perf_counter() - start
+            print(f'{rate:>12} {elapsed / args.requests * 1e6:>11.1f}')
+        tracer.processor.flush()
+        with open(os.environ['TRACE_FILE']) as file:
+            print(f'spans exported: {sum(1 for _ in file):,}, dropped: {tracer.processor.dropped:,}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""Velocity checks: per-check latency and a sustained 10k checks/sec run.
+
+Runs the default rules (customer, card and device windows) against
+--customers customers, each with a few cards and devices, so most checks
+touch existing windows and some create new ones:
+
+- "burst": as many checks as possible in one thread, with latency percentiles
+- "paced": --threads threads issuing --rate checks/sec in total for
+  --seconds, reporting the rate achieved and per-check latency
+- memory: live windows and process RSS growth
+
+Pass --redis-url to run the same checks against the Redis backend.
+
+Usage:
+    python benchmarks/bench_velocity.py --checks 200000 --rate 10000 --seconds 10 --threads 4
+"""
+import argparse
+import os
+import random
+import resource
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.velocity import DEFAULT_RULES, LocalBackend, RedisBackend, VelocityLimiter
+
+
+def rss_mb():
+    with open('/proc/self/statm') as statm:
+        return int(statm.read().split()[1]) * resource.getpagesize() / 2 ** 20
+
+
+def attempts(customers, count, rng):
+    for _ in range(count):
+        customer = rng.randrange(customers)
+        yield {'customer': str(customer), 'card': f'card-{customer}-{rng.randrange(3)}',
+               'device': f'device-{customer}-{rng.randrange(2)}'}
+
+
+def percentile(samples, fraction):
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+def burst(limiter, work):
+    latencies = []
+    blocked = 0
+    start = time.perf_counter()
+    for values in work:
+        before = time.perf_counter()
+        if limiter.check(values) is not None:
+            blocked += 1
+        latencies.append(time.perf_counter() - before)
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    print(f'burst: {len(work):,} checks in {elapsed:.2f}s ({len(work) / elapsed:,.0f}/s), '
+          f'p50 {percentile(latencies, 0.5) * 1e6:.1f}us, p99 {percentile(latencies, 0.99) * 1e6:.1f}us, '
+          f'{blocked:,} blocked')
+
+
+def paced(limiter, work, rate, seconds, threads):
+    per_thread = rate / threads
+    latencies = [[] for _ in range(threads)]
+
+    def run(index):
+        interval = 1.0 / per_thread
+        deadline = time.perf_counter() + seconds
+        next_at = time.perf_counter()
+        position = index
+        while next_at < deadline:
+            delay = next_at - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            before = time.perf_counter()
+            limiter.check(work[position % len(work)])
+            latencies[index].append(time.perf_counter() - before)
+            position += threads
+            next_at += interval
+
+    workers = [threading.Thread(target=run, args=(i,)) for i in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+    samples = sorted(sample for thread_samples in latencies for sample in thread_samples)
+    print(f'paced: {len(samples):,} checks in {elapsed:.2f}s ({len(samples) / elapsed:,.0f}/s of {rate:,} '
+          f'target, {threads} threads), p50 {percentile(samples, 0.5) * 1e6:.1f}us, '
+          f'p99 {percentile(samples, 0.99) * 1e6:.1f}us, max {samples[-1] * 1e6:.0f}us')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--checks', type=int, default=200000)
+    parser.add_argument('--customers', type=int, default=20000)
+    parser.add_argument('--rate', type=int, default=10000)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--redis-url', default=None)
+    parser.add_argument('--seed', type=int, default=5)
+    args = parser.parse_args()
+
+    backend = RedisBackend.from_url(args.redis_url) if args.redis_url else LocalBackend()
+    limiter = VelocityLimiter(DEFAULT_RULES, backend)
+    work = list(attempts(args.customers, args.checks, random.Random(args.seed)))
+    rss_before = rss_mb()
+
+    burst(limiter, work)
+    paced(limiter, work, args.rate, args.seconds, args.threads)
+    if isinstance(backend, LocalBackend):
+        print(f'memory: {len(backend):,} windows, RSS +{rss_mb() - rss_before:.0f} MB')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+"""order/payment reconciliation runs
+
+Revision ID: 4c8f2d6e1b73
+Revises: e61b7c3a4f90
+Create Date: 2026-10-19 14:47:12.385920
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4c8f2d6e1b73'
+down_revision = 'e61b7c3a4f90'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('payments', schema=None) as batch_op:
+        batch_op.create_index('ix_payments_order_id_id', ['order_id', 'id'], unique=False)
+
+    op.create_table('reconciliation_runs',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('after_order_id', sa.Integer(), nullable=False),
+        sa.Column('max_order_id', sa.Integer(), nullable=True),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('orders_checked', sa.Integer(), nullable=False),
+        sa.Column('payments_checked', sa.Integer(), nullable=False),
+        sa.Column('mismatch_count', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('completed_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('reconciliation_mismatches',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('run_id', sa.Integer(), nullable=False),
+        sa.Column('order_id', sa.Integer(), nullable=False),
+        sa.Column('kind', sa.String(length=30), nullable=False),
+        sa.Column('details', sa.JSON(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['run_id'], ['reconciliation_runs.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('reconciliation_mismatches', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_reconciliation_mismatches_run_id'), ['run_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('reconciliation_mismatches', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_reconciliation_mismatches_run_id'))
+
+    op.drop_table('reconciliation_mismatches')
+    op.drop_table('reconciliation_runs')
+
+    with op.batch_alter_table('payments', schema=None) as batch_op:
+        batch_op.drop_index('ix_payments_order_id_id')
@@ -0,0 +1,28 @@
+"""payment processing callback and failure reason
+
+Revision ID: 7b2e4c1d9a05
+Revises: 
+Create Date: 2026-10-19 08:41:17.503219
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7b2e4c1d9a05'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('payments', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('callback_url', sa.String(length=500), nullable=True))
+        batch_op.add_column(sa.Column('failure_reason', sa.String(length=255), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('payments', schema=None) as batch_op:
+        batch_op.drop_column('failure_reason')
+        batch_op.drop_column('callback_url')
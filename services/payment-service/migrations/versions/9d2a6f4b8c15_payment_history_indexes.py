@@ -0,0 +1,29 @@
+"""payment history indexes
+
+Revision ID: 9d2a6f4b8c15
+Revises: 4c8f2d6e1b73
+Create Date: 2026-10-19 16:02:41.518237
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9d2a6f4b8c15'
+down_revision = '4c8f2d6e1b73'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('payments', schema=None) as batch_op:
+        batch_op.create_index('ix_payments_customer_created_id', ['customer_id', 'created_at', 'id'], unique=False)
+        batch_op.create_index('ix_payments_customer_status_created_id',
+                              ['customer_id', 'status', 'created_at', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('payments', schema=None) as batch_op:
+        batch_op.drop_index('ix_payments_customer_status_created_id')
+        batch_op.drop_index('ix_payments_customer_created_id')
@@ -0,0 +1,88 @@
+"""payment ledger and balance snapshots
+
+Revision ID: a3d9e5f1c247
+Revises: 7b2e4c1d9a05
+Create Date: 2026-10-19 11:20:53.904117
+
+"""
+import uuid
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.ledger import CLEARING_ACCOUNT, customer_account, to_minor
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3d9e5f1c247'
+down_revision = '7b2e4c1d9a05'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    entries = op.create_table('ledger_entries',
+        sa.Column('id', sa.BigInteger().with_variant(sa.Integer(), 'sqlite'), nullable=False),
+        sa.Column('transaction_id', sa.String(length=36), nullable=False),
+        sa.Column('entry_type', sa.String(length=20), nullable=False),
+        sa.Column('account', sa.String(length=64), nullable=False),
+        sa.Column('amount_minor', sa.BigInteger(), nullable=False),
+        sa.Column('currency', sa.String(length=3), nullable=False),
+        sa.Column('payment_id', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('ledger_entries', schema=None) as batch_op:
+        batch_op.create_index('ix_ledger_entries_account_currency_id', ['account', 'currency', 'id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_ledger_entries_payment_id'), ['payment_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_ledger_entries_transaction_id'), ['transaction_id'], unique=False)
+
+    op.create_table('balance_snapshots',
+        sa.Column('account', sa.String(length=64), nullable=False),
+        sa.Column('currency', sa.String(length=3), nullable=False),
+        sa.Column('balance_minor', sa.BigInteger(), nullable=False),
+        sa.Column('last_entry_id', sa.BigInteger(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('account', 'currency')
+    )
+
+    # Post the charges (and refunds) of payments that settled before the ledger existed
+    payments = sa.table('payments',
+        sa.column('id', sa.Integer), sa.column('customer_id', sa.String), sa.column('amount', sa.Float),
+        sa.column('currency', sa.String), sa.column('status', sa.String),
+        sa.column('created_at', sa.DateTime), sa.column('updated_at', sa.DateTime)
+    )
+    rows = op.get_bind().execute(
+        sa.select(payments.c.id, payments.c.customer_id, payments.c.amount, payments.c.currency,
+                  payments.c.status, payments.c.created_at, payments.c.updated_at)
+        .where(payments.c.status.in_(['completed', 'refunded']))
+        .order_by(payments.c.id)
+    )
+    backfill = []
+    for payment_id, customer_id, amount, currency, status, created_at, updated_at in rows:
+        amount_minor = to_minor(amount, currency)
+        postings = [('charge', created_at, amount_minor)]
+        if status == 'refunded':
+            postings.append(('refund', updated_at, -amount_minor))
+        for entry_type, posted_at, clearing_amount in postings:
+            transaction_id = str(uuid.uuid4())
+            for account, amount_value in ((CLEARING_ACCOUNT, clearing_amount),
+                                          (customer_account(customer_id), -clearing_amount)):
+                backfill.append({
+                    'transaction_id': transaction_id, 'entry_type': entry_type, 'account': account,
+                    'amount_minor': amount_value, 'currency': currency, 'payment_id': payment_id,
+                    'created_at': posted_at
+                })
+    if backfill:
+        op.bulk_insert(entries, backfill)
+
+
+def downgrade():
+    op.drop_table('balance_snapshots')
+
+    with op.batch_alter_table('ledger_entries', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_ledger_entries_transaction_id'))
+        batch_op.drop_index(batch_op.f('ix_ledger_entries_payment_id'))
+        batch_op.drop_index('ix_ledger_entries_account_currency_id')
+
+    op.drop_table('ledger_entries')
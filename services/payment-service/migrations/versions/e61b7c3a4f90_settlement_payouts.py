@@ -0,0 +1,68 @@
+"""settlement runs and restaurant payouts
+
+Revision ID: e61b7c3a4f90
+Revises: a3d9e5f1c247
+Create Date: 2026-10-19 13:02:38.671450
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e61b7c3a4f90'
+down_revision = 'a3d9e5f1c247'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('settlement_runs',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('period_start', sa.DateTime(), nullable=False),
+        sa.Column('period_end', sa.DateTime(), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('last_payment_id', sa.Integer(), nullable=False),
+        sa.Column('payment_count', sa.Integer(), nullable=False),
+        sa.Column('unresolved_count', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('completed_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('period_start', 'period_end', name='uq_settlement_runs_period')
+    )
+    op.create_table('settlement_lines',
+        sa.Column('run_id', sa.Integer(), nullable=False),
+        sa.Column('restaurant_id', sa.Integer(), nullable=False),
+        sa.Column('currency', sa.String(length=3), nullable=False),
+        sa.Column('amount_minor', sa.BigInteger(), nullable=False),
+        sa.Column('payment_count', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['run_id'], ['settlement_runs.id'], ),
+        sa.PrimaryKeyConstraint('run_id', 'restaurant_id', 'currency')
+    )
+    op.create_table('payouts',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('run_id', sa.Integer(), nullable=False),
+        sa.Column('restaurant_id', sa.Integer(), nullable=False),
+        sa.Column('amount_minor', sa.BigInteger(), nullable=False),
+        sa.Column('currency', sa.String(length=3), nullable=False),
+        sa.Column('payment_count', sa.Integer(), nullable=False),
+        sa.Column('period_start', sa.DateTime(), nullable=False),
+        sa.Column('period_end', sa.DateTime(), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('ledger_transaction_id', sa.String(length=36), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['run_id'], ['settlement_runs.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('run_id', 'restaurant_id', 'currency', name='uq_payouts_run_restaurant_currency')
+    )
+    with op.batch_alter_table('payouts', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_payouts_restaurant_id'), ['restaurant_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('payouts', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_payouts_restaurant_id'))
+
+    op.drop_table('payouts')
+    op.drop_table('settlement_lines')
+    op.drop_table('settlement_runs')
@@ -5,6 +5,8 @@ import json
 from unittest.mock import patch
 from flask_jwt_extended import create_access_token
 
+pytest_plugins = ['app.query_budget', 'pytester']
+
 @pytest.fixture
 def app():
     app = create_app({
@@ -32,6 +32,63 @@ def test_get_payments_with_data(client, auth_headers):
     assert data[0]['order_id'] == 1
     assert data[0]['amount'] == 100.0
 
+def test_get_payments_keyset_pagination(client, auth_headers):
+    """Test paging through payments newest first with filters"""
+    from datetime import datetime, timedelta
+    start = datetime(2026, 10, 1)
+    with client.application.app_context():
+        # Two payments share each timestamp so pages must break ties on id
+        db.session.add_all([
+            Payment(order_id=i, customer_id='test-user', amount=10.0 + i,
+                    payment_method='card' if i % 3 else 'mobile_money',
+                    status='completed' if i % 2 else 'failed', created_at=start + timedelta(minutes=i // 2))
+            for i in range(7)
+        ])
+        db.session.add(Payment(order_id=99, customer_id='other-user', amount=1.0, payment_method='card'))
+        db.session.commit()
+    
+    seen, cursor = [], None
+    while True:
+        response = client.get('/api/payments/', headers=auth_headers,
+                              query_string={'limit': 3, **({'cursor': cursor} if cursor else {})})
+        assert response.status_code == 200
+        seen.extend(payment['order_id'] for payment in json.loads(response.data))
+        cursor = response.headers.get('X-Next-Cursor')
+        if not cursor:
+            break
+    assert seen == [6, 5, 4, 3, 2, 1, 0]
+    
+    response = client.get('/api/payments/', headers=auth_headers,
+                          query_string={'status': 'completed', 'payment_method': 'card'})
+    assert [payment['order_id'] for payment in json.loads(response.data)] == [5, 1]
+    response = client.get('/api/payments/', headers=auth_headers,
+                          query_string={'created_after': '2026-10-01T00:01:00', 'created_before': '2026-10-01T00:03:00'})
+    assert [payment['order_id'] for payment in json.loads(response.data)] == [5, 4, 3, 2]
+    assert 'X-Next-Cursor' not in response.headers
+    
+    assert client.get('/api/payments/?cursor=not-a-cursor', headers=auth_headers).status_code == 400
+    assert client.get('/api/payments/?limit=0', headers=auth_headers).status_code == 400
+
+def test_payment_history_queries_use_indexes(app):
+    """Test that history pages are read from the composite indexes, not sorted in memory"""
+    from datetime import datetime
+    from app.routes import payment_history_query
+    
+    def plan(query):
+        compiled = query.statement.compile(dialect=db.engine.dialect)
+        params = tuple(compiled.params[name] for name in compiled.positiontup)
+        with db.engine.connect() as connection:
+            rows = connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + str(compiled), params).all()
+        return ' / '.join(row[-1] for row in rows)
+    
+    after = (datetime(2026, 10, 1), 10)
+    history = plan(payment_history_query('c1', after=after).limit(51))
+    assert 'USING INDEX ix_payments_customer_created_id (customer_id=? AND created_at<?)' in history
+    assert 'TEMP B-TREE' not in history
+    by_status = plan(payment_history_query('c1', status='completed', after=after).limit(51))
+    assert 'USING INDEX ix_payments_customer_status_created_id (customer_id=? AND status=? AND created_at<?)' in by_status
+    assert 'TEMP B-TREE' not in by_status
+
 def test_get_payment_not_found(client, auth_headers):
     """Test getting a non-existent payment"""
     response = client.get('/api/payments/999', headers=auth_headers)
@@ -74,7 +131,153 @@ def test_create_payment_success(mock_get_order, client, auth_headers, sample_pay
     data = json.loads(response.data)
     assert data['order_id'] == sample_payment_data['order_id']
     assert data['payment_method'] == sample_payment_data['payment_method']
-    assert data['status'] == 'completed'
+    # Created pending; the provider outcome is applied by the processor
+    assert data['status'] == 'pending'
+    
+    response = client.get(f"/api/payments/{data['id']}", headers=auth_headers)
+    assert json.loads(response.data)['status'] == 'completed'
+
+@patch('app.processing.requests.post')
+@patch('app.routes.get_order_details')
+def test_create_payment_declined_notifies_callback(mock_get_order, mock_post, app, client, auth_headers,
+                                                   sample_payment_data, mock_order_response):
+    """Test that a declined payment is marked failed and reported to its callback URL"""
+    from app.providers import MockProvider
+    mock_get_order.return_value = mock_order_response
+    app.extensions['payment_processor'].provider = MockProvider(failure_rate=1.0)
+    
+    response = client.post(
+        '/api/payments/',
+        headers=auth_headers,
+        data=json.dumps(dict(sample_payment_data, callback_url='https://shop.example.com/hooks/payments'))
+    )
+    
+    assert response.status_code == 201
+    payment_id = json.loads(response.data)['id']
+    with client.application.app_context():
+        payment = db.session.get(Payment, payment_id)
+        assert payment.status == 'failed'
+        assert payment.failure_reason == 'Declined by provider'
+    mock_post.assert_called_once()
+    assert mock_post.call_args[0][0] == 'https://shop.example.com/hooks/payments'
+    body = json.loads(mock_post.call_args[1]['data'])
+    assert body['event'] == 'payment.failed'
+    assert body['payment']['id'] == payment_id
+
+@patch('app.routes.get_order_details')
+def test_create_payment_rejects_unlisted_callback_host(mock_get_order, client, auth_headers,
+                                                       sample_payment_data, mock_order_response):
+    """Test that callbacks can only target allowlisted hosts"""
+    mock_get_order.return_value = mock_order_response
+    
+    response = client.post(
+        '/api/payments/',
+        headers=auth_headers,
+        data=json.dumps(dict(sample_payment_data, callback_url='http://user-service:5000/api/users/bulk'))
+    )
+    
+    assert response.status_code == 400
+    with client.application.app_context():
+        assert Payment.query.count() == 0
+
+@patch('app.routes.get_order_details')
+def test_create_payment_velocity_limit(mock_get_order, app, client, auth_headers,
+                                       sample_payment_data, mock_order_response):
+    """Test that a card over its velocity limit is refused before the order lookup"""
+    from app.velocity import VelocityLimiter
+    mock_get_order.return_value = mock_order_response
+    app.extensions['velocity'] = VelocityLimiter([
+        {'name': 'card_minute', 'dimension': 'card', 'limit': 2, 'window_seconds': 60, 'buckets': 6}
+    ])
+    
+    for _ in range(2):
+        response = client.post('/api/payments/', headers=auth_headers, data=json.dumps(sample_payment_data))
+        assert response.status_code == 201
+    response = client.post('/api/payments/', headers=auth_headers, data=json.dumps(sample_payment_data))
+    assert response.status_code == 429
+    assert json.loads(response.data)['rule'] == 'card_minute'
+    assert response.headers['Retry-After'] == '10'
+    assert mock_get_order.call_count == 2
+    
+    # Another card is counted separately
+    other_card = dict(sample_payment_data, payment_details={'card_last4': '1881', 'card_brand': 'visa'})
+    response = client.post('/api/payments/', headers=auth_headers, data=json.dumps(other_card))
+    assert response.status_code == 201
+
+@patch('app.routes.get_order_details')
+def test_create_payment_with_order_quote(mock_get_order, client, auth_headers,
+                                         sample_payment_data, mock_order_response):
+    """Test that a valid order quote replaces the Order Service lookup, and anything else falls back to it"""
+    import time
+    import jwt
+    mock_get_order.return_value = mock_order_response
+    
+    def quote(order_id=1, expires_in=900, secret='test-order-quote-secret-0123456789'):
+        return jwt.encode({'order_id': order_id, 'customer_id': 'test-user', 'amount': 42.5,
+                           'aud': 'payment-service', 'exp': int(time.time()) + expires_in}, secret, algorithm='HS256')
+    
+    response = client.post('/api/payments/', headers=auth_headers,
+                           data=json.dumps(dict(sample_payment_data, order_quote=quote())))
+    assert response.status_code == 201
+    assert json.loads(response.data)['amount'] == 42.5
+    mock_get_order.assert_not_called()
+    
+    for bad_quote in (quote(expires_in=-60), quote(order_id=2), quote(secret='forged-secret-0123456789abcdef'), 'junk'):
+        response = client.post('/api/payments/', headers=auth_headers,
+                               data=json.dumps(dict(sample_payment_data, order_quote=bad_quote)))
+        assert response.status_code == 201
+        assert json.loads(response.data)['amount'] == 100.0
+    assert mock_get_order.call_count == 4
+
+def test_velocity_window_slides_by_bucket():
+    """Test that attempts leave the window bucket by bucket and rejected ones are not counted"""
+    from app.velocity import VelocityLimiter
+    limiter = VelocityLimiter([
+        {'name': 'customer_minute', 'dimension': 'customer', 'limit': 3, 'window_seconds': 60, 'buckets': 6},
+        {'name': 'device_minute', 'dimension': 'device', 'limit': 10, 'window_seconds': 60, 'buckets': 6}
+    ])
+    attempt = {'customer': 'c1', 'device': 'd1'}
+    assert limiter.check(attempt, now=1000) is None
+    assert limiter.check(attempt, now=1015) is None
+    assert limiter.check(attempt, now=1025) is None
+    assert limiter.check(attempt, now=1030).name == 'customer_minute'
+    assert limiter.check({'customer': 'c2', 'device': 'd1'}, now=1030) is None
+    # The bucket holding t=1000 ([1000, 1010)) leaves the window at t=1060
+    assert limiter.check(attempt, now=1059).name == 'customer_minute'
+    assert limiter.check(attempt, now=1060) is None
+    # Blocked attempts did not count against the device: 1015, 1025, 1030 (c2) and 1060
+    assert limiter.backend._windows['device_minute:d1'][1] == 4
+    # Rules without a value for their dimension are skipped
+    assert limiter.check({'customer': 'c3'}, now=1060) is None
+
+def test_payment_processor_pool_processes_each_payment_once(tmp_path, monkeypatch):
+    """Test that the threaded processor charges queued payments exactly once"""
+    from app import create_app
+    from app.processing import PaymentProcessor
+    from app.providers import MockProvider
+    
+    # Worker threads need real connections; the shared in-memory test database is one connection
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'payments.db'}")
+    app = create_app()
+    with app.app_context():
+        payments = [Payment(order_id=i, customer_id='test-user', amount=10.0, payment_method='card')
+                    for i in range(20)]
+        db.session.add_all(payments)
+        db.session.commit()
+        ids = [payment.id for payment in payments]
+    
+    provider = MockProvider(latency_ms=1)
+    charges = []
+    original_charge = provider.charge
+    provider.charge = lambda payment: charges.append(payment['id']) or original_charge(payment)
+    processor = PaymentProcessor(app, provider, workers=4)
+    for payment_id in ids + ids:
+        processor.submit(payment_id)
+    processor.shutdown(wait=True)
+    
+    with app.app_context():
+        assert {payment.status for payment in Payment.query.all()} == {'completed'}
+    assert sorted(charges) == sorted(ids)
 
 @patch('app.routes.get_order_details')
 def test_create_payment_order_not_found(mock_get_order, client, auth_headers, sample_payment_data):
@@ -136,6 +339,21 @@ def test_refund_payment_not_found(client, auth_headers):
     
     assert response.status_code == 404
 
+def test_refund_payment_of_another_customer(client, auth_headers):
+    """Test that another customer's payment cannot be refunded or seen to exist"""
+    with client.application.app_context():
+        payment = Payment(order_id=1, customer_id='other-user', amount=100.0,
+                          payment_method='card', status='completed')
+        db.session.add(payment)
+        db.session.commit()
+        payment_id = payment.id
+    
+    response = client.post(f'/api/payments/{payment_id}/refund', headers=auth_headers)
+    
+    assert response.status_code == 404
+    with client.application.app_context():
+        assert db.session.get(Payment, payment_id).status == 'completed'
+
 def test_refund_payment_wrong_status(client, auth_headers):
     """Test refunding a payment that's not completed"""
     # Create a pending payment
@@ -158,4 +376,443 @@ def test_refund_payment_wrong_status(client, auth_headers):
     )
     
     assert response.status_code == 400
-    assert b'Payment cannot be refunded' in response.data
\ No newline at end of file
+    assert b'Payment cannot be refunded' in response.data
+
+
+def test_metrics_endpoint(client, auth_headers, sample_payment_data):
+    """Test that route latency, SQL counts and downstream calls are exported for Prometheus"""
+    from requests.models import Response
+    
+    def order_service(adapter, prepared, **kwargs):
+        response = Response()
+        response.status_code = 200
+        response._content = json.dumps({'id': 1, 'customer_id': 'test-user', 'total_amount': 10.0}).encode()
+        response.url = prepared.url
+        return response
+    
+    client.get('/api/payments/', headers=auth_headers)
+    with patch('requests.adapters.HTTPAdapter.send', order_service):
+        assert client.post('/api/payments/', headers=auth_headers,
+                           data=json.dumps(sample_payment_data)).status_code == 201
+    client.get('/no-such-page')
+    
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.content_type.startswith('text/plain; version=0.0.4')
+    text = response.get_data(as_text=True)
+    assert 'http_requests_total{method="GET",route="/api/payments/",status="200"} 1' in text
+    assert 'http_requests_total{method="POST",route="/api/payments/",status="201"} 1' in text
+    assert 'http_requests_total{method="GET",route="unmatched",status="404"} 1' in text
+    assert 'http_request_duration_seconds_bucket{method="GET",route="/api/payments/",le="+Inf"} 1' in text
+    # Listing payments is one SELECT
+    assert 'http_request_db_queries_bucket{method="GET",route="/api/payments/",le="0"} 0' in text
+    assert 'http_request_db_queries_bucket{method="GET",route="/api/payments/",le="1"} 1' in text
+    assert 'http_client_requests_total{target="order-service",method="GET",status="200"} 1' in text
+    assert 'http_client_request_duration_seconds_count{target="order-service",method="GET"} 1' in text
+
+def test_trace_context_propagates_through_request(app, client, auth_headers, sample_payment_data):
+    """Test that a payment continues the caller's trace and passes it on to Order Service"""
+    from requests.models import Response
+    sent = []
+    
+    def order_service(adapter, prepared, **kwargs):
+        sent.append(prepared.headers.get('traceparent'))
+        response = Response()
+        response.status_code = 200
+        response._content = json.dumps({'id': 1, 'customer_id': 'test-user', 'total_amount': 10.0}).encode()
+        return response
+    
+    trace_id, caller_span = '4bf92f3577b34da6a3ce929d0e0e4736', '00f067aa0ba902b7'
+    headers = dict(auth_headers, traceparent=f'00-{trace_id}-{caller_span}-01')
+    with patch('requests.adapters.HTTPAdapter.send', order_service):
+        response = client.post('/api/payments/', headers=headers, data=json.dumps(sample_payment_data))
+    assert response.status_code == 201
+    
+    spans = app.extensions['tracer'].processor.exporter.spans
+    server = next(span for span in spans if span['kind'] == 'server')
+    assert (server['trace_id'], server['parent_id'], server['name']) == (trace_id, caller_span, 'POST /api/payments/')
+    assert server['attributes']['http.status_code'] == 201
+    http = next(span for span in spans if span['name'] == 'GET order-service')
+    assert http['parent_id'] == server['span_id']
+    assert sent == [f"00-{trace_id}-{http['span_id']}-01"]
+    queries = [span for span in spans if span['name'] == 'db.query']
+    assert queries and all(span['trace_id'] == trace_id for span in queries)
+    assert any(span['attributes']['db.statement'].startswith('INSERT INTO payments') for span in queries)
+    
+    # An unsampled caller is followed: ids still propagate, nothing is recorded
+    spans.clear()
+    headers['traceparent'] = f'00-{trace_id}-{caller_span}-00'
+    with patch('requests.adapters.HTTPAdapter.send', order_service):
+        client.post('/api/payments/', headers=headers, data=json.dumps(dict(sample_payment_data, order_id=2)))
+    assert spans == []
+    assert sent[-1].startswith(f'00-{trace_id}-') and sent[-1].endswith('-00')
+
+def test_revoked_token_rejected(app, client, auth_headers):
+    """Test that a token on the revocation list is rejected"""
+    from flask_jwt_extended import decode_token
+
+    jti = decode_token(auth_headers['Authorization'].split()[1])['jti']
+    app.extensions['revocation'].add(jti)
+
+    response = client.get('/api/payments/', headers=auth_headers)
+    assert response.status_code == 401
+    assert response.get_json()['error'] == 'Token has been revoked'
+
+def test_token_verified_with_cached_jwks(app, client, monkeypatch):
+    """Test that tokens signed by User Service are verified from the cached JWKS"""
+    import jwt as pyjwt
+    from datetime import datetime, timedelta
+    from unittest.mock import Mock
+    from cryptography.hazmat.primitives.asymmetric import ed25519
+    from jwt.algorithms import OKPAlgorithm
+    from app.jwks import JWKSCache
+
+    private_key = ed25519.Ed25519PrivateKey.generate()
+    jwk = OKPAlgorithm.to_jwk(private_key.public_key(), as_dict=True)
+    jwk.update({'kid': 'key-1', 'alg': 'EdDSA', 'use': 'sig'})
+    jwks_response = Mock(status_code=200, json=lambda: {'keys': [jwk]})
+    mock_get = Mock(return_value=jwks_response)
+    monkeypatch.setattr('app.jwks.requests.get', mock_get)
+    monkeypatch.setattr(JWKSCache, 'ensure_refreshing', lambda self: None)
+    app.extensions['jwks'] = JWKSCache('http://user-service/api/users/.well-known/jwks.json')
+    app.config['JWT_DECODE_ALGORITHMS'] = ['EdDSA']
+    app.config['JWT_ALGORITHM'] = 'EdDSA'
+
+    now = datetime.utcnow()
+    claims = {'sub': 'test-user', 'type': 'access', 'fresh': False, 'jti': 'jwks-test', 'iat': now, 'nbf': now,
+              'exp': now + timedelta(minutes=5)}
+    token = pyjwt.encode(claims, private_key, algorithm='EdDSA', headers={'kid': 'key-1'})
+    for _ in range(3):
+        response = client.get('/api/payments/', headers={'Authorization': f'Bearer {token}'})
+        assert response.status_code == 200
+        assert response.get_json() == []
+    assert mock_get.call_count == 1
+
+    # A kid that appears right after a refresh does not trigger another one
+    rotated = pyjwt.encode(claims, private_key, algorithm='EdDSA', headers={'kid': 'key-2'})
+    assert client.get('/api/payments/', headers={'Authorization': f'Bearer {rotated}'}).status_code == 422
+    assert mock_get.call_count == 1
+
+    # Once the key is published and the refresh window has passed, it is fetched on demand
+    jwks_response.json = lambda: {'keys': [jwk, dict(jwk, kid='key-2')]}
+    app.extensions['jwks'].min_refresh_seconds = 0
+    response = client.get('/api/payments/', headers={'Authorization': f'Bearer {rotated}'})
+    assert response.status_code == 200
+    assert response.get_json() == []
+    assert mock_get.call_count == 2
+
+@patch('app.routes.get_order_details')
+def test_ledger_posts_charge_and_refund(mock_get_order, client, auth_headers, sample_payment_data):
+    """Test that a completed charge and its refund are posted as balanced ledger entries"""
+    from app.ledger import balance
+    from app.models import LedgerEntry
+    mock_get_order.return_value = {'id': 1, 'customer_id': 'test-user', 'total_amount': 19.99, 'status': 'pending'}
+    
+    payment_id = json.loads(client.post('/api/payments/', headers=auth_headers,
+                                        data=json.dumps(sample_payment_data)).data)['id']
+    with client.application.app_context():
+        assert balance('customer:test-user') == -1999
+        assert balance('clearing') == 1999
+    
+    response = client.post(f'/api/payments/{payment_id}/refund', headers=auth_headers)
+    assert response.status_code == 200
+    with client.application.app_context():
+        entries = LedgerEntry.query.filter_by(payment_id=payment_id).all()
+        assert sorted(entry.entry_type for entry in entries) == ['charge', 'charge', 'refund', 'refund']
+        assert sum(entry.amount_minor for entry in entries) == 0
+        assert balance('customer:test-user') == 0
+        assert balance('clearing') == 0
+
+def test_concurrent_refunds_reverse_the_ledger_once(tmp_path, monkeypatch):
+    """Test that refunding the same payment from many requests at once posts one reversal"""
+    import threading
+    from flask_jwt_extended import create_access_token
+    from app import create_app
+    from app.ledger import post_charge
+    from app.models import LedgerEntry
+    
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'payments.db'}")
+    monkeypatch.setenv('REVOCATION_SYNC_SECONDS', '0')
+    monkeypatch.setenv('PAYMENT_WORKERS', '0')
+    app = create_app()
+    with app.app_context():
+        payment = Payment(order_id=1, customer_id='test-user', amount=19.99,
+                          payment_method='card', status='completed')
+        db.session.add(payment)
+        db.session.flush()
+        post_charge(payment)
+        db.session.commit()
+        payment_id = payment.id
+        headers = {'Authorization': f"Bearer {create_access_token(identity='test-user')}"}
+    
+    barrier = threading.Barrier(8)
+    statuses = []
+    
+    def refund():
+        client = app.test_client()
+        barrier.wait()
+        statuses.append(client.post(f'/api/payments/{payment_id}/refund', headers=headers).status_code)
+    
+    threads = [threading.Thread(target=refund) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    assert statuses.count(200) == 1
+    with app.app_context():
+        refunds = LedgerEntry.query.filter_by(payment_id=payment_id, entry_type='refund').all()
+        assert len({entry.transaction_id for entry in refunds}) == 1
+        assert sum(entry.amount_minor for entry in LedgerEntry.query.filter_by(payment_id=payment_id)) == 0
+
+
+def test_ledger_entries_are_append_only(app):
+    """Test that posted ledger entries cannot be modified"""
+    from app.ledger import LedgerError, post
+    from app.models import LedgerEntry
+    post('charge', [('clearing', 500), ('customer:a', -500)])
+    db.session.commit()
+    
+    entry = LedgerEntry.query.first()
+    entry.amount_minor = 1
+    with pytest.raises(LedgerError):
+        db.session.commit()
+    db.session.rollback()
+    with pytest.raises(LedgerError):
+        post('charge', [('clearing', 500), ('customer:a', -400)])
+
+def test_balance_snapshot_plus_delta_matches_sum(app):
+    """Test that snapshot-based balances equal summing every entry"""
+    from sqlalchemy import func
+    from app.ledger import balance, post, snapshot_balances
+    from app.models import BalanceSnapshot, LedgerEntry
+    for amount in (100, 250, 75):
+        post('charge', [('clearing', amount), ('customer:a', -amount)])
+    post('charge', [('clearing', 40), ('customer:b', -40)])
+    db.session.commit()
+    
+    assert snapshot_balances(lag_seconds=0) == 3
+    post('refund', [('customer:a', 250), ('clearing', -250)])
+    db.session.commit()
+    assert snapshot_balances(lag_seconds=3600) == 0  # too recent to fold in yet
+    
+    for account in ('clearing', 'customer:a', 'customer:b'):
+        naive = db.session.query(func.sum(LedgerEntry.amount_minor)).filter_by(account=account).scalar()
+        assert balance(account) == naive
+    assert db.session.get(BalanceSnapshot, ('customer:a', 'GHS')).balance_minor == -425
+
+def test_settlement_resumes_from_checkpoint(app):
+    """Test that settlement aggregates per restaurant and resumes after a failed chunk"""
+    from datetime import datetime
+    from app.ledger import balance
+    from app.models import Payout, SettlementRun
+    from app.settlement import SettlementError, settle
+    start, end = datetime(2026, 10, 1), datetime(2026, 10, 8)
+    for i, (amount, status) in enumerate([(10.10, 'completed'), (20.20, 'completed'), (5.0, 'refunded'),
+                                          (30.30, 'completed'), (1.0, 'completed'), (7.0, 'completed')]):
+        db.session.add(Payment(order_id=100 + i, customer_id='c', amount=amount, payment_method='card',
+                               status=status, created_at=datetime(2026, 10, 2 + i % 3)))
+    db.session.add(Payment(order_id=200, customer_id='c', amount=99.0, payment_method='card',
+                           status='completed', created_at=datetime(2026, 10, 9)))
+    db.session.commit()
+    
+    restaurants = {100: 1, 101: 2, 102: 1, 103: 1, 105: 2}  # order 104 is unknown to order-service
+    calls = []
+    def lookup(order_ids):
+        calls.append(order_ids)
+        if len(calls) == 2:
+            raise SettlementError('order-service unavailable')
+        return {order_id: restaurants[order_id] for order_id in order_ids if order_id in restaurants}
+    
+    with pytest.raises(SettlementError):
+        settle(start, end, lookup, chunk_size=2)
+    run = SettlementRun.query.one()
+    assert (run.status, run.last_payment_id, run.payment_count) == ('running', 2, 2)
+    
+    run = settle(start, end, lookup, chunk_size=2)
+    assert calls == [[100, 101], [103, 104], [103, 104], [105]]
+    assert (run.status, run.payment_count, run.unresolved_count) == ('completed', 5, 1)
+    payouts = {payout.restaurant_id: payout for payout in Payout.query.all()}
+    assert payouts[1].amount_minor == 1010 + 3030
+    assert payouts[2].amount_minor == 2020 + 700
+    assert balance('restaurant:1') == 4040
+    
+    assert settle(start, end, lookup).id == run.id
+    assert Payout.query.count() == 2
+
+def test_reconciliation_merge_join_reports_mismatches():
+    """Test each mismatch kind from two sorted streams"""
+    from app.reconciliation import merge_join
+    orders = [
+        {'order_id': 1, 'amount': 10.0, 'status': 'delivered'},   # matched
+        {'order_id': 2, 'amount': 12.5, 'status': 'delivered'},   # no payment
+        {'order_id': 4, 'amount': 8.0, 'status': 'delivered'},    # refunded
+        {'order_id': 5, 'amount': 9.0, 'status': 'confirmed'},    # paid twice
+        {'order_id': 6, 'amount': 20.0, 'status': 'delivered'},   # drift
+        {'order_id': 7, 'amount': 5.0, 'status': 'cancelled'}     # unpaid, fine
+    ]
+    payments = [
+        {'order_id': 1, 'payment_id': 11, 'amount': 10.0, 'status': 'completed'},
+        {'order_id': 3, 'payment_id': 13, 'amount': 3.0, 'status': 'completed'},
+        {'order_id': 4, 'payment_id': 14, 'amount': 8.0, 'status': 'refunded'},
+        {'order_id': 5, 'payment_id': 15, 'amount': 9.0, 'status': 'completed'},
+        {'order_id': 5, 'payment_id': 16, 'amount': 9.0, 'status': 'completed'},
+        {'order_id': 6, 'payment_id': 17, 'amount': 19.99, 'status': 'completed'},
+        {'order_id': 6, 'payment_id': 18, 'amount': 20.0, 'status': 'failed'},
+        {'order_id': 9, 'payment_id': 19, 'amount': 1.0, 'status': 'completed'}
+    ]
+    
+    assert [(order_id, kind) for order_id, kind, _ in merge_join(iter(orders), iter(payments))] == [
+        (2, 'missing_payment'),
+        (3, 'orphan_payment'),
+        (4, 'refunded_but_delivered'),
+        (5, 'duplicate_payment'),
+        (6, 'amount_mismatch'),
+        (9, 'orphan_payment')
+    ]
+
+def test_reconcile_runs_incrementally(app, client):
+    """Test that reconciliation records mismatches and continues after the last run"""
+    from datetime import datetime
+    from app.models import ReconciliationMismatch
+    from app.reconciliation import reconcile
+    for order_id, amount in ((1, 10.0), (2, 7.0), (3, 4.0)):
+        db.session.add(Payment(order_id=order_id, customer_id='c', amount=amount,
+                               payment_method='card', status='completed'))
+    db.session.commit()
+    orders = [{'order_id': 1, 'amount': 10.0, 'status': 'delivered'},
+              {'order_id': 2, 'amount': 7.5, 'status': 'delivered'},
+              {'order_id': 3, 'amount': 4.0, 'status': 'delivered'}]
+    calls = []
+    def fetch_orders(after_id, created_before):
+        calls.append(after_id)
+        max_id = 2 if after_id == 0 else 3
+        return max_id, iter([order for order in orders if after_id < order['order_id'] <= max_id])
+    
+    run = reconcile(fetch_orders, created_before=datetime.utcnow())
+    assert (run.max_order_id, run.orders_checked, run.payments_checked, run.mismatch_count) == (2, 2, 2, 1)
+    assert ReconciliationMismatch.query.one().kind == 'amount_mismatch'
+    
+    run = reconcile(fetch_orders, created_before=datetime.utcnow())
+    assert calls == [0, 2]
+    assert (run.after_order_id, run.orders_checked, run.mismatch_count) == (2, 1, 0)
+    
+    response = client.get('/api/payments/export?after_order_id=1&max_order_id=3',
+                          headers={'X-Service-Token': 'test-service-token'})
+    assert response.status_code == 200
+    assert [json.loads(line)['order_id'] for line in response.get_data(as_text=True).splitlines()] == [2, 3]
+    assert client.get('/api/payments/export?max_order_id=3').status_code == 401
+
+def test_sql_profiler_reports_n_plus_one(app, client, caplog):
+    """Test that a statement repeated per row is reported as an N+1 with the plan of slow statements"""
+    from flask import jsonify
+    for order_id in range(1, 8):
+        db.session.add(Payment(order_id=order_id, customer_id='test-user', amount=10.0, payment_method='card'))
+    db.session.commit()
+    db.session.remove()
+    
+    @app.route('/payments-one-by-one')
+    def payments_one_by_one():
+        ids = [payment_id for payment_id, in db.session.query(Payment.id)]
+        return jsonify([db.session.get(Payment, payment_id).status for payment_id in ids])
+    
+    response = client.get('/payments-one-by-one')
+    assert response.headers['X-Query-Profile'].startswith('queries=8; ')
+    assert response.headers['X-Query-Profile'].endswith('; n_plus_one=1; slow=0')
+    assert '7x SELECT payments.id' in caplog.text
+    assert 'WHERE payments.id = ?' in caplog.text
+    
+    app.config['SQL_PROFILER_SLOW_MS'] = 0
+    response = client.get('/api/payments/export?max_order_id=3', headers={'X-Service-Token': 'test-service-token'})
+    assert response.headers['X-Query-Profile'].endswith('; n_plus_one=0; slow=1')
+    assert 'SEARCH payments USING INDEX' in caplog.text
+
+@pytest.mark.query_budget(1)
+def test_list_payments_within_query_budget(client, auth_headers):
+    """Test that listing payments stays a single SELECT"""
+    assert client.get('/api/payments/', headers=auth_headers).status_code == 200
+
+def test_query_budget_fails_tests_over_budget(pytester):
+    """Test that the query budget plugin fails a test running more statements than its budget"""
+    pytester.makepyfile("""
+        import pytest
+        from sqlalchemy import create_engine, text
+
+        engine = create_engine('sqlite://')
+
+        @pytest.mark.query_budget(2)
+        def test_three_queries():
+            with engine.connect() as connection:
+                for value in (1, 2, 3):
+                    connection.execute(text('SELECT :value'), {'value': value})
+
+        @pytest.mark.query_budget(3)
+        def test_within_budget():
+            with engine.connect() as connection:
+                connection.execute(text('SELECT 1'))
+    """)
+    result = pytester.runpytest_inprocess('-p', 'app.query_budget', '--query-n-plus-one', '2')
+    result.assert_outcomes(passed=1, failed=1)
+    result.stdout.fnmatch_lines(['*Query budget exceeded: 3 SQL statements, budget 2*', '*N+1: 3x SELECT ?*'])
+
+def test_engine_options_from_pool_config():
+    """Test that the pool settings reach the engine options"""
+    from sqlalchemy.pool import NullPool
+    from app.db_pool import TimedQueuePool, engine_options
+    
+    options = engine_options({'SQLALCHEMY_DATABASE_URI': 'sqlite:////tmp/payments.db', 'DB_POOL_SIZE': 3,
+                              'DB_POOL_MAX_OVERFLOW': 1, 'DB_POOL_TIMEOUT': 2, 'DB_POOL_RECYCLE': 60})
+    assert options['poolclass'] is TimedQueuePool
+    assert (options['pool_size'], options['max_overflow'], options['pool_timeout'], options['pool_recycle']) == (3, 1, 2, 60)
+    assert 'connect_args' not in options
+    # The in-memory database is its one connection
+    assert engine_options({'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:'}) == {}
+    
+    options = engine_options({'SQLALCHEMY_DATABASE_URI': 'postgresql://db/payment_db', 'DB_STATEMENT_TIMEOUT_MS': 5000})
+    assert options['connect_args'] == {'options': '-c statement_timeout=5000'}
+    options = engine_options({'SQLALCHEMY_DATABASE_URI': 'postgresql+psycopg://db/payment_db', 'DB_PGBOUNCER': True,
+                              'DB_STATEMENT_TIMEOUT_MS': 5000})
+    assert options == {'poolclass': NullPool, 'connect_args': {'prepare_threshold': None}}
+
+def test_statement_timeout_interrupts_long_sqlite_query(tmp_path, monkeypatch):
+    """Test that a statement running past its route's limit is interrupted"""
+    from sqlalchemy import text
+    from sqlalchemy.exc import OperationalError
+    from app import create_app
+    from app.db_pool import statement_timeout
+    
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'payments.db'}")
+    monkeypatch.setenv('DB_STATEMENT_TIMEOUT_MS', '50')
+    app = create_app()
+    long_query = text('WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n) SELECT count(*) FROM n')
+    
+    @statement_timeout(20)
+    def limited():
+        return db.session.execute(long_query).scalar()
+    
+    with app.test_request_context():
+        with pytest.raises(OperationalError, match='interrupted'):
+            limited()
+        db.session.rollback()
+        with pytest.raises(OperationalError, match='interrupted'):
+            db.session.execute(long_query)
+        db.session.rollback()
+        assert db.session.execute(text('SELECT 1')).scalar() == 1
+        db.session.remove()
+
+def test_metrics_include_pool_checkout_wait(tmp_path, monkeypatch):
+    """Test that the pool is warmed at startup and its checkouts are exported"""
+    from app import create_app
+    
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'payments.db'}")
+    monkeypatch.setenv('DB_POOL_SIZE', '3')
+    monkeypatch.setenv('DB_POOL_WARM', '3')
+    app = create_app()
+    with app.app_context():
+        assert db.engine.pool.checkedin() == 3
+    
+    body = app.test_client().get('/metrics').get_data(as_text=True)
+    assert 'db_pool_checkout_wait_seconds_bucket{engine="default",le="+Inf"}' in body
+    assert 'db_pool_checkout_timeouts_total{engine="default"} 0' in body
+    assert 'db_pool_size{engine="default"} 3' in body
+    assert 'db_pool_checked_out{engine="default"} 0' in body
@@ -35,7 +35,36 @@ def create_app(test_config=None):
             JWT_TOKEN_LOCATION=['headers'],
             JWT_ALGORITHM='HS256',
             JSON_AS_ASCII=False,
-            JSONIFY_MIMETYPE='application/json; charset=utf-8'
+            JSONIFY_MIMETYPE='application/json; charset=utf-8',
+            MENU_IMPORT_CHUNK_SIZE=int(os.getenv('MENU_IMPORT_CHUNK_SIZE', '500')),
+            MENU_IMPORT_MAX_ROWS=int(os.getenv('MENU_IMPORT_MAX_ROWS', '50000')),
+            STREAM_YIELD_PER=int(os.getenv('STREAM_YIELD_PER', '500')),
+            FACET_REFRESH_SECONDS=int(os.getenv('FACET_REFRESH_SECONDS', '60')),
+            USER_SERVICE_URL=os.getenv('USER_SERVICE_URL', 'http://user-service:5001'),
+            SERVICE_AUTH_TOKEN=os.getenv('SERVICE_AUTH_TOKEN'),
+            REVOCATION_SYNC_SECONDS=int(os.getenv('REVOCATION_SYNC_SECONDS', '5')),
+            REVOCATION_BLOOM_CAPACITY=int(os.getenv('REVOCATION_BLOOM_CAPACITY', '100000')),
+            REVOCATION_BLOOM_ERROR_RATE=float(os.getenv('REVOCATION_BLOOM_ERROR_RATE', '0.001')),
+            REVOCATION_SYNC_OVERLAP=int(os.getenv('REVOCATION_SYNC_OVERLAP', '100')),
+            REVOCATION_INITIAL_SYNC_TIMEOUT=float(os.getenv('REVOCATION_INITIAL_SYNC_TIMEOUT', '5')),
+            JWKS_URL=os.getenv('JWKS_URL'),
+            JWKS_REFRESH_SECONDS=int(os.getenv('JWKS_REFRESH_SECONDS', '300')),
+            JWT_ACCEPT_HS256=os.getenv('JWT_ACCEPT_HS256', 'false').lower() == 'true',
+            TRACE_EXPORTER=os.getenv('TRACE_EXPORTER', 'none'),
+            TRACE_FILE=os.getenv('TRACE_FILE', 'traces.ndjson'),
+            TRACE_SAMPLE_RATE=float(os.getenv('TRACE_SAMPLE_RATE', '0.1')),
+            TRACE_EXPORT_INTERVAL=float(os.getenv('TRACE_EXPORT_INTERVAL', '5')),
+            SQL_PROFILER=os.getenv('SQL_PROFILER', 'false').lower() == 'true',
+            SQL_PROFILER_N_PLUS_ONE_THRESHOLD=int(os.getenv('SQL_PROFILER_N_PLUS_ONE_THRESHOLD', '5')),
+            SQL_PROFILER_SLOW_MS=float(os.getenv('SQL_PROFILER_SLOW_MS', '100')),
+            DB_POOL_SIZE=int(os.getenv('DB_POOL_SIZE', '5')),
+            DB_POOL_MAX_OVERFLOW=int(os.getenv('DB_POOL_MAX_OVERFLOW', '10')),
+            DB_POOL_TIMEOUT=int(os.getenv('DB_POOL_TIMEOUT', '30')),
+            DB_POOL_RECYCLE=int(os.getenv('DB_POOL_RECYCLE', '1800')),
+            DB_POOL_PRE_PING=os.getenv('DB_POOL_PRE_PING', 'true').lower() == 'true',
+            DB_POOL_WARM=int(os.getenv('DB_POOL_WARM', '2')),
+            DB_PGBOUNCER=os.getenv('DB_PGBOUNCER', 'false').lower() == 'true',
+            DB_STATEMENT_TIMEOUT_MS=int(os.getenv('DB_STATEMENT_TIMEOUT_MS', '0'))
         )
     else:
         # Load the test config if passed in
@@ -53,24 +82,78 @@ def create_app(test_config=None):
             JWT_TOKEN_LOCATION=['headers'],
             JWT_ALGORITHM='HS256',
             JSON_AS_ASCII=False,
-            JSONIFY_MIMETYPE='application/json; charset=utf-8'
+            JSONIFY_MIMETYPE='application/json; charset=utf-8',
+            MENU_IMPORT_CHUNK_SIZE=500,
+            MENU_IMPORT_MAX_ROWS=50000,
+            FACET_REFRESH_SECONDS=60,
+            USER_SERVICE_URL='http://user-service:5001',
+            SERVICE_AUTH_TOKEN='test-service-token',
+            REVOCATION_SYNC_SECONDS=0
         )
     
     # Initialize extensions
+    from .db_pool import engine_options
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(app.config))
     db.init_app(app)
     jwt.init_app(app)
     migrate.init_app(app, db)
+
+    from .jwks import init_jwks
+    init_jwks(app, jwt)
+
+    from .revocation import init_revocation
+    init_revocation(app, jwt)
+
+    from .instrumentation import init_instrumentation
+    init_instrumentation(app)
+
+    from .tracing import init_tracing
+    init_tracing(app, 'restaurant-service')
+
+    from .profiler import init_profiler
+    init_profiler(app)
+
+    from .db_pool import init_db_pool
+    init_db_pool(app, db)
     
     # Create database tables
     with app.app_context():
         # Import models to ensure they are registered with SQLAlchemy
-        from .models import Restaurant, MenuItem
+        from .models import Restaurant, MenuItem, OpeningInterval, MenuSnapshot
         
         # Create tables
         db.create_all()
+
+        # Build the in-memory facet counts
+        from .facets import FacetIndex
+        app.extensions['facets'] = FacetIndex(app.config['FACET_REFRESH_SECONDS'])
+        app.extensions['facets'].rebuild()
     
     # Register blueprints
     from .routes import restaurant_bp
     app.register_blueprint(restaurant_bp, url_prefix='/api/restaurants')
+
+    @app.cli.command('compile-opening-hours')
+    def compile_opening_hours():
+        """Rebuild opening intervals for restaurants stored before they existed."""
+        from .models import Restaurant
+        from .opening_hours import InvalidOpeningHours
+        compiled = skipped = 0
+        last_id = 0
+        while True:
+            batch = Restaurant.query.filter(Restaurant.id > last_id).order_by(Restaurant.id).limit(500).all()
+            if not batch:
+                break
+            for restaurant in batch:
+                try:
+                    restaurant.set_opening_hours(restaurant.opening_hours)
+                    compiled += 1
+                except InvalidOpeningHours as e:
+                    logger.warning("Skipping restaurant %s: %s", restaurant.id, str(e))
+                    skipped += 1
+            last_id = batch[-1].id
+            db.session.commit()
+            db.session.expunge_all()
+        logger.info("Compiled opening hours for %d restaurants, skipped %d", compiled, skipped)
     
     return app 
\ No newline at end of file
@@ -0,0 +1,193 @@
+"""Incrementally maintained facet counts for the catalog.
+
+``FacetIndex`` keeps one small record per restaurant (cuisine, active flag,
+location, compiled opening ranges and menu categories) plus running totals
+per cuisine and per category. Unfiltered counts are read straight from the
+totals; location and open-now filters are answered by scanning the in-memory
+records, never the database.
+
+Staleness: writes handled by this process update the index right after they
+commit and are visible immediately. Writes made by other worker processes are
+picked up by a full rebuild once the index is older than
+``FACET_REFRESH_SECONDS`` (default 60), which bounds how stale counts can be.
+Only one request performs that rebuild; concurrent requests keep answering
+from the previous index instead of queueing behind it.
+"""
+import math
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+from sqlalchemy import func
+
+from . import db
+from .models import MenuItem, OpeningInterval, Restaurant
+from .opening_hours import is_open
+
+EARTH_RADIUS_KM = 6371.0
+
+
+def distance_km(lat1, lng1, lat2, lng2):
+    """Great-circle distance using the haversine formula."""
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+class FacetIndex:
+    def __init__(self, refresh_seconds=60):
+        self.refresh_seconds = refresh_seconds
+        self._lock = threading.RLock()
+        self._rebuild_lock = threading.Lock()
+        self._records = {}
+        self._cuisines = Counter()
+        self._categories = Counter()
+        self._active = 0
+        self.built_at = None
+        self._built_monotonic = 0.0
+
+    # -- maintenance -------------------------------------------------------
+
+    def _add(self, record, sign):
+        if not record['active']:
+            return
+        self._active += sign
+        if record['cuisine']:
+            self._cuisines[record['cuisine']] += sign
+        for category, count in record['categories'].items():
+            if count > 0:
+                self._categories[category] += sign
+
+    def rebuild(self):
+        """Recompute every record and total from the database."""
+        records = {}
+        for restaurant_id, cuisine, active, lat, lng in db.session.query(
+            Restaurant.id, Restaurant.cuisine_type, Restaurant.is_active, Restaurant.latitude, Restaurant.longitude
+        ):
+            records[restaurant_id] = {
+                'cuisine': cuisine, 'active': active, 'lat': lat, 'lng': lng,
+                'ranges': [], 'categories': Counter()
+            }
+        for restaurant_id, start, end in db.session.query(
+            OpeningInterval.restaurant_id, OpeningInterval.start_minute, OpeningInterval.end_minute
+        ):
+            if restaurant_id in records:
+                records[restaurant_id]['ranges'].append((start, end))
+        for restaurant_id, category, count in self._category_rows():
+            if restaurant_id in records:
+                records[restaurant_id]['categories'][category] = count
+
+        with self._lock:
+            self._records = records
+            self._cuisines = Counter()
+            self._categories = Counter()
+            self._active = 0
+            for record in records.values():
+                self._add(record, 1)
+            self.built_at = datetime.utcnow()
+            self._built_monotonic = time.monotonic()
+
+    def _category_rows(self, restaurant_id=None):
+        query = db.session.query(MenuItem.restaurant_id, MenuItem.category, func.count(MenuItem.id)).filter(
+            MenuItem.is_available.is_(True), MenuItem.category.isnot(None)
+        )
+        if restaurant_id is not None:
+            query = query.filter(MenuItem.restaurant_id == restaurant_id)
+        return query.group_by(MenuItem.restaurant_id, MenuItem.category)
+
+    def update_restaurant(self, restaurant):
+        """Apply a committed create/update of a restaurant."""
+        with self._lock:
+            old = self._records.get(restaurant.id)
+            record = {
+                'cuisine': restaurant.cuisine_type,
+                'active': restaurant.is_active,
+                'lat': restaurant.latitude,
+                'lng': restaurant.longitude,
+                'ranges': [(i.start_minute, i.end_minute) for i in restaurant.opening_intervals],
+                'categories': old['categories'] if old else Counter()
+            }
+            if old:
+                self._add(old, -1)
+            self._records[restaurant.id] = record
+            self._add(record, 1)
+
+    def add_menu_item(self, restaurant_id, category, is_available=True):
+        """Apply a committed menu item insert."""
+        if not category or not is_available:
+            return
+        with self._lock:
+            record = self._records.get(restaurant_id)
+            if record is None:
+                return
+            if record['categories'][category] == 0 and record['active']:
+                self._categories[category] += 1
+            record['categories'][category] += 1
+
+    def refresh_menu(self, restaurant_id):
+        """Recount one restaurant's categories after a bulk menu change."""
+        categories = Counter({category: count for _, category, count in self._category_rows(restaurant_id)})
+        with self._lock:
+            record = self._records.get(restaurant_id)
+            if record is None:
+                return
+            self._add(record, -1)
+            record['categories'] = categories
+            self._add(record, 1)
+
+    # -- reads -------------------------------------------------------------
+
+    def is_stale(self):
+        return time.monotonic() - self._built_monotonic > self.refresh_seconds
+
+    def refresh_if_stale(self):
+        """Rebuild a stale index unless another caller is already doing so."""
+        if not self.is_stale():
+            return
+        # Before the first build there is nothing to serve, so wait for it
+        if not self._rebuild_lock.acquire(blocking=self.built_at is None):
+            return
+        try:
+            if self.is_stale():
+                self.rebuild()
+        finally:
+            self._rebuild_lock.release()
+
+    def counts(self, near=None, radius_km=None, open_minute=None):
+        """Facet counts over active restaurants, optionally filtered.
+
+        ``near`` is a (lat, lng) pair used with ``radius_km``; ``open_minute``
+        is a minute-of-week the restaurant must be open at.
+        """
+        self.refresh_if_stale()
+
+        with self._lock:
+            if near is None and open_minute is None:
+                cuisines, categories = +self._cuisines, +self._categories
+                total = self._active
+            else:
+                cuisines, categories, total = Counter(), Counter(), 0
+                for record in self._records.values():
+                    if not record['active']:
+                        continue
+                    if near is not None:
+                        if record['lat'] is None or record['lng'] is None:
+                            continue
+                        if distance_km(near[0], near[1], record['lat'], record['lng']) > radius_km:
+                            continue
+                    if open_minute is not None and not is_open(record['ranges'], open_minute):
+                        continue
+                    total += 1
+                    if record['cuisine']:
+                        cuisines[record['cuisine']] += 1
+                    categories.update(category for category, count in record['categories'].items() if count > 0)
+            built_at = self.built_at
+
+        return {
+            'restaurants': total,
+            'cuisine_type': dict(cuisines),
+            'category': dict(categories),
+            'built_at': built_at.isoformat() if built_at else None,
+            'max_staleness_seconds': self.refresh_seconds
+        }
@@ -0,0 +1,109 @@
+"""Local verification of User Service's asymmetrically signed tokens.
+
+When ``JWKS_URL`` is configured, the public keys published by User Service
+are cached in memory by ``kid`` and refreshed in the background every
+``JWKS_REFRESH_SECONDS``, so verifying a token never makes a network call.
+A token with an unknown ``kid`` (i.e. a key rotation that happened since the
+last refresh) triggers one immediate refresh, at most once every
+``JWKS_MIN_REFRESH_SECONDS``. If User Service is unreachable, the last
+fetched keys stay in use.
+
+Without ``JWKS_URL``, tokens are verified with HS256 and ``JWT_SECRET_KEY``.
+"""
+import logging
+import os
+import threading
+import time
+
+import requests
+from flask import current_app
+from jwt import PyJWK
+from jwt.exceptions import InvalidTokenError, PyJWTError
+
+logger = logging.getLogger(__name__)
+
+
+class JWKSCache:
+    def __init__(self, url, refresh_seconds=300, min_refresh_seconds=30):
+        self.url = url
+        self.refresh_seconds = refresh_seconds
+        self.min_refresh_seconds = min_refresh_seconds
+        self._keys = {}
+        self._lock = threading.Lock()
+        self._last_attempt = None
+        self._thread = None
+        self._thread_pid = None
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            config['JWKS_URL'],
+            refresh_seconds=config.get('JWKS_REFRESH_SECONDS', 300),
+            min_refresh_seconds=config.get('JWKS_MIN_REFRESH_SECONDS', 30)
+        )
+
+    def refresh(self):
+        self._last_attempt = time.monotonic()
+        response = requests.get(self.url, timeout=5)
+        response.raise_for_status()
+        keys = {}
+        for jwk in response.json().get('keys', []):
+            try:
+                keys[jwk['kid']] = PyJWK(jwk)
+            except (KeyError, PyJWTError) as e:
+                logger.warning(f"Skipping unusable JWKS key: {str(e)}")
+        # Swapped in one assignment, so readers never see a half-built key set
+        self._keys = keys
+
+    def _refresh_quietly(self):
+        try:
+            self.refresh()
+        except (requests.exceptions.RequestException, ValueError) as e:
+            logger.error(f"Error refreshing JWKS: {str(e)}")
+
+    def _run(self):
+        while True:
+            time.sleep(self.refresh_seconds)
+            self._refresh_quietly()
+
+    def ensure_refreshing(self):
+        # One refresh thread per process, started lazily so it survives pre-fork servers
+        if self._thread_pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread_pid == os.getpid() and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name='jwks-refresh', daemon=True)
+            self._thread_pid = os.getpid()
+            self._thread.start()
+
+    def get(self, kid):
+        self.ensure_refreshing()
+        key = self._keys.get(kid)
+        if key is None:
+            with self._lock:
+                key = self._keys.get(kid)
+                due = self._last_attempt is None or time.monotonic() - self._last_attempt >= self.min_refresh_seconds
+                if key is None and due:
+                    self._refresh_quietly()
+                    key = self._keys.get(kid)
+        return key
+
+
+def init_jwks(app, jwt):
+    cache = JWKSCache.from_config(app.config) if app.config.get('JWKS_URL') else None
+    app.extensions['jwks'] = cache
+    if cache is not None:
+        algorithms = list(app.config.get('JWKS_ALGORITHMS', ['RS256', 'EdDSA']))
+        app.config['JWT_ALGORITHM'] = algorithms[0]
+        app.config['JWT_DECODE_ALGORITHMS'] = algorithms + (['HS256'] if app.config.get('JWT_ACCEPT_HS256') else [])
+
+    @jwt.decode_key_loader
+    def select_decode_key(jwt_header, jwt_payload):
+        cache = current_app.extensions.get('jwks')
+        if cache is None or jwt_header.get('alg', '').startswith('HS'):
+            return current_app.config['JWT_SECRET_KEY']
+        key = cache.get(jwt_header.get('kid'))
+        if key is None or key.algorithm_name != jwt_header.get('alg'):
+            raise InvalidTokenError('Unknown signing key')
+        return key.key
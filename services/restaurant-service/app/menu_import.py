@@ -0,0 +1,196 @@
+"""Bulk menu import.
+
+Uploads are parsed as a stream (NDJSON or CSV) and validated in chunks, so a
+large menu never has to be held in memory at once. Valid rows are upserted by
+(restaurant_id, name) with a single multi-row INSERT ... ON CONFLICT per chunk;
+the caller owns the surrounding transaction.
+"""
+import csv
+import io
+import json
+from datetime import datetime
+
+from sqlalchemy.dialects import postgresql, sqlite
+
+from . import db
+from .models import MenuItem
+
+NDJSON_MIMETYPES = ('application/x-ndjson', 'application/ndjson', 'application/jsonl')
+CSV_MIMETYPES = ('text/csv', 'application/csv')
+
+REQUIRED_FIELDS = ['name', 'price', 'category']
+UPSERT_FIELDS = ['description', 'price', 'category', 'is_available', 'updated_at']
+
+_TRUE_VALUES = {'true', '1', 'yes', 'y'}
+_FALSE_VALUES = {'false', '0', 'no', 'n'}
+
+
+class UnsupportedFormat(ValueError):
+    pass
+
+
+def iter_rows(stream, mimetype):
+    """Yield (row_number, row_dict_or_None, parse_error) from a byte stream."""
+    text = io.TextIOWrapper(io.BufferedReader(stream), encoding='utf-8', newline='')
+    if mimetype in NDJSON_MIMETYPES:
+        return _iter_ndjson(text)
+    if mimetype in CSV_MIMETYPES:
+        return _iter_csv(text)
+    raise UnsupportedFormat(mimetype)
+
+
+def _iter_ndjson(text):
+    for number, line in enumerate(text, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield number, None, f'Invalid JSON: {e.msg}'
+            continue
+        if not isinstance(row, dict):
+            yield number, None, 'Row must be a JSON object'
+            continue
+        yield number, row, None
+
+
+def _iter_csv(text):
+    reader = csv.DictReader(text)
+    # Reading the field names consumes the header
+    if reader.fieldnames is None:
+        return
+    # A quoted field can span lines, so each row is numbered by the line it
+    # starts on, counted from the reader's position after the previous row
+    number = reader.line_num + 1
+    for row in reader:
+        yield number, {k: v for k, v in row.items() if k is not None and v != ''}, None
+        number = reader.line_num + 1
+
+
+def validate_row(row):
+    """Return (values, errors) for a single menu row."""
+    errors = {}
+    missing_fields = [field for field in REQUIRED_FIELDS if row.get(field) in (None, '')]
+    if missing_fields:
+        errors['missing_fields'] = missing_fields
+
+    name = row.get('name')
+    if name is not None and (not isinstance(name, str) or len(name) > 100):
+        errors['name'] = 'Must be a string of at most 100 characters'
+
+    category = row.get('category')
+    if category is not None and (not isinstance(category, str) or len(category) > 50):
+        errors['category'] = 'Must be a string of at most 50 characters'
+
+    price = None
+    if row.get('price') not in (None, ''):
+        try:
+            price = float(row['price'])
+        except (TypeError, ValueError):
+            errors['price'] = 'Must be a number'
+        else:
+            if price < 0:
+                errors['price'] = 'Must not be negative'
+
+    is_available = row.get('is_available', True)
+    if isinstance(is_available, str):
+        lowered = is_available.strip().lower()
+        if lowered in _TRUE_VALUES:
+            is_available = True
+        elif lowered in _FALSE_VALUES:
+            is_available = False
+    if not isinstance(is_available, bool):
+        errors['is_available'] = 'Must be a boolean'
+
+    if errors:
+        return None, errors
+
+    return {
+        'name': name,
+        'description': row.get('description'),
+        'price': price,
+        'category': category,
+        'is_available': is_available,
+    }, None
+
+
+def _insert():
+    """INSERT with ON CONFLICT for the dialects that have it, else None."""
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        return postgresql.insert(MenuItem.__table__)
+    if dialect == 'sqlite':
+        return sqlite.insert(MenuItem.__table__)
+    return None
+
+
+def _upsert_rows(restaurant_id, rows):
+    """Upsert row by row, for dialects without ON CONFLICT."""
+    existing = {
+        item.name: item for item in MenuItem.query.filter(
+            MenuItem.restaurant_id == restaurant_id, MenuItem.name.in_([row['name'] for row in rows])
+        )
+    }
+    for row in rows:
+        item = existing.get(row['name'])
+        if item is None:
+            db.session.add(MenuItem(**row))
+        else:
+            for field in UPSERT_FIELDS:
+                setattr(item, field, row[field])
+    db.session.flush()
+
+
+def upsert_chunk(restaurant_id, values):
+    """Upsert a chunk of validated rows in one executemany round trip."""
+    if not values:
+        return 0
+    now = datetime.utcnow()
+    # ON CONFLICT cannot touch the same row twice in one statement, so the
+    # last occurrence of a name within the chunk wins.
+    by_name = {}
+    for value in values:
+        by_name[value['name']] = dict(value, restaurant_id=restaurant_id, created_at=now, updated_at=now)
+    stmt = _insert()
+    if stmt is None:
+        _upsert_rows(restaurant_id, list(by_name.values()))
+        return len(by_name)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['restaurant_id', 'name'],
+        set_={field: stmt.excluded[field] for field in UPSERT_FIELDS}
+    )
+    db.session.execute(stmt, list(by_name.values()))
+    return len(by_name)
+
+
+def import_menu(restaurant_id, rows, chunk_size=500, max_rows=None):
+    """Validate and upsert rows chunk by chunk; returns a per-row report."""
+    report = {
+        'restaurant_id': restaurant_id,
+        'processed': 0,
+        'imported': 0,
+        'failed': 0,
+        'errors': []
+    }
+    chunk = []
+    for number, row, parse_error in rows:
+        if max_rows is not None and report['processed'] >= max_rows:
+            report['errors'].append({'row': number, 'errors': {'limit': f'Import is limited to {max_rows} rows'}})
+            report['truncated'] = True
+            break
+        report['processed'] += 1
+        if parse_error:
+            values, errors = None, {'row': parse_error}
+        else:
+            values, errors = validate_row(row)
+        if errors:
+            report['failed'] += 1
+            report['errors'].append({'row': number, 'errors': errors})
+            continue
+        chunk.append(values)
+        if len(chunk) >= chunk_size:
+            report['imported'] += upsert_chunk(restaurant_id, chunk)
+            chunk = []
+    report['imported'] += upsert_chunk(restaurant_id, chunk)
+    return report
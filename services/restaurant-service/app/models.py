@@ -1,5 +1,7 @@
+import json
 from datetime import datetime
 from . import db
+from .opening_hours import parse_opening_hours
 
 class Restaurant(db.Model):
     __tablename__ = 'restaurants'
@@ -12,13 +14,29 @@ class Restaurant(db.Model):
     email = db.Column(db.String(120), unique=True, nullable=False)
     owner_id = db.Column(db.Integer, nullable=False)  # References user_id from User Service
     cuisine_type = db.Column(db.String(50))
-    opening_hours = db.Column(db.String(200))  # Store as JSON string
+    opening_hours = db.Column(db.Text)  # Store as JSON string
     latitude = db.Column(db.Float, nullable=True)
     longitude = db.Column(db.Float, nullable=True)
     is_active = db.Column(db.Boolean, default=True, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
 
+    # Compiled form of opening_hours, rebuilt by set_opening_hours
+    opening_intervals = db.relationship('OpeningInterval', backref='restaurant', lazy=True, cascade='all, delete-orphan')
+
+    def set_opening_hours(self, value):
+        """Store opening hours and recompile the weekly intervals.
+
+        Raises InvalidOpeningHours if the document cannot be parsed.
+        """
+        ranges = parse_opening_hours(value)
+        if value is not None and not isinstance(value, str):
+            value = json.dumps(value)
+        self.opening_hours = value
+        self.opening_intervals = [
+            OpeningInterval(start_minute=start, end_minute=end) for start, end in ranges
+        ]
+
     def to_dict(self):
         return {
             'id': self.id,
@@ -37,8 +55,23 @@ class Restaurant(db.Model):
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
 
+class OpeningInterval(db.Model):
+    __tablename__ = 'opening_intervals'
+    __table_args__ = (
+        # Covers the "open at minute m" lookup: start <= m < end
+        db.Index('ix_opening_intervals_start_end', 'start_minute', 'end_minute', 'restaurant_id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    restaurant_id = db.Column(db.Integer, db.ForeignKey('restaurants.id'), nullable=False, index=True)
+    start_minute = db.Column(db.Integer, nullable=False)  # Minute of week, Monday 00:00 = 0
+    end_minute = db.Column(db.Integer, nullable=False)  # Exclusive
+
 class MenuItem(db.Model):
     __tablename__ = 'menu_items'
+    __table_args__ = (
+        db.UniqueConstraint('restaurant_id', 'name', name='uq_menu_items_restaurant_id_name'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     restaurant_id = db.Column(db.Integer, db.ForeignKey('restaurants.id'), nullable=False)
@@ -61,4 +94,17 @@ class MenuItem(db.Model):
             'is_available': self.is_available,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
-        } 
\ No newline at end of file
+        } 
+
+class MenuSnapshot(db.Model):
+    __tablename__ = 'menu_snapshots'
+    __table_args__ = (
+        db.UniqueConstraint('restaurant_id', 'version', name='uq_menu_snapshots_restaurant_id_version'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    restaurant_id = db.Column(db.Integer, db.ForeignKey('restaurants.id'), nullable=False)
+    version = db.Column(db.Integer, nullable=False)
+    digest = db.Column(db.String(64), unique=True, nullable=False)  # sha256 of payload
+    payload = db.Column(db.Text, nullable=False)  # Canonical JSON, never modified
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
@@ -0,0 +1,109 @@
+"""Opening hours compiled to minute-of-week intervals.
+
+``Restaurant.opening_hours`` keeps the JSON document clients send, e.g.
+``{"monday": "09:00-22:00", "friday": ["11:00-15:00", "18:00-02:00"],
+"sunday": "closed"}``. On write it is compiled into half-open
+``[start_minute, end_minute)`` ranges over the week (Monday 00:00 is minute 0)
+so "open at" becomes an indexed range lookup instead of string parsing per row.
+Times are interpreted as UTC.
+"""
+import json
+from datetime import datetime, timezone
+
+MINUTES_PER_DAY = 24 * 60
+MINUTES_PER_WEEK = 7 * MINUTES_PER_DAY
+
+DAYS = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+_DAY_INDEX = {}
+for _index, _day in enumerate(DAYS):
+    _DAY_INDEX[_day] = _index
+    _DAY_INDEX[_day[:3]] = _index
+
+CLOSED_VALUES = {'closed', ''}
+
+
+class InvalidOpeningHours(ValueError):
+    pass
+
+
+def _parse_time(value):
+    try:
+        hours, minutes = value.strip().split(':')
+        hours, minutes = int(hours), int(minutes)
+    except ValueError:
+        raise InvalidOpeningHours(f'Invalid time {value!r}, expected HH:MM')
+    if not (0 <= hours <= 24 and 0 <= minutes < 60) or (hours == 24 and minutes):
+        raise InvalidOpeningHours(f'Invalid time {value!r}, expected HH:MM')
+    return hours * 60 + minutes
+
+
+def _parse_range(value):
+    if not isinstance(value, str) or '-' not in value:
+        raise InvalidOpeningHours(f'Invalid range {value!r}, expected HH:MM-HH:MM')
+    start, end = (_parse_time(part) for part in value.split('-', 1))
+    if end <= start:
+        # Closes after midnight, e.g. 18:00-02:00
+        end += MINUTES_PER_DAY
+    return start, end
+
+
+def _merge(ranges):
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def parse_opening_hours(value):
+    """Compile an opening-hours document to sorted, non-overlapping ranges."""
+    if value is None or value == '':
+        return []
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except json.JSONDecodeError:
+            raise InvalidOpeningHours('Opening hours must be a JSON object')
+    if not isinstance(value, dict):
+        raise InvalidOpeningHours('Opening hours must be a JSON object')
+
+    ranges = []
+    for day, spec in value.items():
+        day_index = _DAY_INDEX.get(str(day).strip().lower())
+        if day_index is None:
+            raise InvalidOpeningHours(f'Unknown day {day!r}')
+        specs = spec if isinstance(spec, list) else [spec]
+        for item in specs:
+            if isinstance(item, str) and item.strip().lower() in CLOSED_VALUES:
+                continue
+            start, end = _parse_range(item)
+            start += day_index * MINUTES_PER_DAY
+            end += day_index * MINUTES_PER_DAY
+            if end > MINUTES_PER_WEEK:
+                # Sunday night spills over into Monday morning
+                ranges.append((start, MINUTES_PER_WEEK))
+                ranges.append((0, end - MINUTES_PER_WEEK))
+            else:
+                ranges.append((start, end))
+    return _merge(ranges)
+
+
+def minute_of_week(moment):
+    """Minute-of-week for a datetime; aware datetimes are converted to UTC."""
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc)
+    return moment.weekday() * MINUTES_PER_DAY + moment.hour * 60 + moment.minute
+
+
+def is_open(ranges, minute):
+    return any(start <= minute < end for start, end in ranges)
+
+
+def parse_moment(value):
+    """Parse an ``open_at`` query value (ISO 8601)."""
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise InvalidOpeningHours(f'Invalid datetime {value!r}, expected ISO 8601')
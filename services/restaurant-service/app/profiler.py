@@ -0,0 +1,220 @@
+"""Opt-in SQL profiler that reports N+1 queries and slow statements per request.
+
+With ``SQL_PROFILER`` enabled, ``init_profiler(app)`` records every SQL
+statement a request executes under its fingerprint: the statement with
+literals and bind parameters replaced by ``?`` and ``IN`` lists collapsed, so
+``SELECT ... WHERE order_id = 1`` and ``... = 2`` count as the same query.
+
+- a fingerprint executed more than ``SQL_PROFILER_N_PLUS_ONE_THRESHOLD``
+  times (default 5) in one request is reported as an N+1, typically a lazy
+  relationship loaded inside a loop
+- a SELECT slower than ``SQL_PROFILER_SLOW_MS`` (default 100) has its query
+  plan captured with ``EXPLAIN`` (``EXPLAIN QUERY PLAN`` on SQLite)
+
+Every profiled response carries an ``X-Query-Profile`` header (``queries=12;
+time_ms=4.1; n_plus_one=1; slow=0``). Requests with an N+1 or a slow
+statement are also logged as a warning with the offending statements and
+plans. The header exposes query counts, so enable the profiler in
+development and staging rather than on the public network.
+
+``profile()`` profiles any block of code outside a request; the
+``app.query_budget`` pytest plugin uses it to fail tests that exceed a query
+budget.
+"""
+import logging
+import re
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+
+from flask import g, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_PARAMETER = re.compile(r'%\(\w+\)s|%s|(?<!:):\w+|\$\d+|\?')
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_SPACE = re.compile(r'\s+')
+
+_current = ContextVar('query_profile', default=None)
+_hooks_installed = False
+_hooks_lock = threading.Lock()
+
+
+@lru_cache(maxsize=2048)
+def fingerprint(statement):
+    """Normalise a statement so executions differing only in values compare equal."""
+    statement = _STRING.sub('?', statement)
+    statement = _PARAMETER.sub('?', statement)
+    statement = _NUMBER.sub('?', statement)
+    statement = _IN_LIST.sub('(?+)', statement)
+    return _SPACE.sub(' ', statement).strip()
+
+
+class QueryProfile:
+    def __init__(self, n_plus_one_threshold=5, slow_ms=None):
+        self.n_plus_one_threshold = n_plus_one_threshold
+        self.slow_ms = slow_ms
+        self.queries = 0
+        self.seconds = 0.0
+        # fingerprint -> [executions, seconds]
+        self.fingerprints = {}
+        # (milliseconds, statement, plan) for statements over slow_ms
+        self.slow = []
+
+    def record(self, statement, seconds, plan=None):
+        self.queries += 1
+        self.seconds += seconds
+        entry = self.fingerprints.setdefault(fingerprint(statement), [0, 0.0])
+        entry[0] += 1
+        entry[1] += seconds
+        if self.slow_ms is not None and seconds * 1000 > self.slow_ms:
+            self.slow.append((seconds * 1000, statement, plan))
+
+    def merge(self, other):
+        self.queries += other.queries
+        self.seconds += other.seconds
+        for key, (count, seconds) in other.fingerprints.items():
+            entry = self.fingerprints.setdefault(key, [0, 0.0])
+            entry[0] += count
+            entry[1] += seconds
+        self.slow.extend(other.slow)
+
+    @property
+    def n_plus_one(self):
+        """(fingerprint, executions) for every statement repeated beyond the threshold."""
+        return sorted(
+            ((key, count) for key, (count, _) in self.fingerprints.items() if count > self.n_plus_one_threshold),
+            key=lambda item: -item[1]
+        )
+
+    def header(self):
+        return (f'queries={self.queries}; time_ms={self.seconds * 1000:.1f}; '
+                f'n_plus_one={len(self.n_plus_one)}; slow={len(self.slow)}')
+
+    def report(self, top=5):
+        lines = [f'{self.queries} SQL statements in {self.seconds * 1000:.1f} ms']
+        for key, count in self.n_plus_one:
+            lines.append(f'  N+1: {count}x {key}')
+        if not self.n_plus_one:
+            for key, (count, seconds) in sorted(self.fingerprints.items(), key=lambda item: -item[1][0])[:top]:
+                lines.append(f'  {count}x {seconds * 1000:.1f} ms {key}')
+        for milliseconds, statement, plan in self.slow:
+            lines.append(f'  slow: {milliseconds:.1f} ms {_SPACE.sub(" ", statement).strip()}')
+            if plan:
+                lines.extend(f'    {line}' for line in plan.splitlines())
+        return '\n'.join(lines)
+
+
+def explain(conn, statement, parameters):
+    """Query plan of a SELECT, run on a raw cursor so it is not profiled itself."""
+    prefix = 'EXPLAIN QUERY PLAN ' if conn.dialect.name == 'sqlite' else 'EXPLAIN '
+    cursor = conn.connection.cursor()
+    try:
+        if parameters:
+            cursor.execute(prefix + statement, parameters)
+        else:
+            cursor.execute(prefix + statement)
+        return '\n'.join(str(row[-1]) for row in cursor.fetchall())
+    except Exception as e:
+        return f'EXPLAIN failed: {str(e)}'
+    finally:
+        cursor.close()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None:
+        conn.info.setdefault('profile_started', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    query_profile = _current.get()
+    started = conn.info.get('profile_started')
+    if query_profile is None or not started:
+        return
+    seconds = time.perf_counter() - started.pop()
+    plan = None
+    if (query_profile.slow_ms is not None and seconds * 1000 > query_profile.slow_ms and not executemany
+            and statement.lstrip()[:6].upper() in ('SELECT', 'WITH')):
+        plan = explain(conn, statement, parameters)
+    query_profile.record(statement, seconds, plan)
+
+
+def _handle_error(exception_context):
+    connection = exception_context.connection
+    started = connection.info.get('profile_started') if connection is not None else None
+    if started:
+        started.pop()
+
+
+def _install_hooks():
+    global _hooks_installed
+    with _hooks_lock:
+        if _hooks_installed:
+            return
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        event.listen(Engine, 'handle_error', _handle_error)
+        _hooks_installed = True
+
+
+def current_profile():
+    return _current.get()
+
+
+@contextmanager
+def profile(n_plus_one_threshold=5, slow_ms=None):
+    """Profile the statements executed in a block; an enclosing profile sees them too."""
+    _install_hooks()
+    parent = _current.get()
+    query_profile = QueryProfile(n_plus_one_threshold, slow_ms)
+    token = _current.set(query_profile)
+    try:
+        yield query_profile
+    finally:
+        _current.reset(token)
+        if parent is not None:
+            parent.merge(query_profile)
+
+
+def init_profiler(app):
+    if not app.config.get('SQL_PROFILER', False):
+        return
+    _install_hooks()
+
+    @app.before_request
+    def start_query_profile():
+        g.query_profile = QueryProfile(app.config.get('SQL_PROFILER_N_PLUS_ONE_THRESHOLD', 5),
+                                       app.config.get('SQL_PROFILER_SLOW_MS', 100))
+        g.query_profile_parent = _current.get()
+        g.query_profile_token = _current.set(g.query_profile)
+
+    @app.after_request
+    def report_query_profile(response):
+        query_profile = g.get('query_profile')
+        if query_profile is not None:
+            response.headers['X-Query-Profile'] = query_profile.header()
+            route = request.url_rule.rule if request.url_rule else 'unmatched'
+            if query_profile.n_plus_one or query_profile.slow:
+                logger.warning(f"{request.method} {route}: {query_profile.report()}")
+            else:
+                logger.debug(f"{request.method} {route}: {query_profile.header()}")
+        return response
+
+    @app.teardown_request
+    def end_query_profile(exc):
+        query_profile = g.pop('query_profile', None)
+        if query_profile is not None:
+            try:
+                _current.reset(g.pop('query_profile_token'))
+            except ValueError:
+                # Torn down in another context, e.g. after a streamed body
+                _current.set(g.get('query_profile_parent'))
+            parent = g.pop('query_profile_parent', None)
+            if parent is not None:
+                parent.merge(query_profile)
@@ -0,0 +1,57 @@
+"""pytest plugin that fails tests executing more SQL statements than their budget.
+
+Enable it from ``conftest.py`` with ``pytest_plugins = ['app.query_budget']``,
+then give a test a budget with the marker::
+
+    @pytest.mark.query_budget(3)
+    def test_list_orders(client):
+        ...
+
+or give every test a default with ``--query-budget N`` (or the
+``query_budget`` ini option); the marker wins over the default. Only
+statements executed by the test body count, not those of its fixtures. A
+failing test prints the statements it ran, grouped by fingerprint, with any
+N+1 (a statement repeated more than ``--query-n-plus-one`` times, default 5)
+listed first.
+"""
+import pytest
+
+from .profiler import profile
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup('query_budget', 'SQL query budget')
+    group.addoption('--query-budget', type=int, default=None,
+                    help='Fail tests that execute more SQL statements than this.')
+    group.addoption('--query-n-plus-one', type=int, default=5,
+                    help='Report statements repeated more than this many times as N+1.')
+    parser.addini('query_budget', 'Default SQL statement budget per test.', default=None)
+
+
+def pytest_configure(config):
+    config.addinivalue_line(
+        'markers', 'query_budget(limit): fail the test if it executes more than limit SQL statements'
+    )
+
+
+def _budget(item):
+    marker = item.get_closest_marker('query_budget')
+    if marker is not None:
+        return marker.args[0] if marker.args else marker.kwargs['limit']
+    budget = item.config.getoption('query_budget')
+    if budget is None and item.config.getini('query_budget'):
+        budget = int(item.config.getini('query_budget'))
+    return budget
+
+
+@pytest.hookimpl(wrapper=True)
+def pytest_runtest_call(item):
+    budget = _budget(item)
+    if budget is None:
+        return (yield)
+    with profile(item.config.getoption('query_n_plus_one')) as query_profile:
+        result = yield
+    if query_profile.queries > budget:
+        pytest.fail(f'Query budget exceeded: {query_profile.queries} SQL statements, budget {budget}\n'
+                    f'{query_profile.report()}', pytrace=False)
+    return result
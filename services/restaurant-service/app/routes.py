@@ -1,6 +1,13 @@
-from flask import Blueprint, request, jsonify, make_response
+from flask import Blueprint, request, jsonify, make_response, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from .models import Restaurant, MenuItem, db
+from werkzeug.exceptions import HTTPException
+from sqlalchemy.exc import IntegrityError
+from .models import Restaurant, MenuItem, OpeningInterval, MenuSnapshot, db
+from .opening_hours import InvalidOpeningHours, minute_of_week, parse_moment
+from .streaming import stream_json_array
+from .snapshots import latest_snapshot, publish_menu_snapshot
+from .menu_import import iter_rows, import_menu, UnsupportedFormat, NDJSON_MIMETYPES, CSV_MIMETYPES
+from datetime import datetime
 import logging
 import json
 
@@ -10,17 +17,67 @@ logger = logging.getLogger(__name__)
 
 restaurant_bp = Blueprint('restaurant', __name__)
 
+def get_facets():
+    return current_app.extensions['facets']
+
+def _requested_open_minute():
+    """Minute-of-week from open_now/open_at, or None when not filtering.
+
+    Raises InvalidOpeningHours for a malformed open_at.
+    """
+    open_at = request.args.get('open_at')
+    if open_at:
+        return minute_of_week(parse_moment(open_at))
+    if request.args.get('open_now', '').lower() == 'true':
+        return minute_of_week(datetime.utcnow())
+    return None
+
 @restaurant_bp.route('/', methods=['GET'])
 def get_restaurants():
     try:
-        restaurants = Restaurant.query.all()
-        response = make_response(jsonify([r.to_dict() for r in restaurants]))
-        response.headers['Content-Type'] = 'application/json; charset=utf-8'
-        return response
+        query = Restaurant.query
+
+        # open_now / open_at are answered from the compiled opening intervals
+        try:
+            minute = _requested_open_minute()
+        except InvalidOpeningHours as e:
+            return jsonify({'error': 'Invalid open_at', 'details': str(e)}), 400
+        if minute is not None:
+            open_ids = db.session.query(OpeningInterval.restaurant_id).filter(
+                OpeningInterval.start_minute <= minute,
+                OpeningInterval.end_minute > minute
+            )
+            query = query.filter(Restaurant.id.in_(open_ids))
+
+        return stream_json_array(query.order_by(Restaurant.id))
     except Exception as e:
         logger.error("Error getting restaurants: %s", str(e))
         return jsonify({'error': 'Failed to get restaurants'}), 500
 
+@restaurant_bp.route('/facets', methods=['GET'])
+def get_facet_counts():
+    try:
+        try:
+            minute = _requested_open_minute()
+        except InvalidOpeningHours as e:
+            return jsonify({'error': 'Invalid open_at', 'details': str(e)}), 400
+
+        near = radius_km = None
+        location_args = [request.args.get(arg) for arg in ('latitude', 'longitude', 'radius_km')]
+        if any(location_args):
+            try:
+                latitude, longitude, radius_km = (float(arg) for arg in location_args)
+            except (TypeError, ValueError):
+                return jsonify({'error': 'latitude, longitude and radius_km must be given together as numbers'}), 400
+            near = (latitude, longitude)
+
+        response = make_response(jsonify(get_facets().counts(near=near, radius_km=radius_km, open_minute=minute)))
+        response.headers['Content-Type'] = 'application/json; charset=utf-8'
+        return response
+    except Exception as e:
+        logger.error("Error getting facet counts: %s", str(e))
+        return jsonify({'error': 'Failed to get facet counts'}), 500
+
 @restaurant_bp.route('/<int:id>', methods=['GET'])
 def get_restaurant(id):
     try:
@@ -36,14 +93,57 @@ def get_restaurant(id):
 def get_menu(id):
     try:
         restaurant = Restaurant.query.get_or_404(id)
-        menu_items = MenuItem.query.filter_by(restaurant_id=id).all()
-        response = make_response(jsonify([item.to_dict() for item in menu_items]))
-        response.headers['Content-Type'] = 'application/json; charset=utf-8'
-        return response
+        return stream_json_array(MenuItem.query.filter_by(restaurant_id=id).order_by(MenuItem.id))
     except Exception as e:
         logger.error("Error getting menu: %s", str(e))
         return jsonify({'error': 'Failed to get menu'}), 500
 
+def _snapshot_response(snapshot, cache_control):
+    response = make_response(snapshot.payload)
+    response.headers['Content-Type'] = 'application/json; charset=utf-8'
+    response.headers['Cache-Control'] = cache_control
+    response.headers['X-Menu-Snapshot-Digest'] = snapshot.digest
+    response.headers['X-Menu-Snapshot-Version'] = str(snapshot.version)
+    response.set_etag(snapshot.digest)
+    return response.make_conditional(request)
+
+@restaurant_bp.route('/<int:id>/menu/snapshot', methods=['GET'])
+def get_latest_menu_snapshot(id):
+    try:
+        snapshot = latest_snapshot(id)
+        if snapshot is None:
+            # Menus written before snapshots existed get one on first read
+            Restaurant.query.get_or_404(id)
+            snapshot = publish_menu_snapshot(id)
+            db.session.commit()
+        return _snapshot_response(snapshot, 'no-cache')
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Error getting menu snapshot: %s", str(e))
+        db.session.rollback()
+        return jsonify({'error': 'Failed to get menu snapshot'}), 500
+
+@restaurant_bp.route('/menu/snapshots/<string:digest>', methods=['GET'])
+def get_menu_snapshot(digest):
+    try:
+        snapshot = MenuSnapshot.query.filter_by(digest=digest).first()
+        if not snapshot:
+            return jsonify({'error': 'Menu snapshot not found'}), 404
+        # Content-addressed: the body behind a digest never changes
+        return _snapshot_response(snapshot, 'public, max-age=31536000, immutable')
+    except Exception as e:
+        logger.error("Error getting menu snapshot: %s", str(e))
+        return jsonify({'error': 'Failed to get menu snapshot'}), 500
+
+def _duplicate_menu_item_name(error):
+    """Whether ``error`` violates the (restaurant_id, name) unique constraint of menu items."""
+    constraint = getattr(getattr(error.orig, 'diag', None), 'constraint_name', None)
+    if constraint is not None:
+        return constraint == 'uq_menu_items_restaurant_id_name'
+    # SQLite names the columns instead of the constraint
+    return 'menu_items.restaurant_id, menu_items.name' in str(error.orig)
+
 @restaurant_bp.route('/<int:id>/menu', methods=['POST'])
 @jwt_required()
 def add_menu_item(id):
@@ -75,17 +175,68 @@ def add_menu_item(id):
         )
         
         db.session.add(menu_item)
+        publish_menu_snapshot(id)
         db.session.commit()
+        get_facets().add_menu_item(id, menu_item.category, menu_item.is_available)
         
         response = make_response(jsonify(menu_item.to_dict()))
         response.headers['Content-Type'] = 'application/json; charset=utf-8'
         return response, 201
         
+    except IntegrityError as e:
+        db.session.rollback()
+        if _duplicate_menu_item_name(e):
+            return jsonify({'error': 'A menu item with this name already exists'}), 409
+        # e.g. a concurrent change published the same snapshot version
+        logger.error("Error adding menu item: %s", str(e))
+        return jsonify({'error': 'Failed to add menu item'}), 500
     except Exception as e:
         logger.error("Error adding menu item: %s", str(e))
         db.session.rollback()
         return jsonify({'error': 'Failed to add menu item'}), 500
 
+@restaurant_bp.route('/<int:id>/menu/import', methods=['POST'])
+@jwt_required()
+def import_menu_items(id):
+    try:
+        # Verify restaurant exists and belongs to the caller
+        restaurant = Restaurant.query.get_or_404(id)
+        user_id = int(get_jwt_identity())
+        if restaurant.owner_id != user_id:
+            return jsonify({'error': 'Unauthorized'}), 403
+
+        try:
+            rows = iter_rows(request.stream, request.mimetype)
+        except UnsupportedFormat:
+            return jsonify({
+                'error': 'Unsupported content type',
+                'supported_types': list(NDJSON_MIMETYPES + CSV_MIMETYPES)
+            }), 415
+
+        # All chunks share one transaction: either every valid row lands or none do
+        report = import_menu(
+            id,
+            rows,
+            chunk_size=current_app.config.get('MENU_IMPORT_CHUNK_SIZE', 500),
+            max_rows=current_app.config.get('MENU_IMPORT_MAX_ROWS')
+        )
+        if report['imported']:
+            publish_menu_snapshot(id)
+        db.session.commit()
+        if report['imported']:
+            get_facets().refresh_menu(id)
+
+        response = make_response(jsonify(report))
+        response.headers['Content-Type'] = 'application/json; charset=utf-8'
+        return response
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Error importing menu: %s", str(e))
+        db.session.rollback()
+        return jsonify({'error': 'Failed to import menu'}), 500
+
 @restaurant_bp.route('', methods=['POST'])
 @jwt_required()
 def create_restaurant():
@@ -117,14 +268,18 @@ def create_restaurant():
             email=data['email'],
             owner_id=user_id,
             cuisine_type=data.get('cuisine_type'),
-            opening_hours=data.get('opening_hours'),
             latitude=data.get('latitude'),
             longitude=data.get('longitude'),
             is_active=data.get('is_active', True)
         )
+        try:
+            restaurant.set_opening_hours(data.get('opening_hours'))
+        except InvalidOpeningHours as e:
+            return jsonify({'error': 'Invalid opening hours', 'details': str(e)}), 400
         
         db.session.add(restaurant)
         db.session.commit()
+        get_facets().update_restaurant(restaurant)
         
         response = make_response(jsonify(restaurant.to_dict()))
         response.headers['Content-Type'] = 'application/json; charset=utf-8'
@@ -150,14 +305,25 @@ def update_restaurant(restaurant_id):
         if restaurant.owner_id != user_id:
             return jsonify({'error': 'Unauthorized'}), 403
         
+        # Opening hours are compiled alongside the raw value
+        if data.get('opening_hours') is not None:
+            try:
+                restaurant.set_opening_hours(data['opening_hours'])
+            except InvalidOpeningHours as e:
+                return jsonify({'error': 'Invalid opening hours', 'details': str(e)}), 400
+
         # Update fields
         for field, value in data.items():
+            if field in ('opening_hours', 'opening_intervals'):
+                continue
             if value is not None:  # Only update if value is provided
                 # Ensure we only try to set attributes that exist on the model
                 if hasattr(restaurant, field):
                     setattr(restaurant, field, value)
         
+        publish_menu_snapshot(restaurant.id)
         db.session.commit()
+        get_facets().update_restaurant(restaurant)
         
         response = make_response(jsonify(restaurant.to_dict()))
         response.headers['Content-Type'] = 'application/json; charset=utf-8'
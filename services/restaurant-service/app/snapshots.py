@@ -0,0 +1,58 @@
+"""Versioned, content-addressed menu snapshots.
+
+Every menu change publishes a new snapshot: a canonical JSON document with the
+restaurant summary and its menu items, addressed by the sha256 of its bytes.
+Snapshots are never modified, so order-service can reference one at order time
+and cache it forever.
+"""
+import hashlib
+import json
+
+from . import db
+from .models import MenuItem, MenuSnapshot, Restaurant
+
+RESTAURANT_FIELDS = ['id', 'name', 'address', 'latitude', 'longitude']
+ITEM_FIELDS = ['id', 'name', 'price', 'category', 'is_available']
+
+
+def _content(restaurant):
+    items = MenuItem.query.filter_by(restaurant_id=restaurant.id).order_by(MenuItem.id)
+    return {
+        'restaurant': {field: getattr(restaurant, field) for field in RESTAURANT_FIELDS},
+        'items': [{field: getattr(item, field) for field in ITEM_FIELDS} for item in items]
+    }
+
+
+def _encode(document):
+    return json.dumps(document, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+
+
+def latest_snapshot(restaurant_id):
+    return MenuSnapshot.query.filter_by(restaurant_id=restaurant_id).order_by(MenuSnapshot.version.desc()).first()
+
+
+def publish_menu_snapshot(restaurant_id):
+    """Publish a snapshot if the menu differs from the latest one.
+
+    Runs inside the caller's transaction so the snapshot commits together
+    with the menu change. Returns the current snapshot.
+    """
+    restaurant = db.session.get(Restaurant, restaurant_id)
+    db.session.flush()
+    content = _content(restaurant)
+    latest = latest_snapshot(restaurant_id)
+    if latest is not None:
+        previous = json.loads(latest.payload)
+        if previous['restaurant'] == content['restaurant'] and previous['items'] == content['items']:
+            return latest
+
+    version = latest.version + 1 if latest is not None else 1
+    payload = _encode(dict(content, version=version))
+    snapshot = MenuSnapshot(
+        restaurant_id=restaurant_id,
+        version=version,
+        digest=hashlib.sha256(payload.encode('utf-8')).hexdigest(),
+        payload=payload
+    )
+    db.session.add(snapshot)
+    return snapshot
@@ -0,0 +1,76 @@
+"""Streaming JSON array and NDJSON responses for list and export endpoints.
+
+Rows are pulled from the database with ``yield_per`` (a server-side cursor on
+PostgreSQL) and encoded one batch at a time, so memory stays bounded by the
+batch size and the first bytes go out before the last row has been read.
+"""
+from itertools import chain
+
+from flask import Response, current_app, stream_with_context
+
+_EMPTY = object()
+
+
+def _to_dict(obj):
+    return obj.to_dict()
+
+
+def stream_json_array(query, serialize=_to_dict, batch_size=None):
+    """Return a ``Response`` that streams ``query`` as a JSON array."""
+    if batch_size is None:
+        batch_size = current_app.config.get('STREAM_YIELD_PER', 500)
+    dumps = current_app.json.dumps
+
+    # Iterating a Query is lazy, so pull the first row here: that executes the
+    # statement before the response starts, and database errors still surface
+    # as a normal error response instead of a truncated 200 body.
+    rows = iter(query.yield_per(batch_size))
+    first = next(rows, _EMPTY)
+    if first is not _EMPTY:
+        rows = chain((first,), rows)
+
+    def generate():
+        yield '['
+        separator = ''
+        batch = []
+        for obj in rows:
+            batch.append(dumps(serialize(obj), separators=(',', ':')))
+            if len(batch) >= batch_size:
+                yield separator + ','.join(batch)
+                separator = ','
+                batch = []
+        if batch:
+            yield separator + ','.join(batch)
+        yield ']'
+
+    return Response(
+        stream_with_context(generate()),
+        content_type='application/json; charset=utf-8'
+    )
+
+
+def stream_ndjson(query, serialize=_to_dict, batch_size=None):
+    """Return a ``Response`` that streams ``query`` as newline-delimited JSON."""
+    if batch_size is None:
+        batch_size = current_app.config.get('STREAM_YIELD_PER', 500)
+    dumps = current_app.json.dumps
+
+    rows = iter(query.yield_per(batch_size))
+    first = next(rows, _EMPTY)
+    if first is not _EMPTY:
+        rows = chain((first,), rows)
+
+    def generate():
+        batch = []
+        for obj in rows:
+            batch.append(dumps(serialize(obj), separators=(',', ':')) + '\n')
+            if len(batch) >= batch_size:
+                yield ''.join(batch)
+                batch = []
+        if batch:
+            yield ''.join(batch)
+
+    return Response(
+        stream_with_context(generate()),
+        content_type='application/x-ndjson; charset=utf-8'
+    )
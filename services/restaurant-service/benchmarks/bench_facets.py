@@ -0,0 +1,88 @@
+"""Facet counts from the in-memory index vs GROUP BY on every request.
+
+Usage:
+    python benchmarks/bench_facets.py --restaurants 20000 --items-per-restaurant 20
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import func
+
+from app import create_app, db
+from app.facets import FacetIndex
+from app.models import MenuItem, Restaurant
+
+CUISINES = ['Ghanaian', 'Nigerian', 'Italian', 'Chinese', 'Indian', 'Lebanese', 'American', 'Thai', 'Japanese', 'French']
+CATEGORIES = ['Starter', 'Main', 'Soup', 'Grill', 'Rice', 'Dessert', 'Drinks', 'Sides', 'Pizza', 'Salad', 'Pasta', 'Vegan']
+
+
+def seed(restaurants, items_per_restaurant, rng):
+    now = datetime.utcnow()
+    db.session.execute(Restaurant.__table__.insert(), [
+        {
+            'id': i, 'name': f'R{i}', 'address': 'x', 'phone_number': '0', 'email': f'r{i}@example.com',
+            'owner_id': 1, 'cuisine_type': rng.choice(CUISINES), 'is_active': rng.random() > 0.05,
+            'latitude': 5.6 + rng.gauss(0, 0.2), 'longitude': -0.19 + rng.gauss(0, 0.2),
+            'created_at': now, 'updated_at': now
+        }
+        for i in range(1, restaurants + 1)
+    ])
+    db.session.execute(MenuItem.__table__.insert(), [
+        {
+            'restaurant_id': i, 'name': f'Item {j}', 'price': 10.0, 'category': rng.choice(CATEGORIES),
+            'is_available': rng.random() > 0.1, 'created_at': now, 'updated_at': now
+        }
+        for i in range(1, restaurants + 1) for j in range(items_per_restaurant)
+    ])
+    db.session.commit()
+
+
+def group_by_counts():
+    cuisines = dict(db.session.query(Restaurant.cuisine_type, func.count(Restaurant.id))
+                    .filter(Restaurant.is_active.is_(True)).group_by(Restaurant.cuisine_type))
+    categories = dict(db.session.query(MenuItem.category, func.count(func.distinct(MenuItem.restaurant_id)))
+                      .join(Restaurant, Restaurant.id == MenuItem.restaurant_id)
+                      .filter(Restaurant.is_active.is_(True), MenuItem.is_available.is_(True))
+                      .group_by(MenuItem.category))
+    return cuisines, categories
+
+
+def timed(label, fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    elapsed = (time.perf_counter() - start) / repeat
+    print(f'{label:<34} {elapsed * 1000:10.3f}ms')
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--restaurants', type=int, default=20000)
+    parser.add_argument('--items-per-restaurant', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    app = create_app('test')
+    with app.app_context():
+        seed(args.restaurants, args.items_per_restaurant, random.Random(args.seed))
+        print(f'{args.restaurants} restaurants, {args.restaurants * args.items_per_restaurant} menu items')
+
+        index = FacetIndex(refresh_seconds=3600)
+        timed('index rebuild (startup)', index.rebuild, 1)
+        cuisines, categories = timed('GROUP BY per request', group_by_counts, 5)
+        counts = timed('index, unfiltered', index.counts, 1000)
+        timed('index, 5km radius', lambda: index.counts(near=(5.6, -0.19), radius_km=5), 5)
+        timed('index, 5km radius + open_at', lambda: index.counts(near=(5.6, -0.19), radius_km=5, open_minute=600), 5)
+
+        assert counts['cuisine_type'] == cuisines and counts['category'] == categories
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""Throughput of the bulk menu import against one POST per item.
+
+Usage:
+    python benchmarks/bench_menu_import.py --items 10000
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from flask_jwt_extended import create_access_token
+
+from app import create_app, db
+from app.models import Restaurant, MenuItem
+
+
+def make_rows(count):
+    return [
+        {
+            'name': f'Item {i}',
+            'description': f'Description for item {i}',
+            'price': round(5 + (i % 400) * 0.05, 2),
+            'category': f'Category {i % 12}',
+            'is_available': i % 7 != 0
+        }
+        for i in range(count)
+    ]
+
+
+def as_ndjson(rows):
+    return '\n'.join(json.dumps(row) for row in rows)
+
+
+def as_csv(rows):
+    lines = ['name,description,price,category,is_available']
+    lines.extend(f"{r['name']},{r['description']},{r['price']},{r['category']},{str(r['is_available']).lower()}" for r in rows)
+    return '\n'.join(lines)
+
+
+def reset_menu(restaurant_id):
+    MenuItem.query.filter_by(restaurant_id=restaurant_id).delete()
+    db.session.commit()
+
+
+def report(label, count, elapsed):
+    print(f'{label:<28} {count:>7} rows  {elapsed:8.3f}s  {count / elapsed:>10.0f} rows/s')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--items', type=int, default=10000)
+    parser.add_argument('--single-items', type=int, default=1000,
+                        help='rows to time through the one-request-per-item path')
+    args = parser.parse_args()
+
+    app = create_app('test')
+    with app.app_context():
+        restaurant = Restaurant(name='Bench', address='1 Bench St', phone_number='0', email='bench@example.com', owner_id=1)
+        db.session.add(restaurant)
+        db.session.commit()
+        headers = {'Authorization': f'Bearer {create_access_token(identity="1")}'}
+        client = app.test_client()
+        rows = make_rows(args.items)
+        url = f'/api/restaurants/{restaurant.id}/menu'
+
+        start = time.perf_counter()
+        for row in rows[:args.single_items]:
+            client.post(url, json=row, headers=headers)
+        report('POST /menu per item', args.single_items, time.perf_counter() - start)
+        reset_menu(restaurant.id)
+
+        for label, body, content_type in (
+            ('import ndjson (insert)', as_ndjson(rows), 'application/x-ndjson'),
+            ('import ndjson (update)', as_ndjson(rows), 'application/x-ndjson'),
+            ('import csv (update)', as_csv(rows), 'text/csv'),
+        ):
+            start = time.perf_counter()
+            response = client.post(f'{url}/import', data=body, content_type=content_type, headers=headers)
+            elapsed = time.perf_counter() - start
+            assert response.status_code == 200 and response.json['failed'] == 0, response.json
+            report(label, args.items, elapsed)
+
+
+if __name__ == '__main__':
+    main()
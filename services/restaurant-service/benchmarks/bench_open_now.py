@@ -0,0 +1,96 @@
+"""Cost of answering "which restaurants are open at T?".
+
+Compares the indexed interval lookup used by GET /api/restaurants?open_at=
+with the client-side approach of loading every opening_hours string and
+parsing it per row.
+
+Usage:
+    python benchmarks/bench_open_now.py --restaurants 100000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import create_app, db
+from app.models import Restaurant, OpeningInterval
+from app.opening_hours import DAYS, MINUTES_PER_WEEK, is_open, parse_opening_hours
+
+
+def random_hours(rng):
+    hours = {}
+    for day in DAYS:
+        if rng.random() < 0.1:
+            hours[day] = 'closed'
+            continue
+        opens = rng.choice([6, 7, 8, 9, 10, 11, 17])
+        closes = (opens + rng.choice([4, 8, 10, 12, 14, 16])) % 24
+        hours[day] = f'{opens:02d}:00-{closes:02d}:30'
+    return json.dumps(hours)
+
+
+def seed(count, rng):
+    now = datetime.utcnow()
+    restaurants = []
+    intervals = []
+    for i in range(1, count + 1):
+        hours = random_hours(rng)
+        restaurants.append({
+            'id': i, 'name': f'R{i}', 'address': 'x', 'phone_number': '0', 'email': f'r{i}@example.com',
+            'owner_id': 1, 'opening_hours': hours, 'is_active': True, 'created_at': now, 'updated_at': now
+        })
+        intervals.extend(
+            {'restaurant_id': i, 'start_minute': start, 'end_minute': end}
+            for start, end in parse_opening_hours(hours)
+        )
+    db.session.execute(Restaurant.__table__.insert(), restaurants)
+    db.session.execute(OpeningInterval.__table__.insert(), intervals)
+    db.session.commit()
+    return len(intervals)
+
+
+def indexed(minute):
+    return [row[0] for row in db.session.query(OpeningInterval.restaurant_id).filter(
+        OpeningInterval.start_minute <= minute,
+        OpeningInterval.end_minute > minute
+    )]
+
+
+def parse_per_row(minute):
+    return [
+        restaurant_id for restaurant_id, hours in db.session.query(Restaurant.id, Restaurant.opening_hours)
+        if is_open(parse_opening_hours(hours), minute)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--restaurants', type=int, default=100000)
+    parser.add_argument('--probes', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    app = create_app('test')
+    with app.app_context():
+        start = time.perf_counter()
+        interval_count = seed(args.restaurants, rng)
+        print(f'seeded {args.restaurants} restaurants / {interval_count} intervals in {time.perf_counter() - start:.1f}s')
+
+        minutes = [rng.randrange(MINUTES_PER_WEEK) for _ in range(args.probes)]
+        for label, lookup, probes in (('indexed intervals', indexed, minutes), ('parse per row', parse_per_row, minutes[:3])):
+            start = time.perf_counter()
+            matches = [len(lookup(minute)) for minute in probes]
+            elapsed = (time.perf_counter() - start) / len(probes)
+            print(f'{label:<18} {elapsed * 1000:9.1f}ms per query  (avg {sum(matches) / len(matches):.0f} open)')
+
+        assert sorted(indexed(minutes[0])) == sorted(parse_per_row(minutes[0]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""Peak memory and time-to-first-byte of list endpoints: jsonify vs streaming.
+
+Usage:
+    python benchmarks/bench_streaming.py --rows 10000 100000
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from flask import jsonify, make_response
+from werkzeug.test import EnvironBuilder
+
+from app import create_app, db
+from app.models import Restaurant
+
+
+def seed(count):
+    now = datetime.utcnow()
+    rows = [
+        {
+            'name': f'Restaurant {i}',
+            'description': 'Benchmark restaurant with a reasonably long description ' * 2,
+            'address': f'{i} Bench Street',
+            'phone_number': '0200000000',
+            'email': f'r{i}@example.com',
+            'owner_id': i % 500,
+            'cuisine_type': 'Ghanaian',
+            'opening_hours': '{"monday": "09:00-22:00"}',
+            'latitude': 5.6,
+            'longitude': -0.18,
+            'is_active': True,
+            'created_at': now,
+            'updated_at': now
+        }
+        for i in range(count)
+    ]
+    Restaurant.query.delete()
+    db.session.execute(Restaurant.__table__.insert(), rows)
+    db.session.commit()
+
+
+def measure(app, path):
+    environ = EnvironBuilder(path=path, method='GET').get_environ()
+    tracemalloc.start()
+    start = time.perf_counter()
+    app_iter = app.wsgi_app(environ, lambda status, headers: None)
+    ttfb = None
+    size = 0
+    for chunk in app_iter:
+        if ttfb is None and chunk:
+            ttfb = time.perf_counter() - start
+        size += len(chunk)
+    total = time.perf_counter() - start
+    if hasattr(app_iter, 'close'):
+        app_iter.close()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return ttfb, total, peak, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000])
+    args = parser.parse_args()
+
+    app = create_app('test')
+
+    # The pre-streaming implementation of GET /api/restaurants, kept for comparison
+    @app.route('/bench/jsonify')
+    def jsonify_restaurants():
+        restaurants = Restaurant.query.all()
+        response = make_response(jsonify([r.to_dict() for r in restaurants]))
+        response.headers['Content-Type'] = 'application/json; charset=utf-8'
+        return response
+
+    print(f"{'rows':>7} {'endpoint':<10} {'ttfb':>9} {'total':>9} {'peak mem':>10} {'body':>10}")
+    with app.app_context():
+        for count in args.rows:
+            seed(count)
+            for label, path in (('jsonify', '/bench/jsonify'), ('stream', '/api/restaurants/')):
+                db.session.remove()
+                ttfb, total, peak, size = measure(app, path)
+                print(f'{count:>7} {label:<10} {ttfb * 1000:>7.1f}ms {total * 1000:>7.0f}ms '
+                      f'{peak / 2**20:>8.1f}MB {size / 2**20:>8.1f}MB')
+
+
+if __name__ == '__main__':
+    main()
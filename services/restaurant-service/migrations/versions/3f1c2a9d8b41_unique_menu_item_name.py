@@ -0,0 +1,36 @@
+"""unique menu item name per restaurant
+
+Revision ID: 3f1c2a9d8b41
+Revises: 
+Create Date: 2026-10-18 09:12:44.120311
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c2a9d8b41'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing menus may already repeat a name; keep the newest item of each
+    # (restaurant_id, name) and rename the older ones so the constraint can be
+    # created without losing rows that orders may still reference.
+    op.execute("""
+        UPDATE menu_items
+        SET name = SUBSTR(name, 1, 80) || ' (duplicate ' || CAST(id AS VARCHAR(12)) || ')'
+        WHERE id NOT IN (
+            SELECT MAX(id) FROM menu_items GROUP BY restaurant_id, name
+        )
+    """)
+    # Bulk menu import upserts on (restaurant_id, name)
+    with op.batch_alter_table('menu_items', schema=None) as batch_op:
+        batch_op.create_unique_constraint('uq_menu_items_restaurant_id_name', ['restaurant_id', 'name'])
+
+
+def downgrade():
+    with op.batch_alter_table('menu_items', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_menu_items_restaurant_id_name', type_='unique')
@@ -0,0 +1,71 @@
+"""opening intervals and wider opening hours
+
+Revision ID: 8d4e6b2f7a13
+Revises: 3f1c2a9d8b41
+Create Date: 2026-10-19 10:04:31.552870
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from app.opening_hours import InvalidOpeningHours, parse_opening_hours
+
+
+# revision identifiers, used by Alembic.
+revision = '8d4e6b2f7a13'
+down_revision = '3f1c2a9d8b41'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Multi-range documents do not fit in 200 characters
+    with op.batch_alter_table('restaurants', schema=None) as batch_op:
+        batch_op.alter_column('opening_hours',
+                              existing_type=sa.String(length=200),
+                              type_=sa.Text(),
+                              existing_nullable=True)
+
+    intervals = op.create_table('opening_intervals',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('restaurant_id', sa.Integer(), nullable=False),
+        sa.Column('start_minute', sa.Integer(), nullable=False),
+        sa.Column('end_minute', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['restaurant_id'], ['restaurants.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('opening_intervals', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_opening_intervals_restaurant_id'), ['restaurant_id'], unique=False)
+        batch_op.create_index('ix_opening_intervals_start_end', ['start_minute', 'end_minute', 'restaurant_id'], unique=False)
+
+    # Compile the hours already stored so open_now keeps matching existing
+    # restaurants; documents that never parsed stay without intervals.
+    rows = op.get_bind().execute(sa.text(
+        'SELECT id, opening_hours FROM restaurants WHERE opening_hours IS NOT NULL'
+    ))
+    compiled = []
+    for restaurant_id, opening_hours in rows:
+        try:
+            ranges = parse_opening_hours(opening_hours)
+        except InvalidOpeningHours:
+            continue
+        compiled.extend(
+            {'restaurant_id': restaurant_id, 'start_minute': start, 'end_minute': end}
+            for start, end in ranges
+        )
+    if compiled:
+        op.bulk_insert(intervals, compiled)
+
+
+def downgrade():
+    with op.batch_alter_table('opening_intervals', schema=None) as batch_op:
+        batch_op.drop_index('ix_opening_intervals_start_end')
+        batch_op.drop_index(batch_op.f('ix_opening_intervals_restaurant_id'))
+
+    op.drop_table('opening_intervals')
+
+    with op.batch_alter_table('restaurants', schema=None) as batch_op:
+        batch_op.alter_column('opening_hours',
+                              existing_type=sa.Text(),
+                              type_=sa.String(length=200),
+                              existing_nullable=True)
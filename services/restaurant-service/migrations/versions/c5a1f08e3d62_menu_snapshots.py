@@ -0,0 +1,35 @@
+"""menu snapshots
+
+Revision ID: c5a1f08e3d62
+Revises: 8d4e6b2f7a13
+Create Date: 2026-10-19 10:31:07.218564
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5a1f08e3d62'
+down_revision = '8d4e6b2f7a13'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('menu_snapshots',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('restaurant_id', sa.Integer(), nullable=False),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.Column('digest', sa.String(length=64), nullable=False),
+        sa.Column('payload', sa.Text(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['restaurant_id'], ['restaurants.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('digest'),
+        sa.UniqueConstraint('restaurant_id', 'version', name='uq_menu_snapshots_restaurant_id_version')
+    )
+
+
+def downgrade():
+    op.drop_table('menu_snapshots')
@@ -9,6 +9,8 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')
 from app import create_app, db
 from app.models import Restaurant, MenuItem
 
+pytest_plugins = ['app.query_budget']
+
 @pytest.fixture
 def app():
     app = create_app('test')  # Pass 'test' to indicate test mode
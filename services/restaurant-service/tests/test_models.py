@@ -1,4 +1,4 @@
-from app.models import Restaurant, MenuItem
+from app.models import Restaurant, MenuItem, OpeningInterval
 from datetime import datetime
 from app import db
 
@@ -80,4 +80,39 @@ def test_menu_item_to_dict(app, sample_restaurant):
         assert menu_item_dict['price'] == 9.99
         assert menu_item_dict['restaurant_id'] == sample_restaurant.id
         assert 'created_at' in menu_item_dict
-        assert 'updated_at' in menu_item_dict 
\ No newline at end of file
+        assert 'updated_at' in menu_item_dict
+
+
+def test_parse_opening_hours():
+    from app.opening_hours import parse_opening_hours, MINUTES_PER_DAY, MINUTES_PER_WEEK
+
+    ranges = parse_opening_hours(
+        '{"monday": "09:00-17:00", "Fri": ["11:00-15:00", "18:00-02:00"], "sunday": "22:00-01:00", "tuesday": "closed"}'
+    )
+
+    assert ranges == [
+        (0, 60),  # Sunday night spilling into Monday
+        (9 * 60, 17 * 60),
+        (4 * MINUTES_PER_DAY + 11 * 60, 4 * MINUTES_PER_DAY + 15 * 60),
+        (4 * MINUTES_PER_DAY + 18 * 60, 5 * MINUTES_PER_DAY + 2 * 60),
+        (6 * MINUTES_PER_DAY + 22 * 60, MINUTES_PER_WEEK),
+    ]
+
+def test_parse_opening_hours_invalid():
+    import pytest
+    from app.opening_hours import parse_opening_hours, InvalidOpeningHours
+
+    for value in ('not json', '["monday"]', '{"someday": "09:00-17:00"}', '{"monday": "9am-5pm"}', '{"monday": "09:00-25:00"}'):
+        with pytest.raises(InvalidOpeningHours):
+            parse_opening_hours(value)
+
+def test_set_opening_hours_replaces_intervals(app, sample_restaurant):
+    sample_restaurant.set_opening_hours({'monday': '09:00-17:00', 'tuesday': '09:00-17:00'})
+    db.session.commit()
+    assert len(sample_restaurant.opening_intervals) == 2
+
+    sample_restaurant.set_opening_hours({'monday': '10:00-12:00'})
+    db.session.commit()
+    assert [(i.start_minute, i.end_minute) for i in sample_restaurant.opening_intervals] == [(600, 720)]
+    assert sample_restaurant.opening_hours == '{"monday": "10:00-12:00"}'
+    assert OpeningInterval.query.count() == 1
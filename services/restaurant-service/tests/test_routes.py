@@ -1,5 +1,6 @@
+import pytest
 import json
-from app.models import Restaurant, MenuItem
+from app.models import Restaurant, MenuItem, MenuSnapshot
 from app import db
 from flask_jwt_extended import create_access_token
 
@@ -84,6 +85,32 @@ def test_create_menu_item(client, sample_restaurant, auth_headers):
     assert response.json['name'] == 'New Menu Item'
     assert response.json['price'] == 12.99
 
+def test_create_menu_item_duplicate_name(client, sample_restaurant, sample_menu_item, auth_headers):
+    response = client.post(
+        f'/api/restaurants/{sample_restaurant.id}/menu',
+        data=json.dumps({'name': 'Test Item', 'price': 5.0, 'category': 'Main Course'}),
+        content_type='application/json',
+        headers=auth_headers
+    )
+    assert response.status_code == 409
+
+def test_create_menu_item_snapshot_conflict_is_not_a_duplicate_name(client, sample_restaurant, auth_headers,
+                                                                     monkeypatch):
+    # Two concurrent adds both publishing the next snapshot version
+    def publish_conflicting_snapshots(restaurant_id):
+        for digest in ('a' * 64, 'b' * 64):
+            db.session.add(MenuSnapshot(restaurant_id=restaurant_id, version=1, digest=digest, payload='{}'))
+
+    monkeypatch.setattr('app.routes.publish_menu_snapshot', publish_conflicting_snapshots)
+    response = client.post(
+        f'/api/restaurants/{sample_restaurant.id}/menu',
+        data=json.dumps({'name': 'New Menu Item', 'price': 5.0, 'category': 'Main Course'}),
+        content_type='application/json',
+        headers=auth_headers
+    )
+    assert response.status_code == 500
+    assert MenuItem.query.filter_by(name='New Menu Item').count() == 0
+
 def test_get_menu_items(client, sample_restaurant, sample_menu_item):
     response = client.get(f'/api/restaurants/{sample_restaurant.id}/menu')
     assert response.status_code == 200
@@ -125,4 +152,268 @@ def test_unauthorized_restaurant_update(client, sample_restaurant, auth_headers)
     
     if response.status_code != 403:
         print(f"Unauthorized update error response: {response.get_data(as_text=True)}")
-    assert response.status_code == 403 
\ No newline at end of file
+    assert response.status_code == 403
+
+
+def test_import_menu_ndjson(client, sample_restaurant, sample_menu_item, auth_headers):
+    lines = [
+        json.dumps({'name': 'Test Item', 'price': 11.5, 'category': 'Main Course'}),
+        json.dumps({'name': 'Soup', 'price': '4.25', 'category': 'Starter', 'is_available': False}),
+        json.dumps({'name': 'No Price', 'category': 'Starter'}),
+        'not json'
+    ]
+
+    response = client.post(
+        f'/api/restaurants/{sample_restaurant.id}/menu/import',
+        data='\n'.join(lines),
+        content_type='application/x-ndjson',
+        headers=auth_headers
+    )
+
+    assert response.status_code == 200
+    assert response.json['processed'] == 4
+    assert response.json['imported'] == 2
+    assert response.json['failed'] == 2
+    assert [error['row'] for error in response.json['errors']] == [3, 4]
+    assert response.json['errors'][0]['errors']['missing_fields'] == ['price']
+
+    items = {item.name: item for item in MenuItem.query.filter_by(restaurant_id=sample_restaurant.id)}
+    assert len(items) == 2
+    assert items['Test Item'].price == 11.5  # existing item updated in place
+    assert items['Soup'].is_available is False
+
+def test_import_menu_csv(client, sample_restaurant, auth_headers):
+    body = 'name,price,category,description\nPizza,12.00,Main,Cheese\nPasta,abc,Main,\n'
+
+    response = client.post(
+        f'/api/restaurants/{sample_restaurant.id}/menu/import',
+        data=body,
+        content_type='text/csv',
+        headers=auth_headers
+    )
+
+    assert response.status_code == 200
+    assert response.json['imported'] == 1
+    assert response.json['errors'] == [{'row': 3, 'errors': {'price': 'Must be a number'}}]
+    assert MenuItem.query.filter_by(name='Pizza').one().description == 'Cheese'
+
+def test_import_menu_csv_rows_numbered_by_first_line(client, sample_restaurant, auth_headers):
+    body = 'name,price,category,description\nPizza,12.00,Main,"Cheese\nand tomato"\nPasta,abc,Main,\n'
+
+    response = client.post(
+        f'/api/restaurants/{sample_restaurant.id}/menu/import',
+        data=body,
+        content_type='text/csv',
+        headers=auth_headers
+    )
+
+    assert response.json['errors'] == [{'row': 4, 'errors': {'price': 'Must be a number'}}]
+    assert MenuItem.query.filter_by(name='Pizza').one().description == 'Cheese\nand tomato'
+
+def test_import_menu_without_on_conflict(client, sample_restaurant, sample_menu_item, auth_headers, monkeypatch):
+    # Dialects without INSERT ... ON CONFLICT upsert row by row
+    monkeypatch.setattr('app.menu_import._insert', lambda: None)
+    lines = [
+        json.dumps({'name': 'Test Item', 'price': 11.5, 'category': 'Main Course'}),
+        json.dumps({'name': 'Soup', 'price': 4.25, 'category': 'Starter'})
+    ]
+
+    response = client.post(
+        f'/api/restaurants/{sample_restaurant.id}/menu/import',
+        data='\n'.join(lines),
+        content_type='application/x-ndjson',
+        headers=auth_headers
+    )
+
+    assert response.json['imported'] == 2
+    items = {item.name: item for item in MenuItem.query.filter_by(restaurant_id=sample_restaurant.id)}
+    assert (items['Test Item'].id, items['Test Item'].price) == (sample_menu_item.id, 11.5)
+    assert items['Soup'].price == 4.25
+
+def test_import_menu_unsupported_type(client, sample_restaurant, auth_headers):
+    response = client.post(
+        f'/api/restaurants/{sample_restaurant.id}/menu/import',
+        data='{}',
+        content_type='application/json',
+        headers=auth_headers
+    )
+
+    assert response.status_code == 415
+
+def test_get_menu_streams_multiple_batches(app, client, sample_restaurant):
+    app.config['STREAM_YIELD_PER'] = 2
+    for i in range(5):
+        db.session.add(MenuItem(restaurant_id=sample_restaurant.id, name=f'Item {i}', price=i, category='Main'))
+    db.session.commit()
+
+    response = client.get(f'/api/restaurants/{sample_restaurant.id}/menu')
+
+    assert response.status_code == 200
+    assert response.is_streamed
+    assert response.headers['Content-Type'] == 'application/json; charset=utf-8'
+    assert [item['name'] for item in response.json] == [f'Item {i}' for i in range(5)]
+
+def test_stream_json_array_raises_before_response(app):
+    from sqlalchemy.exc import OperationalError
+    from app.streaming import stream_json_array
+
+    broken = MenuItem.query.filter(db.text('no_such_column = 1'))
+    with app.test_request_context():
+        with pytest.raises(OperationalError):
+            stream_json_array(broken)
+    db.session.rollback()
+
+def test_get_restaurants_open_at(client, auth_headers):
+    for name, hours in (('Breakfast', '{"monday": "06:00-11:00"}'), ('Late Night', '{"sunday": "20:00-03:00"}')):
+        response = client.post('/api/restaurants', json={
+            'name': name,
+            'address': '1 Test St',
+            'phone_number': '1234567890',
+            'email': f'{name.lower().replace(" ", "")}@restaurant.com',
+            'opening_hours': hours
+        }, headers=auth_headers)
+        assert response.status_code == 201
+
+    # 2026-10-19 is a Monday
+    response = client.get('/api/restaurants/?open_at=2026-10-19T07:30:00')
+    assert [r['name'] for r in response.json] == ['Breakfast']
+
+    response = client.get('/api/restaurants/?open_at=2026-10-19T02:15:00')
+    assert [r['name'] for r in response.json] == ['Late Night']
+
+    response = client.get('/api/restaurants/?open_at=2026-10-19T12:00:00%2B00:00')
+    assert response.json == []
+
+    response = client.get('/api/restaurants/?open_at=tomorrow')
+    assert response.status_code == 400
+
+def test_create_restaurant_invalid_opening_hours(client, auth_headers):
+    response = client.post('/api/restaurants', json={
+        'name': 'Bad Hours',
+        'address': '1 Test St',
+        'phone_number': '1234567890',
+        'email': 'bad@restaurant.com',
+        'opening_hours': '{"monday": "all day"}'
+    }, headers=auth_headers)
+
+    assert response.status_code == 400
+    assert response.json['error'] == 'Invalid opening hours'
+
+def test_create_restaurant_long_opening_hours(client, auth_headers):
+    hours = {day: ['07:00-10:30', '12:00-15:00', '18:00-23:30']
+             for day in ('monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday')}
+    response = client.post('/api/restaurants', json={
+        'name': 'Split Shifts',
+        'address': '1 Test St',
+        'phone_number': '1234567890',
+        'email': 'split@restaurant.com',
+        'opening_hours': hours
+    }, headers=auth_headers)
+
+    assert response.status_code == 201
+    assert len(response.json['opening_hours']) > 200
+    assert json.loads(response.json['opening_hours']) == hours
+    assert getattr(Restaurant.__table__.c.opening_hours.type, 'length', None) is None
+
+def test_menu_snapshot_versions(client, sample_restaurant, auth_headers):
+    response = client.get(f'/api/restaurants/{sample_restaurant.id}/menu/snapshot')
+    assert response.status_code == 200
+    assert response.headers['X-Menu-Snapshot-Version'] == '1'
+    assert response.json['items'] == []
+
+    client.post(f'/api/restaurants/{sample_restaurant.id}/menu', json={
+        'name': 'Jollof', 'price': 30.0, 'category': 'Main'
+    }, headers=auth_headers)
+    response = client.get(f'/api/restaurants/{sample_restaurant.id}/menu/snapshot')
+    digest = response.headers['X-Menu-Snapshot-Digest']
+    assert response.headers['X-Menu-Snapshot-Version'] == '2'
+    assert response.json['version'] == 2
+    assert response.json['restaurant']['name'] == 'Test Restaurant'
+    assert [(item['name'], item['price']) for item in response.json['items']] == [('Jollof', 30.0)]
+
+    # Updates that do not change the menu reuse the latest snapshot
+    client.put(f'/api/restaurants/{sample_restaurant.id}', json={'phone_number': '000'}, headers=auth_headers)
+    assert MenuSnapshot.query.count() == 2
+
+    response = client.get(f'/api/restaurants/menu/snapshots/{digest}')
+    assert response.status_code == 200
+    assert 'immutable' in response.headers['Cache-Control']
+    assert response.json['version'] == 2
+
+    response = client.get(f'/api/restaurants/menu/snapshots/{digest}', headers={'If-None-Match': f'"{digest}"'})
+    assert response.status_code == 304
+
+def test_menu_snapshot_not_found(client):
+    assert client.get('/api/restaurants/menu/snapshots/deadbeef').status_code == 404
+
+def test_facet_counts_follow_writes(client, auth_headers):
+    restaurants = [
+        ('Accra Grill', 'Ghanaian', 5.6037, -0.1870, '{"monday": "09:00-17:00"}'),
+        ('Osu Pizza', 'Italian', 5.5560, -0.1769, '{"monday": "18:00-23:00"}'),
+        ('Kumasi Chop Bar', 'Ghanaian', 6.6885, -1.6244, '{"monday": "09:00-17:00"}'),
+    ]
+    ids = []
+    for name, cuisine, latitude, longitude, hours in restaurants:
+        response = client.post('/api/restaurants', json={
+            'name': name, 'address': '1 Test St', 'phone_number': '1234567890',
+            'email': f'{name.lower().replace(" ", "")}@restaurant.com', 'cuisine_type': cuisine,
+            'latitude': latitude, 'longitude': longitude, 'opening_hours': hours
+        }, headers=auth_headers)
+        ids.append(response.json['id'])
+    for restaurant_id, category in ((ids[0], 'Soup'), (ids[1], 'Pizza'), (ids[1], 'Pizza'), (ids[2], 'Soup')):
+        client.post(f'/api/restaurants/{restaurant_id}/menu', json={
+            'name': f'{category} {restaurant_id}-{ids.index(restaurant_id)}-{category}', 'price': 10, 'category': category
+        }, headers=auth_headers)
+    client.post(f'/api/restaurants/{ids[1]}/menu', json={'name': 'Garlic Bread', 'price': 5, 'category': 'Pizza'}, headers=auth_headers)
+
+    response = client.get('/api/restaurants/facets')
+    assert response.status_code == 200
+    assert response.json['restaurants'] == 3
+    assert response.json['cuisine_type'] == {'Ghanaian': 2, 'Italian': 1}
+    assert response.json['category'] == {'Soup': 2, 'Pizza': 1}
+
+    client.put(f'/api/restaurants/{ids[2]}', json={'is_active': False}, headers=auth_headers)
+    response = client.get('/api/restaurants/facets')
+    assert response.json['cuisine_type'] == {'Ghanaian': 1, 'Italian': 1}
+    assert response.json['category'] == {'Soup': 1, 'Pizza': 1}
+
+    # Within 20km of central Accra, open on a Monday evening
+    response = client.get('/api/restaurants/facets?latitude=5.6037&longitude=-0.1870&radius_km=20'
+                          '&open_at=2026-10-19T19:00:00')
+    assert response.json['restaurants'] == 1
+    assert response.json['cuisine_type'] == {'Italian': 1}
+
+    assert client.get('/api/restaurants/facets?latitude=5.6').status_code == 400
+
+def test_facet_index_rebuild_matches_incremental(app, client, auth_headers):
+    for i, cuisine in enumerate(['Thai', 'Thai', 'Indian']):
+        response = client.post('/api/restaurants', json={
+            'name': f'R{i}', 'address': '1 Test St', 'phone_number': '1', 'email': f'r{i}@restaurant.com',
+            'cuisine_type': cuisine
+        }, headers=auth_headers)
+        client.post(f"/api/restaurants/{response.json['id']}/menu", json={'name': 'Curry', 'price': 9, 'category': 'Curry'}, headers=auth_headers)
+    incremental = client.get('/api/restaurants/facets').json
+
+    app.extensions['facets'].rebuild()
+    rebuilt = client.get('/api/restaurants/facets').json
+
+    assert incremental['cuisine_type'] == rebuilt['cuisine_type'] == {'Thai': 2, 'Indian': 1}
+    assert incremental['category'] == rebuilt['category'] == {'Curry': 3}
+
+def test_stale_facet_index_rebuilt_by_one_caller(app, client, monkeypatch):
+    index = app.extensions['facets']
+    rebuilds = []
+    monkeypatch.setattr(index, 'rebuild', lambda: rebuilds.append(1))
+    monkeypatch.setattr(index, 'refresh_seconds', -1)
+
+    # Another request holds the rebuild: serve the current counts without waiting
+    index._rebuild_lock.acquire()
+    try:
+        response = client.get('/api/restaurants/facets')
+    finally:
+        index._rebuild_lock.release()
+    assert response.status_code == 200
+    assert rebuilds == []
+
+    client.get('/api/restaurants/facets')
+    assert rebuilds == [1]
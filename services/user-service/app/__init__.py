@@ -38,7 +38,41 @@ def create_app(test_config=None):
             JWT_TOKEN_LOCATION=['headers'],
             JWT_ALGORITHM='HS256',
             JSON_AS_ASCII=False,
-            JSONIFY_MIMETYPE='application/json; charset=utf-8'
+            JSONIFY_MIMETYPE='application/json; charset=utf-8',
+            PASSWORD_HASH_WORKERS=int(os.getenv('PASSWORD_HASH_WORKERS', str(os.cpu_count() or 1))),
+            PASSWORD_HASH_METHOD=os.getenv('PASSWORD_HASH_METHOD', 'scrypt'),
+            PASSWORD_HASH_MAX_PENDING=int(os.getenv('PASSWORD_HASH_MAX_PENDING', '64')),
+            PASSWORD_HASH_TIMEOUT=float(os.getenv('PASSWORD_HASH_TIMEOUT', '10')),
+            SERVICE_AUTH_TOKEN=os.getenv('SERVICE_AUTH_TOKEN'),
+            USER_BATCH_MAX_IDS=int(os.getenv('USER_BATCH_MAX_IDS', '1000')),
+            USER_BATCH_MAX_AGE=int(os.getenv('USER_BATCH_MAX_AGE', '60')),
+            REVOCATION_SYNC_SECONDS=int(os.getenv('REVOCATION_SYNC_SECONDS', '5')),
+            REVOCATION_BLOOM_CAPACITY=int(os.getenv('REVOCATION_BLOOM_CAPACITY', '100000')),
+            REVOCATION_BLOOM_ERROR_RATE=float(os.getenv('REVOCATION_BLOOM_ERROR_RATE', '0.001')),
+            REVOCATION_SYNC_OVERLAP=int(os.getenv('REVOCATION_SYNC_OVERLAP', '100')),
+            REVOCATION_INITIAL_SYNC_TIMEOUT=float(os.getenv('REVOCATION_INITIAL_SYNC_TIMEOUT', '5')),
+            JWT_SIGNING_KEY=os.getenv('JWT_SIGNING_KEY'),
+            JWT_SIGNING_KEY_FILE=os.getenv('JWT_SIGNING_KEY_FILE'),
+            JWT_SIGNING_ALGORITHM=os.getenv('JWT_SIGNING_ALGORITHM', 'RS256'),
+            JWT_PREVIOUS_PUBLIC_KEY_FILES=os.getenv('JWT_PREVIOUS_PUBLIC_KEY_FILES', ''),
+            JWT_ACCEPT_HS256=os.getenv('JWT_ACCEPT_HS256', 'false').lower() == 'true',
+            TRACE_EXPORTER=os.getenv('TRACE_EXPORTER', 'none'),
+            TRACE_FILE=os.getenv('TRACE_FILE', 'traces.ndjson'),
+            TRACE_SAMPLE_RATE=float(os.getenv('TRACE_SAMPLE_RATE', '0.1')),
+            TRACE_EXPORT_INTERVAL=float(os.getenv('TRACE_EXPORT_INTERVAL', '5')),
+            SQL_PROFILER=os.getenv('SQL_PROFILER', 'false').lower() == 'true',
+            SQL_PROFILER_N_PLUS_ONE_THRESHOLD=int(os.getenv('SQL_PROFILER_N_PLUS_ONE_THRESHOLD', '5')),
+            SQL_PROFILER_SLOW_MS=float(os.getenv('SQL_PROFILER_SLOW_MS', '100')),
+            DB_POOL_SIZE=int(os.getenv('DB_POOL_SIZE', '5')),
+            DB_POOL_MAX_OVERFLOW=int(os.getenv('DB_POOL_MAX_OVERFLOW', '10')),
+            DB_POOL_TIMEOUT=int(os.getenv('DB_POOL_TIMEOUT', '30')),
+            DB_POOL_RECYCLE=int(os.getenv('DB_POOL_RECYCLE', '1800')),
+            DB_POOL_PRE_PING=os.getenv('DB_POOL_PRE_PING', 'true').lower() == 'true',
+            DB_POOL_WARM=int(os.getenv('DB_POOL_WARM', '2')),
+            DB_PGBOUNCER=os.getenv('DB_PGBOUNCER', 'false').lower() == 'true',
+            DB_STATEMENT_TIMEOUT_MS=int(os.getenv('DB_STATEMENT_TIMEOUT_MS', '0')),
+            USER_BULK_CHUNK_SIZE=int(os.getenv('USER_BULK_CHUNK_SIZE', '500')),
+            USER_BULK_MAX_ROWS=int(os.getenv('USER_BULK_MAX_ROWS', '200000'))
         )
     else:
         # Load the test config if passed in
@@ -56,31 +90,70 @@ def create_app(test_config=None):
             JWT_TOKEN_LOCATION=['headers'],
             JWT_ALGORITHM='HS256',
             JSON_AS_ASCII=False,
-            JSONIFY_MIMETYPE='application/json; charset=utf-8'
+            JSONIFY_MIMETYPE='application/json; charset=utf-8',
+            PASSWORD_HASH_WORKERS=0,
+            PASSWORD_HASH_METHOD='scrypt',
+            PASSWORD_HASH_MAX_PENDING=64,
+            PASSWORD_HASH_TIMEOUT=10.0,
+            SERVICE_AUTH_TOKEN='test-service-token',
+            USER_BATCH_MAX_IDS=1000,
+            USER_BATCH_MAX_AGE=60,
+            REVOCATION_SYNC_SECONDS=0,
+            USER_BULK_CHUNK_SIZE=500,
+            USER_BULK_MAX_ROWS=200000
         )
     
     # Initialize extensions
+    from .db_pool import engine_options
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(app.config))
     db.init_app(app)
     jwt.init_app(app)
     migrate.init_app(app, db)
+
+    from .keys import init_signing
+    init_signing(app, jwt)
+
+    from .revocation import init_revocation
+    from .models import fetch_revocations_from_db
+    init_revocation(app, jwt, fetch=fetch_revocations_from_db)
+
+    from .instrumentation import init_instrumentation
+    init_instrumentation(app)
+
+    from .tracing import init_tracing
+    init_tracing(app, 'user-service')
+
+    from .profiler import init_profiler
+    init_profiler(app)
+
+    from .db_pool import init_db_pool
+    init_db_pool(app, db)
+
+    from .hashing import PasswordHasher
+    app.extensions['password_hasher'] = PasswordHasher.from_config(app.config)
     
     # Create database tables
     with app.app_context():
         # Import models to ensure they are registered with SQLAlchemy
-        from .models import User, Role
+        from .models import User, Role, RevokedToken
         
         # Create tables
         db.create_all()
         
         # Create default roles if they don't exist
-        if not Role.query.first():
-            roles = [
-                Role(name='customer'),
-                Role(name='restaurant_owner'),
-                Role(name='admin')
-            ]
-            db.session.add_all(roles)
+        existing_roles = {name for (name,) in db.session.query(Role.name)}
+        missing_roles = [
+            Role(name=name)
+            for name in ['customer', 'restaurant_owner', 'admin', 'delivery_person']
+            if name not in existing_roles
+        ]
+        if missing_roles:
+            db.session.add_all(missing_roles)
             db.session.commit()
+
+        from .roles import RoleCache
+        app.extensions['roles'] = RoleCache()
+        app.extensions['roles'].load()
     
     # Register blueprints
     from .routes import user_bp
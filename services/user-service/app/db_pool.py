@@ -0,0 +1,217 @@
+"""Connection pool settings, warm-up, statement timeouts and checkout metrics.
+
+``engine_options(config)`` builds ``SQLALCHEMY_ENGINE_OPTIONS`` from:
+
+- ``DB_POOL_SIZE`` (5) and ``DB_POOL_MAX_OVERFLOW`` (10): connections kept
+  open, and how many more may be opened under load
+- ``DB_POOL_TIMEOUT`` (30): whole seconds a request waits for a free
+  connection before failing. Flask-SQLAlchemy rounds it down to an integer.
+- ``DB_POOL_RECYCLE`` (1800): seconds after which a connection is replaced,
+  before a server or proxy idle timeout closes it
+- ``DB_POOL_PRE_PING`` (true): test each connection on checkout
+- ``DB_PGBOUNCER`` (false): for a PgBouncer in transaction mode. PgBouncer
+  does the pooling, so connections are not pooled here (``NullPool``), and
+  psycopg 3 is told not to prepare statements, which do not survive a switch
+  of server connection. psycopg2 never prepares statements.
+- ``DB_STATEMENT_TIMEOUT_MS`` (0, off): the longest a statement may run
+
+``statement_timeout(ms)`` gives a route its own limit; ``ms`` can be a
+config key. PostgreSQL applies it with ``SET LOCAL statement_timeout`` in
+each transaction that needs it. The default limit is a connection option,
+except behind PgBouncer, which rejects startup options; there every
+transaction sets it. SQLite has no statement timeout, so a progress handler
+interrupts statements that run past their deadline. An interrupted
+statement raises ``OperationalError``.
+
+``init_db_pool(app, db)`` opens ``DB_POOL_WARM`` (2) connections at startup, so
+the first requests after a deploy do not pay for connection setup.
+Gunicorn's ``post_fork`` warms each worker again. ``GET /metrics`` gains:
+
+- ``db_pool_checkout_wait_seconds``: histogram of time spent waiting for a
+  connection
+- ``db_pool_checkout_timeouts_total``: checkouts that gave up after
+  ``DB_POOL_TIMEOUT``
+- ``db_pool_size``, ``db_pool_checked_out`` and ``db_pool_overflow``: the
+  pool's current state
+
+Waits that climb while ``db_pool_checked_out`` sits at size plus overflow
+mean the pool is exhausted.
+"""
+import logging
+import threading
+import time
+from functools import wraps
+
+from flask import current_app, g, has_app_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import NullPool, Pool, QueuePool
+
+from .instrumentation import Histogram, _labels
+
+logger = logging.getLogger(__name__)
+
+WAIT_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0)
+# SQLite virtual machine instructions between deadline checks
+SQLITE_PROGRESS_STEPS = 1000
+
+_hooks_installed = False
+_hooks_lock = threading.Lock()
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long checkouts wait for a connection."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.wait = Histogram(WAIT_BUCKETS)
+        self.timeouts = 0
+        self._stats_lock = threading.Lock()
+
+    def connect(self):
+        # _do_get retries itself, so the whole checkout is timed here
+        start = time.perf_counter()
+        try:
+            return super().connect()
+        except PoolTimeoutError:
+            with self._stats_lock:
+                self.timeouts += 1
+            raise
+        finally:
+            with self._stats_lock:
+                self.wait.observe(time.perf_counter() - start)
+
+
+def _in_memory(url):
+    return url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:')
+
+
+def engine_options(config):
+    url = make_url(config['SQLALCHEMY_DATABASE_URI'])
+    options = {}
+    connect_args = {}
+    if config.get('DB_PGBOUNCER', False):
+        options['poolclass'] = NullPool
+        if url.drivername == 'postgresql+psycopg':
+            connect_args['prepare_threshold'] = None
+    elif not _in_memory(url):
+        # An in-memory SQLite database lives in its one connection, so it keeps SQLAlchemy's pool
+        options.update(
+            poolclass=TimedQueuePool,
+            pool_size=config.get('DB_POOL_SIZE', 5),
+            max_overflow=config.get('DB_POOL_MAX_OVERFLOW', 10),
+            pool_timeout=config.get('DB_POOL_TIMEOUT', 30),
+            pool_recycle=config.get('DB_POOL_RECYCLE', 1800),
+            pool_pre_ping=config.get('DB_POOL_PRE_PING', True)
+        )
+        timeout = config.get('DB_STATEMENT_TIMEOUT_MS', 0)
+        if timeout and url.get_backend_name() == 'postgresql':
+            connect_args['options'] = f'-c statement_timeout={int(timeout)}'
+    if connect_args:
+        options['connect_args'] = connect_args
+    return options
+
+
+def statement_timeout(ms):
+    """Limit the statements of a route to ``ms`` milliseconds (or the value of config key ``ms``)."""
+    def decorator(view):
+        @wraps(view)
+        def limited(*args, **kwargs):
+            g.statement_timeout_ms = current_app.config.get(ms, 0) if isinstance(ms, str) else ms
+            return view(*args, **kwargs)
+        return limited
+    return decorator
+
+
+def _begin(conn):
+    conn.info.pop('statement_timeout_ms', None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if not has_app_context():
+        return
+    default = current_app.config.get('DB_STATEMENT_TIMEOUT_MS', 0)
+    timeout = g.get('statement_timeout_ms', default)
+    dialect = conn.dialect.name
+    if dialect == 'postgresql':
+        # The connection option already applies the default, except behind PgBouncer
+        if timeout == default and not current_app.config.get('DB_PGBOUNCER', False):
+            return
+        if conn.info.get('statement_timeout_ms') != timeout:
+            cursor.execute(f'SET LOCAL statement_timeout = {int(timeout)}')
+            conn.info['statement_timeout_ms'] = timeout
+    elif dialect == 'sqlite':
+        dbapi_connection = conn.connection.dbapi_connection
+        if timeout:
+            deadline = time.perf_counter() + timeout / 1000
+            dbapi_connection.set_progress_handler(lambda: time.perf_counter() > deadline, SQLITE_PROGRESS_STEPS)
+            conn.info['sqlite_deadline'] = True
+        elif conn.info.pop('sqlite_deadline', False):
+            dbapi_connection.set_progress_handler(None, 0)
+
+
+def _checkin(dbapi_connection, connection_record):
+    # A deadline must not outlive the checkout that set it
+    if connection_record.info.pop('sqlite_deadline', False) and dbapi_connection is not None:
+        dbapi_connection.set_progress_handler(None, 0)
+
+
+def _install_hooks():
+    global _hooks_installed
+    with _hooks_lock:
+        if _hooks_installed:
+            return
+        event.listen(Engine, 'begin', _begin)
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Pool, 'checkin', _checkin)
+        _hooks_installed = True
+
+
+def warm_pool(engine, count):
+    """Open up to ``count`` connections and return them to the pool."""
+    if not isinstance(engine.pool, QueuePool):
+        return 0
+    connections = []
+    try:
+        for _ in range(min(count, engine.pool.size())):
+            connections.append(engine.pool.connect())
+    except Exception as e:
+        logger.warning(f"Warmed {len(connections)} of {count} database connections: {str(e)}")
+    finally:
+        for connection in connections:
+            connection.close()
+    return len(connections)
+
+
+def render_pool_metrics(engines):
+    lines = ['# HELP db_pool_checkout_wait_seconds Time spent waiting for a database connection.',
+             '# TYPE db_pool_checkout_wait_seconds histogram']
+    pools = [(name or 'default', engine.pool) for name, engine in engines.items()
+             if isinstance(engine.pool, TimedQueuePool)]
+    for name, pool in pools:
+        with pool._stats_lock:
+            lines += pool.wait.render('db_pool_checkout_wait_seconds', _labels(engine=name))
+    lines += ['# HELP db_pool_checkout_timeouts_total Checkouts that timed out waiting for a connection.',
+              '# TYPE db_pool_checkout_timeouts_total counter']
+    lines += [f'db_pool_checkout_timeouts_total{{{_labels(engine=name)}}} {pool.timeouts}' for name, pool in pools]
+    for metric, help_text, value in (
+        ('db_pool_size', 'Connections the pool keeps open.', QueuePool.size),
+        ('db_pool_checked_out', 'Connections in use.', QueuePool.checkedout),
+        ('db_pool_overflow', 'Connections open beyond the pool size.', lambda pool: max(pool.overflow(), 0))
+    ):
+        lines += [f'# HELP {metric} {help_text}', f'# TYPE {metric} gauge']
+        lines += [f'{metric}{{{_labels(engine=name)}}} {value(pool)}' for name, pool in pools]
+    return lines
+
+
+def init_db_pool(app, db):
+    _install_hooks()
+    with app.app_context():
+        engines = db.engines
+        warmed = sum(warm_pool(engine, app.config.get('DB_POOL_WARM', 0)) for engine in engines.values())
+    if warmed:
+        logger.info(f"Warmed {warmed} database connections")
+    metrics = app.extensions.get('metrics')
+    if metrics is not None:
+        metrics.collectors.append(lambda: render_pool_metrics(engines))
@@ -0,0 +1,128 @@
+"""Password hashing and verification off the request thread.
+
+scrypt/pbkdf2 are deliberately CPU-heavy, so running them inline lets a burst
+of logins occupy every worker. ``PasswordHasher`` sends the work to a bounded
+``ProcessPoolExecutor`` instead; when too many hashes are already pending it
+fails fast with ``HashingBusy`` rather than queueing without limit.
+
+With ``PASSWORD_HASH_WORKERS=0`` hashing runs inline (used by the tests).
+"""
+import logging
+import math
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from functools import partial
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+logger = logging.getLogger(__name__)
+
+
+class HashingBusy(Exception):
+    """Raised when the hashing queue is full."""
+
+
+class PasswordHasher:
+    def __init__(self, workers=0, method='scrypt', max_pending=64, timeout=10.0):
+        self.workers = workers
+        self.method = method
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self._executor = None
+        self._executor_pid = None
+        self._method_prefix = None
+        self._pending = 0
+        self._completed = 0
+        self._rejected = 0
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            workers=config.get('PASSWORD_HASH_WORKERS', 0),
+            method=config.get('PASSWORD_HASH_METHOD', 'scrypt'),
+            max_pending=config.get('PASSWORD_HASH_MAX_PENDING', 64),
+            timeout=config.get('PASSWORD_HASH_TIMEOUT', 10.0)
+        )
+
+    def _get_executor(self):
+        # Created lazily and per process, so a pool made before a fork is never reused
+        with self._lock:
+            if self._executor is None or self._executor_pid != os.getpid():
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+                self._executor_pid = os.getpid()
+            return self._executor
+
+    @contextmanager
+    def _slot(self, blocking=False):
+        acquired = self._slots.acquire(timeout=self.timeout) if blocking else self._slots.acquire(blocking=False)
+        if not acquired:
+            with self._lock:
+                self._rejected += 1
+            raise HashingBusy()
+        with self._lock:
+            self._pending += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._pending -= 1
+                self._completed += 1
+            self._slots.release()
+
+    def _run(self, fn, *args):
+        with self._slot():
+            if self.workers:
+                return self._get_executor().submit(fn, *args).result(timeout=self.timeout)
+            return fn(*args)
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, pwhash, password):
+        return self._run(check_password_hash, pwhash, password)
+
+    def hash_many(self, passwords):
+        """Hash a batch of passwords spread across the whole pool.
+
+        The batch occupies a single queue slot and waits up to ``timeout`` for
+        one, so bulk jobs queue behind interactive logins instead of failing.
+        """
+        if not passwords:
+            return []
+        hash_one = partial(generate_password_hash, method=self.method)
+        with self._slot(blocking=True):
+            if not self.workers:
+                return [hash_one(password) for password in passwords]
+            chunksize = max(1, math.ceil(len(passwords) / (self.workers * 4)))
+            return list(self._get_executor().map(hash_one, passwords, chunksize=chunksize))
+
+    def needs_rehash(self, pwhash):
+        """True if a stored hash was made with other parameters than the current ones."""
+        if self._method_prefix is None:
+            # Normalises e.g. "scrypt" to "scrypt:32768:8:1"
+            self._method_prefix = generate_password_hash('', self.method).split('$', 1)[0]
+        return pwhash.split('$', 1)[0] != self._method_prefix
+
+    def stats(self):
+        with self._lock:
+            pending = self._pending
+            return {
+                'workers': self.workers,
+                'method': self.method,
+                'max_pending': self.max_pending,
+                'pending': pending,
+                'in_flight': min(pending, self.workers) if self.workers else pending,
+                'queued': max(pending - self.workers, 0) if self.workers else 0,
+                'completed': self._completed,
+                'rejected': self._rejected
+            }
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None and self._executor_pid == os.getpid():
+                self._executor.shutdown(wait=False)
+            self._executor = None
@@ -0,0 +1,121 @@
+"""Asymmetric signing keys for access tokens and the JWKS that publishes them.
+
+When ``JWT_SIGNING_KEY`` (a PEM private key, or ``JWT_SIGNING_KEY_FILE``) is
+configured, tokens are signed with ``JWT_SIGNING_ALGORITHM`` (RS256 or EdDSA)
+and carry a ``kid`` header. The public half is served as a JWK Set, so the
+other services can verify tokens locally without sharing any secret. Public
+keys listed in ``JWT_PREVIOUS_PUBLIC_KEY_FILES`` stay published and accepted
+during a rotation, until tokens signed with them have expired.
+
+Without a signing key, tokens keep being signed with HS256 and
+``JWT_SECRET_KEY``.
+"""
+import base64
+import hashlib
+import json
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ed448, ed25519, rsa
+from flask import current_app
+from jwt.algorithms import OKPAlgorithm, RSAAlgorithm
+from jwt.exceptions import InvalidTokenError
+
+SUPPORTED_ALGORITHMS = {'RS256': RSAAlgorithm, 'EdDSA': OKPAlgorithm}
+
+
+def key_id(public_key):
+    """Stable id derived from the public key bytes."""
+    der = public_key.public_bytes(serialization.Encoding.DER, serialization.PublicFormat.SubjectPublicKeyInfo)
+    return base64.urlsafe_b64encode(hashlib.sha256(der).digest()[:12]).decode('ascii').rstrip('=')
+
+
+def _algorithm_for(public_key):
+    if isinstance(public_key, rsa.RSAPublicKey):
+        return 'RS256'
+    if isinstance(public_key, (ed25519.Ed25519PublicKey, ed448.Ed448PublicKey)):
+        return 'EdDSA'
+    raise ValueError('Unsupported public key type')
+
+
+def _read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+class SigningKeys:
+    def __init__(self, private_key, algorithm='RS256', previous_public_keys=()):
+        if algorithm not in SUPPORTED_ALGORITHMS:
+            raise ValueError(f'Unsupported signing algorithm: {algorithm}')
+        self.algorithm = algorithm
+        self.private_key = private_key
+        self.public_key = private_key.public_key()
+        self.kid = key_id(self.public_key)
+        self._public_keys = {self.kid: (algorithm, self.public_key)}
+        for public_key in previous_public_keys:
+            self._public_keys.setdefault(key_id(public_key), (_algorithm_for(public_key), public_key))
+        self._jwks = json.dumps(self._build_jwks(), separators=(',', ':'))
+
+    @classmethod
+    def from_config(cls, config):
+        pem = config.get('JWT_SIGNING_KEY')
+        if not pem and config.get('JWT_SIGNING_KEY_FILE'):
+            pem = _read(config['JWT_SIGNING_KEY_FILE'])
+        if not pem:
+            return None
+        if isinstance(pem, str):
+            pem = pem.encode('utf-8')
+        previous = [
+            serialization.load_pem_public_key(_read(path.strip()))
+            for path in (config.get('JWT_PREVIOUS_PUBLIC_KEY_FILES') or '').split(',') if path.strip()
+        ]
+        return cls(
+            serialization.load_pem_private_key(pem, password=None),
+            config.get('JWT_SIGNING_ALGORITHM', 'RS256'),
+            previous
+        )
+
+    def _build_jwks(self):
+        keys = []
+        for kid, (algorithm, public_key) in self._public_keys.items():
+            jwk = SUPPORTED_ALGORITHMS[algorithm].to_jwk(public_key, as_dict=True)
+            jwk.update({'kid': kid, 'alg': algorithm, 'use': 'sig'})
+            keys.append(jwk)
+        return {'keys': keys}
+
+    @property
+    def algorithms(self):
+        return sorted({algorithm for algorithm, _ in self._public_keys.values()})
+
+    def jwks_json(self):
+        return self._jwks
+
+    def public_key_for(self, kid, algorithm):
+        entry = self._public_keys.get(kid)
+        if entry is None or entry[0] != algorithm:
+            return None
+        return entry[1]
+
+
+def init_signing(app, jwt):
+    keys = SigningKeys.from_config(app.config)
+    app.extensions['signing_keys'] = keys
+    if keys is not None:
+        app.config['JWT_ALGORITHM'] = keys.algorithm
+        app.config['JWT_PRIVATE_KEY'] = keys.private_key
+        app.config['JWT_PUBLIC_KEY'] = keys.public_key
+        app.config['JWT_DECODE_ALGORITHMS'] = keys.algorithms + (['HS256'] if app.config.get('JWT_ACCEPT_HS256') else [])
+
+    @jwt.additional_headers_loader
+    def add_key_id(identity):
+        keys = current_app.extensions.get('signing_keys')
+        return {'kid': keys.kid} if keys is not None else {}
+
+    @jwt.decode_key_loader
+    def select_decode_key(jwt_header, jwt_payload):
+        keys = current_app.extensions.get('signing_keys')
+        if keys is None or jwt_header.get('alg', '').startswith('HS'):
+            return current_app.config['JWT_SECRET_KEY']
+        public_key = keys.public_key_for(jwt_header.get('kid'), jwt_header.get('alg'))
+        if public_key is None:
+            raise InvalidTokenError('Unknown signing key')
+        return public_key
@@ -1,6 +1,6 @@
 from . import db
 from datetime import datetime
-from werkzeug.security import generate_password_hash, check_password_hash
+from flask import current_app
 
 class Role(db.Model):
     __tablename__ = 'roles'
@@ -23,19 +23,62 @@ class User(db.Model):
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = current_app.extensions['password_hasher'].hash(password)
         
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return current_app.extensions['password_hasher'].verify(self.password_hash, password)
+
+    def password_needs_rehash(self):
+        return current_app.extensions['password_hasher'].needs_rehash(self.password_hash)
     
     def to_dict(self):
+        from .roles import role_name
         return {
             'id': self.id,
             'email': self.email,
             'first_name': self.first_name,
             'last_name': self.last_name,
             'phone_number': self.phone_number,
-            'role': self.role.name,
+            'role': role_name(self.role_id),
             'created_at': self.created_at.isoformat(),
             'updated_at': self.updated_at.isoformat()
-        } 
\ No newline at end of file
+        }
+
+    def to_summary(self):
+        """Compact projection returned to other services."""
+        from .roles import role_name
+        return {
+            'id': self.id,
+            'email': self.email,
+            'first_name': self.first_name,
+            'last_name': self.last_name,
+            'phone_number': self.phone_number,
+            'role': role_name(self.role_id)
+        }
+
+
+class RevokedToken(db.Model):
+    __tablename__ = 'revoked_tokens'
+
+    id = db.Column(db.Integer, primary_key=True)
+    jti = db.Column(db.String(64), unique=True, nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
+    expires_at = db.Column(db.DateTime, nullable=True, index=True)
+    revoked_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'jti': self.jti,
+            'expires_at': self.expires_at.isoformat() if self.expires_at else None
+        }
+
+
+def fetch_revocations_from_db(since_id, limit=1000):
+    """Revocations after ``since_id`` whose tokens have not expired yet, oldest first."""
+    now = datetime.utcnow()
+    query = RevokedToken.query.filter(
+        RevokedToken.id > since_id,
+        db.or_(RevokedToken.expires_at.is_(None), RevokedToken.expires_at > now)
+    ).order_by(RevokedToken.id).limit(limit)
+    return [token.to_dict() for token in query]
@@ -0,0 +1,173 @@
+"""Bulk user provisioning.
+
+Accounts arrive as NDJSON and are processed in chunks: one ``IN`` query per
+chunk finds emails that are already registered, passwords are hashed in
+parallel on the hashing pool, and new users are inserted with one multi-row
+INSERT. Each chunk is committed on its own, so a re-run after a failure skips
+the users that were already created.
+
+Every input row gets exactly one result line, in input order.
+"""
+import json
+
+from sqlalchemy.exc import IntegrityError
+
+from . import db
+from .hashing import HashingBusy
+from .models import User
+from .roles import role_id
+
+NDJSON_MIMETYPES = ('application/x-ndjson', 'application/ndjson', 'application/jsonl')
+
+REQUIRED_FIELDS = ['email', 'password', 'first_name', 'last_name', 'role']
+FIELD_LENGTHS = {'email': 120, 'first_name': 50, 'last_name': 50, 'phone_number': 20}
+
+
+def iter_rows(text):
+    """Yield (row_number, row_dict_or_None, parse_error) from NDJSON lines."""
+    for number, line in enumerate(text, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield number, None, f'Invalid JSON: {e.msg}'
+            continue
+        if not isinstance(row, dict):
+            yield number, None, 'Row must be a JSON object'
+            continue
+        yield number, row, None
+
+
+def validate_row(row):
+    """Return (values, errors) for a single user row."""
+    errors = {}
+    missing_fields = [field for field in REQUIRED_FIELDS if row.get(field) in (None, '')]
+    if missing_fields:
+        errors['missing_fields'] = missing_fields
+
+    for field, length in FIELD_LENGTHS.items():
+        value = row.get(field)
+        if value is not None and (not isinstance(value, str) or len(value) > length):
+            errors[field] = f'Must be a string of at most {length} characters'
+
+    password = row.get('password')
+    if password is not None and not isinstance(password, str):
+        errors['password'] = 'Must be a string'
+
+    user_role_id = None
+    if row.get('role') not in (None, ''):
+        user_role_id = role_id(row['role'])
+        if user_role_id is None:
+            errors['role'] = 'Invalid role'
+
+    if errors:
+        return None, errors
+
+    return {
+        'email': row['email'].strip(),
+        'password': password,
+        'first_name': row['first_name'],
+        'last_name': row['last_name'],
+        'phone_number': row.get('phone_number'),
+        'role_id': user_role_id
+    }, None
+
+
+def _existing_emails(emails):
+    return {email for (email,) in db.session.query(User.email).filter(User.email.in_(emails))}
+
+
+def _insert(values):
+    stmt = User.__table__.insert().returning(User.__table__.c.id, User.__table__.c.email)
+    return {email: user_id for user_id, email in db.session.execute(stmt, values)}
+
+
+def provision_chunk(rows, hasher):
+    """Create the valid, new users of one chunk and commit; returns result dicts."""
+    results = []
+    pending = []
+    seen = set()
+    for number, values, errors in rows:
+        if errors:
+            results.append({'row': number, 'status': 'failed', 'errors': errors})
+            continue
+        if values['email'] in seen:
+            results.append({'row': number, 'status': 'failed', 'email': values['email'],
+                            'errors': {'email': 'Duplicate email in request'}})
+            continue
+        seen.add(values['email'])
+        result = {'row': number, 'email': values['email']}
+        results.append(result)
+        pending.append((result, values))
+
+    existing = _existing_emails([values['email'] for _, values in pending]) if pending else set()
+    for result, values in pending:
+        if values['email'] in existing:
+            result['status'] = 'exists'
+    pending = [(result, values) for result, values in pending if values['email'] not in existing]
+    if not pending:
+        return results
+
+    try:
+        hashes = hasher.hash_many([values['password'] for _, values in pending])
+    except HashingBusy:
+        for result, _ in pending:
+            result.update(status='failed', errors={'password': 'Hashing is busy, retry this row'})
+        return results
+
+    rows_to_insert = []
+    for (_, values), password_hash in zip(pending, hashes):
+        row = {field: value for field, value in values.items() if field != 'password'}
+        row['password_hash'] = password_hash
+        rows_to_insert.append(row)
+
+    try:
+        ids = _insert(rows_to_insert)
+        db.session.commit()
+    except IntegrityError:
+        # Lost a race with a concurrent signup; insert what is still new
+        db.session.rollback()
+        taken = _existing_emails([row['email'] for row in rows_to_insert])
+        remaining = [row for row in rows_to_insert if row['email'] not in taken]
+        ids = {}
+        if remaining:
+            ids = _insert(remaining)
+            db.session.commit()
+
+    for result, values in pending:
+        user_id = ids.get(values['email'])
+        if user_id is None:
+            result['status'] = 'exists'
+        else:
+            result.update(status='created', id=user_id)
+    return results
+
+
+def provision_users(rows, hasher, chunk_size=500, max_rows=None):
+    """Yield one result per input row, then a summary dict."""
+    summary = {'processed': 0, 'created': 0, 'exists': 0, 'failed': 0}
+    chunk = []
+
+    def flush():
+        for result in provision_chunk(chunk, hasher):
+            summary[result['status']] += 1
+            yield result
+        chunk.clear()
+
+    for number, row, parse_error in rows:
+        if max_rows is not None and summary['processed'] >= max_rows:
+            summary['truncated'] = True
+            yield {'row': number, 'status': 'failed', 'errors': {'limit': f'Provisioning is limited to {max_rows} rows'}}
+            break
+        summary['processed'] += 1
+        if parse_error:
+            chunk.append((number, None, {'row': parse_error}))
+        else:
+            values, errors = validate_row(row)
+            chunk.append((number, values, errors))
+        if len(chunk) >= chunk_size:
+            yield from flush()
+    yield from flush()
+    yield {'summary': summary}
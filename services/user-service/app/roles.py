@@ -0,0 +1,67 @@
+"""In-process cache of the roles table.
+
+The roles table holds a handful of rows that practically never change, so it
+is loaded once into an immutable id <-> name map instead of being queried on
+every signup and every serialised user. Inserts, updates and deletes of
+``Role`` made through the ORM mark the cache stale, and it is reloaded on the
+next read.
+"""
+import threading
+from types import MappingProxyType
+
+from flask import current_app, has_app_context
+from sqlalchemy import event
+
+from . import db
+from .models import Role
+
+
+class RoleCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_id = MappingProxyType({})
+        self._by_name = MappingProxyType({})
+        self._stale = True
+
+    def load(self):
+        rows = db.session.query(Role.id, Role.name).all()
+        with self._lock:
+            self._by_id = MappingProxyType({role_id: name for role_id, name in rows})
+            self._by_name = MappingProxyType({name: role_id for role_id, name in rows})
+            self._stale = False
+
+    def invalidate(self):
+        self._stale = True
+
+    def _current(self):
+        if self._stale:
+            self.load()
+        return self._by_id, self._by_name
+
+    @property
+    def by_id(self):
+        return self._current()[0]
+
+    @property
+    def by_name(self):
+        return self._current()[1]
+
+
+def get_roles():
+    return current_app.extensions['roles']
+
+
+def role_name(role_id):
+    return get_roles().by_id.get(role_id)
+
+
+def role_id(name):
+    return get_roles().by_name.get(name)
+
+
+@event.listens_for(Role, 'after_insert')
+@event.listens_for(Role, 'after_update')
+@event.listens_for(Role, 'after_delete')
+def _role_changed(mapper, connection, target):
+    if has_app_context() and 'roles' in current_app.extensions:
+        current_app.extensions['roles'].invalidate()
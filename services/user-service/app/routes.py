@@ -1,7 +1,13 @@
-from flask import Blueprint, request, jsonify, make_response
-from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
-from .models import User, Role, db
-from datetime import timedelta
+from flask import Blueprint, request, jsonify, make_response, current_app, stream_with_context
+from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity, get_jwt
+from .models import User, RevokedToken, fetch_revocations_from_db, db
+from .roles import role_id, role_name
+from .auth import service_auth_required
+from .hashing import HashingBusy
+from .provisioning import iter_rows, provision_users, NDJSON_MIMETYPES
+from datetime import datetime, timedelta
+import hashlib
+import io
 import logging
 import json
 
@@ -19,6 +25,13 @@ def log_request_info():
     # Only log non-sensitive request information
     logger.info(f'Request Method: {request.method} Path: {request.path}')
 
+@user_bp.errorhandler(HashingBusy)
+def hashing_busy(e):
+    logger.warning("Password hashing queue full, rejecting %s %s", request.method, request.path)
+    response = jsonify({'error': 'Service busy, please retry'})
+    response.headers['Retry-After'] = '1'
+    return response, 503
+
 @user_bp.route('/register', methods=['POST'])
 def register():
     try:
@@ -49,8 +62,8 @@ def register():
             return jsonify({'error': 'Email already registered'}), 400
         
         # Get role
-        role = Role.query.filter_by(name=data['role']).first()
-        if not role:
+        user_role_id = role_id(data['role'])
+        if user_role_id is None:
             return jsonify({
                 'error': 'Invalid role',
                 'valid_roles': ['customer', 'restaurant_owner', 'delivery_person']
@@ -62,7 +75,7 @@ def register():
             first_name=data['first_name'],
             last_name=data['last_name'],
             phone_number=data.get('phone_number'),
-            role_id=role.id
+            role_id=user_role_id
         )
         user.set_password(data['password'])
         
@@ -78,6 +91,8 @@ def register():
             logger.error("Database error during user registration", exc_info=True)
             return jsonify({'error': 'Failed to create user'}), 500
             
+    except HashingBusy:
+        raise
     except Exception as e:
         logger.error("Unexpected error during registration", exc_info=True)
         return jsonify({'error': 'Failed to process request'}), 500
@@ -93,12 +108,17 @@ def login():
         user = User.query.filter_by(email=data.get('email')).first()
         if not user or not user.check_password(data.get('password', '')):
             return jsonify({'error': 'Invalid email or password'}), 401
+
+        # Upgrade hashes made with older cost parameters while we have the password
+        if user.password_needs_rehash():
+            user.set_password(data['password'])
+            db.session.commit()
         
         # Create access token
         access_token = create_access_token(
             identity=str(user.id),
             additional_claims={
-                'role': user.role.name,
+                'role': role_name(user.role_id),
                 'email': user.email,
                 'first_name': user.first_name,
                 'last_name': user.last_name
@@ -115,10 +135,147 @@ def login():
         response.headers['Content-Type'] = 'application/json; charset=utf-8'
         return response
         
+    except HashingBusy:
+        raise
     except Exception as e:
         logger.error("Unexpected error during login", exc_info=True)
         return jsonify({'error': 'Failed to process request'}), 500
 
+@user_bp.route('/bulk', methods=['POST'])
+@service_auth_required
+def provision_users_bulk():
+    """Create users from an NDJSON upload, streaming one NDJSON result per row."""
+    if request.mimetype not in NDJSON_MIMETYPES:
+        return jsonify({
+            'error': 'Unsupported content type',
+            'supported_types': list(NDJSON_MIMETYPES)
+        }), 415
+
+    hasher = current_app.extensions['password_hasher']
+    chunk_size = current_app.config['USER_BULK_CHUNK_SIZE']
+    max_rows = current_app.config['USER_BULK_MAX_ROWS']
+
+    def generate():
+        text = io.TextIOWrapper(io.BufferedReader(request.stream), encoding='utf-8')
+        try:
+            for result in provision_users(iter_rows(text), hasher, chunk_size, max_rows):
+                yield current_app.json.dumps(result, separators=(',', ':')) + '\n'
+        except Exception:
+            db.session.rollback()
+            logger.error("Unexpected error during bulk provisioning", exc_info=True)
+            yield current_app.json.dumps({'error': 'Failed to process request'}) + '\n'
+
+    return current_app.response_class(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+@user_bp.route('/logout', methods=['POST'])
+@jwt_required()
+def logout():
+    try:
+        claims = get_jwt()
+        expires_at = datetime.utcfromtimestamp(claims['exp']) if 'exp' in claims else None
+        token = RevokedToken.query.filter_by(jti=claims['jti']).first()
+        if token is None:
+            token = RevokedToken(jti=claims['jti'], user_id=int(get_jwt_identity()), expires_at=expires_at)
+            db.session.add(token)
+            db.session.commit()
+        # Other services pick this up on their next sync; this process knows now
+        current_app.extensions['revocation'].add(token.jti, token.expires_at)
+        return jsonify({'message': 'Logged out successfully'})
+    except Exception as e:
+        db.session.rollback()
+        logger.error("Unexpected error during logout", exc_info=True)
+        return jsonify({'error': 'Failed to process request'}), 500
+
+@user_bp.route('/revocations', methods=['GET'])
+@service_auth_required
+def get_revocations():
+    """Revoked, unexpired tokens after the ``since`` id, for other services to sync."""
+    try:
+        since_id = request.args.get('since', 0, type=int)
+        return jsonify({'revocations': fetch_revocations_from_db(since_id)})
+    except Exception as e:
+        logger.error("Unexpected error listing revocations", exc_info=True)
+        return jsonify({'error': 'Failed to list revocations'}), 500
+
+@user_bp.route('/.well-known/jwks.json', methods=['GET'])
+def get_jwks():
+    """Public keys for verifying access tokens; empty while tokens are HS256 signed."""
+    keys = current_app.extensions.get('signing_keys')
+    response = current_app.response_class(
+        keys.jwks_json() if keys is not None else '{"keys":[]}',
+        mimetype='application/json'
+    )
+    response.headers['Content-Type'] = 'application/json; charset=utf-8'
+    response.headers['Cache-Control'] = 'public, max-age=300'
+    return response
+
+@user_bp.route('/metrics/password-hashing', methods=['GET'])
+@service_auth_required
+def password_hashing_metrics():
+    return jsonify(current_app.extensions['password_hasher'].stats())
+
+def _parse_user_ids(values):
+    """Normalise requested ids into a de-duplicated list, or None if invalid."""
+    ids = []
+    seen = set()
+    for value in values:
+        if isinstance(value, bool):
+            return None
+        try:
+            user_id = int(value)
+        except (TypeError, ValueError):
+            return None
+        if user_id not in seen:
+            seen.add(user_id)
+            ids.append(user_id)
+    return ids
+
+def _batch_response(ids):
+    max_ids = current_app.config['USER_BATCH_MAX_IDS']
+    if ids is None:
+        return jsonify({'error': 'ids must be a list of integers'}), 400
+    if not ids:
+        return jsonify({'error': 'No ids provided'}), 400
+    if len(ids) > max_ids:
+        return jsonify({'error': f'At most {max_ids} ids per request'}), 400
+
+    users = User.query.filter(User.id.in_(ids)).all()
+    by_id = {user.id: user.to_summary() for user in users}
+    body = current_app.json.dumps({
+        'users': [by_id[user_id] for user_id in ids if user_id in by_id],
+        'missing': [user_id for user_id in ids if user_id not in by_id]
+    })
+
+    response = current_app.response_class(body, mimetype='application/json')
+    response.headers['Content-Type'] = 'application/json; charset=utf-8'
+    response.headers['Cache-Control'] = f"private, max-age={current_app.config['USER_BATCH_MAX_AGE']}"
+    response.set_etag(hashlib.sha256(body.encode('utf-8')).hexdigest())
+    return response.make_conditional(request)
+
+@user_bp.route('', methods=['GET'])
+@service_auth_required
+def get_users_by_ids():
+    """Resolve a comma separated ``ids`` list for other services."""
+    try:
+        raw = request.args.get('ids', '')
+        return _batch_response(_parse_user_ids(value for value in raw.split(',') if value.strip()))
+    except Exception as e:
+        logger.error("Unexpected error during batch user lookup", exc_info=True)
+        return jsonify({'error': 'Failed to get users'}), 500
+
+@user_bp.route('/batch', methods=['POST'])
+@service_auth_required
+def get_users_batch():
+    """Same as ``GET /api/users?ids=`` for id lists too long for a URL."""
+    try:
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict) or not isinstance(data.get('ids'), list):
+            return jsonify({'error': 'ids must be a list of integers'}), 400
+        return _batch_response(_parse_user_ids(data['ids']))
+    except Exception as e:
+        logger.error("Unexpected error during batch user lookup", exc_info=True)
+        return jsonify({'error': 'Failed to get users'}), 500
+
 @user_bp.route('/profile', methods=['GET'])
 @jwt_required()
 def get_profile():
@@ -180,6 +337,8 @@ def update_profile():
         response.headers['Content-Type'] = 'application/json; charset=utf-8'
         return response
         
+    except HashingBusy:
+        raise
     except Exception as e:
         logger.error("Unexpected error: %s", str(e), exc_info=True)
         db.session.rollback()
@@ -0,0 +1,360 @@
+"""Distributed tracing with W3C ``traceparent`` propagation.
+
+``init_tracing(app, service_name)`` opens a server span for every request,
+continuing the trace named by an incoming ``traceparent`` header. While a
+request is in flight:
+
+- every outbound ``requests`` call gets a client span and carries
+  ``traceparent`` to the next service
+- every SQL statement gets a ``db.query`` span
+- messages published to SNS carry ``traceparent`` as a message attribute
+  (``message_attributes``); consumers continue the trace with
+  ``extract_message_context``, which understands both raw SQS messages and
+  SNS notifications delivered through SQS
+
+Whether a trace is recorded is decided once, where it starts, with
+probability ``TRACE_SAMPLE_RATE`` (default 0.1); downstream services follow
+the sampled flag in ``traceparent``. Unsampled requests still propagate ids
+but build no spans for SQL, so the cost of tracing is bounded by the rate.
+
+Finished spans are queued and exported in batches of
+``TRACE_EXPORT_BATCH_SIZE`` every ``TRACE_EXPORT_INTERVAL`` seconds by a
+background thread (``0`` exports each span as it ends). When more than
+``TRACE_QUEUE_MAX`` spans are waiting, new ones are dropped and counted.
+``TRACE_EXPORTER`` picks where they go: ``none`` (the default; propagate
+only), ``file`` (NDJSON appended to ``TRACE_FILE``) or ``memory`` (kept in
+the exporter, for tests).
+"""
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+from contextvars import ContextVar
+from urllib.parse import urlparse
+
+import requests
+from flask import g, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+SpanContext = namedtuple('SpanContext', ['trace_id', 'span_id', 'sampled'])
+
+_TRACEPARENT = re.compile(r'^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$')
+_current = ContextVar('current_span', default=None)
+_hooks_installed = False
+_hooks_lock = threading.Lock()
+
+
+def parse_traceparent(header):
+    """SpanContext from a ``traceparent`` header, or None if it is missing or invalid."""
+    match = _TRACEPARENT.match(header.strip().lower()) if header else None
+    if not match or match.group(1) == '0' * 32 or match.group(2) == '0' * 16:
+        return None
+    return SpanContext(match.group(1), match.group(2), bool(int(match.group(3), 16) & 1))
+
+
+def current_span():
+    return _current.get()
+
+
+class Span:
+    __slots__ = ('tracer', 'trace_id', 'span_id', 'parent_id', 'sampled', 'name', 'kind',
+                 'start_ns', 'end_ns', 'attributes', 'status')
+
+    def __init__(self, tracer, trace_id, span_id, parent_id, sampled, name, kind, attributes):
+        self.tracer = tracer
+        self.trace_id = trace_id
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.sampled = sampled
+        self.name = name
+        self.kind = kind
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.attributes = attributes if sampled and attributes else {}
+        self.status = 'ok'
+
+    @property
+    def recording(self):
+        return self.sampled and self.tracer.processor is not None
+
+    def set_attribute(self, key, value):
+        if self.sampled:
+            self.attributes[key] = value
+
+    def traceparent(self):
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+    def end(self):
+        if self.end_ns is None:
+            self.end_ns = time.time_ns()
+            if self.recording:
+                self.tracer.processor.on_end(self)
+
+    def to_dict(self):
+        return {
+            'service': self.tracer.service_name, 'trace_id': self.trace_id, 'span_id': self.span_id,
+            'parent_id': self.parent_id, 'name': self.name, 'kind': self.kind, 'start_ns': self.start_ns,
+            'duration_us': (self.end_ns - self.start_ns) // 1000 if self.end_ns else None,
+            'status': self.status, 'attributes': self.attributes
+        }
+
+
+class Tracer:
+    def __init__(self, service_name, processor=None, sample_rate=0.1):
+        self.service_name = service_name
+        self.processor = processor
+        self.sample_rate = sample_rate
+
+    @classmethod
+    def from_config(cls, app, service_name):
+        name = app.config.get('TRACE_EXPORTER', 'none')
+        if name == 'none':
+            exporter = None
+        elif name == 'memory':
+            exporter = InMemoryExporter()
+        elif name == 'file':
+            exporter = FileExporter(app.config.get('TRACE_FILE', 'traces.ndjson'))
+        else:
+            raise ValueError(f'Unknown trace exporter: {name}')
+        processor = BatchSpanProcessor(
+            exporter,
+            interval=app.config.get('TRACE_EXPORT_INTERVAL', 5),
+            batch_size=app.config.get('TRACE_EXPORT_BATCH_SIZE', 512),
+            max_queue=app.config.get('TRACE_QUEUE_MAX', 2048)
+        ) if exporter else None
+        return cls(service_name, processor, app.config.get('TRACE_SAMPLE_RATE', 0.1))
+
+    def start_span(self, name, kind='internal', parent=None, attributes=None):
+        """Start a span under ``parent`` (a Span or SpanContext), else the current span."""
+        if parent is None:
+            parent = _current.get()
+        if parent is None:
+            trace_id = f'{random.getrandbits(128):032x}'
+            sampled = random.random() < self.sample_rate
+            parent_id = None
+        else:
+            trace_id, parent_id, sampled = parent.trace_id, parent.span_id, parent.sampled
+        return Span(self, trace_id, f'{random.getrandbits(64):016x}', parent_id, sampled, name, kind, attributes)
+
+    @contextmanager
+    def span(self, name, kind='internal', attributes=None, parent=None):
+        """Run a block as the current span."""
+        span = self.start_span(name, kind, parent, attributes)
+        token = _current.set(span)
+        try:
+            yield span
+        except Exception as e:
+            span.status = 'error'
+            span.set_attribute('error', str(e))
+            raise
+        finally:
+            _current.reset(token)
+            span.end()
+
+
+class InMemoryExporter:
+    def __init__(self):
+        self.spans = []
+
+    def export(self, spans):
+        self.spans.extend(span.to_dict() for span in spans)
+
+
+class FileExporter:
+    """Appends one JSON object per span to ``path``; a local collector for development."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, spans):
+        lines = ''.join(json.dumps(span.to_dict(), separators=(',', ':')) + '\n' for span in spans)
+        with self._lock, open(self.path, 'a') as file:
+            file.write(lines)
+
+
+class BatchSpanProcessor:
+    def __init__(self, exporter, interval=5, batch_size=512, max_queue=2048):
+        self.exporter = exporter
+        self.interval = interval
+        self.batch_size = batch_size
+        self.max_queue = max_queue
+        self.dropped = 0
+        self._lock = threading.Lock()
+        self._queue = []
+        self._wake = threading.Event()
+        self._thread = None
+        self._thread_pid = None
+
+    def on_end(self, span):
+        if self.interval <= 0:
+            self._export([span])
+            return
+        with self._lock:
+            if len(self._queue) >= self.max_queue:
+                self.dropped += 1
+                return
+            self._queue.append(span)
+            full = len(self._queue) >= self.batch_size
+        self._ensure_running()
+        if full:
+            self._wake.set()
+
+    def _ensure_running(self):
+        # A worker forked from a preloaded parent has no export thread yet
+        if self._thread is not None and self._thread_pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is None or self._thread_pid != os.getpid():
+                self._thread = threading.Thread(target=self._run, name='trace-exporter', daemon=True)
+                self._thread_pid = os.getpid()
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self):
+        while True:
+            with self._lock:
+                batch, self._queue = self._queue[:self.batch_size], self._queue[self.batch_size:]
+            if not batch:
+                return
+            self._export(batch)
+
+    def _export(self, spans):
+        try:
+            self.exporter.export(spans)
+        except Exception as e:
+            logger.error(f"Error exporting {len(spans)} spans: {str(e)}")
+
+
+def message_attributes(attributes=None):
+    """SNS/SQS ``MessageAttributes`` carrying the current trace context."""
+    attributes = dict(attributes or {})
+    span = _current.get()
+    if span is not None:
+        attributes['traceparent'] = {'DataType': 'String', 'StringValue': span.traceparent()}
+    return attributes
+
+
+def extract_message_context(message):
+    """SpanContext from an SQS message, raw or wrapping an SNS notification."""
+    attribute = (message.get('MessageAttributes') or {}).get('traceparent')
+    if attribute:
+        return parse_traceparent(attribute.get('StringValue'))
+    try:
+        body = json.loads(message.get('Body') or '')
+    except ValueError:
+        return None
+    attribute = (body.get('MessageAttributes') or {}).get('traceparent') if isinstance(body, dict) else None
+    return parse_traceparent(attribute.get('Value')) if attribute else None
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    parent = _current.get()
+    if parent is not None and parent.recording:
+        span = parent.tracer.start_span('db.query', 'client', parent, {'db.statement': statement[:500]})
+        conn.info.setdefault('trace_spans', []).append(span)
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    spans = conn.info.get('trace_spans')
+    if spans:
+        spans.pop().end()
+
+
+def _handle_error(exception_context):
+    connection = exception_context.connection
+    spans = connection.info.get('trace_spans') if connection is not None else None
+    if spans:
+        span = spans.pop()
+        span.status = 'error'
+        span.set_attribute('error', str(exception_context.original_exception))
+        span.end()
+
+
+def _traced_send(send):
+    def traced(session, prepared, **kwargs):
+        parent = _current.get()
+        if parent is None:
+            return send(session, prepared, **kwargs)
+        span = parent.tracer.start_span(f'{prepared.method} {urlparse(prepared.url).hostname}', 'client', parent,
+                                        {'http.method': prepared.method, 'http.url': prepared.url})
+        prepared.headers['traceparent'] = span.traceparent()
+        try:
+            response = send(session, prepared, **kwargs)
+            span.set_attribute('http.status_code', response.status_code)
+            if response.status_code >= 500:
+                span.status = 'error'
+            return response
+        except Exception as e:
+            span.status = 'error'
+            span.set_attribute('error', str(e))
+            raise
+        finally:
+            span.end()
+    traced.traced = True
+    return traced
+
+
+def _install_hooks():
+    global _hooks_installed
+    with _hooks_lock:
+        if _hooks_installed:
+            return
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        event.listen(Engine, 'handle_error', _handle_error)
+        if not getattr(requests.Session.send, 'traced', False):
+            requests.Session.send = _traced_send(requests.Session.send)
+        _hooks_installed = True
+
+
+def init_tracing(app, service_name):
+    _install_hooks()
+    tracer = app.extensions['tracer'] = Tracer.from_config(app, service_name)
+
+    @app.before_request
+    def start_request_span():
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        span = tracer.start_span(f'{request.method} {route}', 'server',
+                                 parse_traceparent(request.headers.get('traceparent')),
+                                 {'http.method': request.method, 'http.route': route})
+        g.trace_span = span
+        g.trace_token = _current.set(span)
+
+    @app.after_request
+    def tag_request_span(response):
+        span = g.get('trace_span')
+        if span is not None:
+            span.set_attribute('http.status_code', response.status_code)
+            if response.status_code >= 500:
+                span.status = 'error'
+        return response
+
+    @app.teardown_request
+    def end_request_span(exc):
+        span = g.pop('trace_span', None)
+        if span is not None:
+            if exc is not None:
+                span.status = 'error'
+                span.set_attribute('error', str(exc))
+            try:
+                _current.reset(g.pop('trace_token'))
+            except ValueError:
+                # Torn down in another context, e.g. after a streamed body
+                _current.set(None)
+            span.end()
+
+    return tracer
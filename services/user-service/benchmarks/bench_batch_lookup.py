@@ -0,0 +1,80 @@
+"""Resolving 1k users: one batch request vs one request per user.
+
+Usage:
+    python benchmarks/bench_batch_lookup.py --users 5000 --ids 1000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import event
+
+from app import create_app, db
+from app.models import Role, User
+
+HEADERS = {'X-Service-Token': 'test-service-token'}
+
+
+def seed(count):
+    now = datetime.utcnow()
+    role_ids = [role.id for role in Role.query.all()]
+    db.session.execute(User.__table__.insert(), [
+        {
+            'email': f'user{i}@example.com', 'password_hash': 'x', 'first_name': f'First{i}',
+            'last_name': f'Last{i}', 'phone_number': '0200000000', 'role_id': role_ids[i % len(role_ids)],
+            'created_at': now, 'updated_at': now
+        }
+        for i in range(count)
+    ])
+    db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--users', type=int, default=5000)
+    parser.add_argument('--ids', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    app = create_app('test')
+    client = app.test_client()
+    with app.app_context():
+        seed(args.users)
+        ids = random.Random(7).sample(range(1, args.users + 1), args.ids)
+
+        statements = []
+        event.listen(db.engine, 'before_cursor_execute', lambda *a: statements.append(1))
+
+        def measure(label, fn, repeat):
+            statements.clear()
+            start = time.perf_counter()
+            for _ in range(repeat):
+                fn()
+            elapsed = (time.perf_counter() - start) / repeat
+            print(f'{label:<28} {elapsed * 1000:10.2f}ms  {len(statements) / repeat:7.0f} queries')
+
+        def one_by_one():
+            for user_id in ids:
+                assert client.get(f'/api/users?ids={user_id}', headers=HEADERS).status_code == 200
+
+        def batch_get():
+            response = client.get('/api/users?ids=' + ','.join(map(str, ids)), headers=HEADERS)
+            assert len(response.get_json()['users']) == len(ids)
+
+        def batch_post():
+            response = client.post('/api/users/batch', json={'ids': ids}, headers=HEADERS)
+            assert len(response.get_json()['users']) == len(ids)
+
+        print(f'{args.users} users, resolving {args.ids} ids')
+        measure('one request per id', one_by_one, 1)
+        measure('GET /api/users?ids=', batch_get, args.repeat)
+        measure('POST /api/users/batch', batch_post, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
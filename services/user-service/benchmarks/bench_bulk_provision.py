@@ -0,0 +1,81 @@
+"""Bulk provisioning throughput vs one register call per user.
+
+Password hashing dominates with the production scrypt parameters, so the
+pipeline is measured twice: once with the real hash method on a smaller batch,
+and once with a deliberately cheap method to show the cost of everything else
+(parsing, dedupe query, batched inserts) at full size.
+
+Usage:
+    python benchmarks/bench_bulk_provision.py --users 100000 --scrypt-users 400 --register-users 200 --workers 1
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import create_app, db
+from app.hashing import PasswordHasher
+from app.models import User
+
+HEADERS = {'X-Service-Token': 'test-service-token'}
+CHEAP_METHOD = 'pbkdf2:sha256:1'
+
+
+def ndjson(count, prefix):
+    for i in range(count):
+        yield (json.dumps({
+            'email': f'{prefix}{i}@example.com', 'password': f'password-{i}', 'first_name': 'Bulk',
+            'last_name': f'User{i}', 'phone_number': '0200000000', 'role': 'delivery_person'
+        }) + '\n').encode('utf-8')
+
+
+def run_bulk(users, method, workers, prefix):
+    app = create_app('test')
+    app.extensions['password_hasher'] = PasswordHasher(workers=workers, method=method)
+    client = app.test_client()
+    start = time.perf_counter()
+    response = client.post('/api/users/bulk', data=b''.join(ndjson(users, prefix)),
+                           content_type='application/x-ndjson', headers=HEADERS)
+    summary = json.loads(response.get_data(as_text=True).splitlines()[-1])['summary']
+    elapsed = time.perf_counter() - start
+    app.extensions['password_hasher'].shutdown()
+    assert summary['created'] == users, summary
+    with app.app_context():
+        assert db.session.query(User).count() == users
+    return elapsed
+
+
+def run_register(users, method, prefix):
+    app = create_app('test')
+    app.extensions['password_hasher'] = PasswordHasher(workers=0, method=method)
+    client = app.test_client()
+    start = time.perf_counter()
+    for line in ndjson(users, prefix):
+        assert client.post('/api/users/register', data=line, content_type='application/json').status_code == 201
+    return time.perf_counter() - start
+
+
+def report(label, users, elapsed):
+    print(f'{label:<46} {users:7d} users {elapsed:9.2f}s {users / elapsed:10.1f} users/s')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--users', type=int, default=100000)
+    parser.add_argument('--scrypt-users', type=int, default=400)
+    parser.add_argument('--register-users', type=int, default=200)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    print(f'{os.cpu_count()} CPU(s), hashing pool workers={args.workers}')
+    report('register loop, scrypt', args.register_users, run_register(args.register_users, 'scrypt', 'r'))
+    report('bulk, scrypt', args.scrypt_users, run_bulk(args.scrypt_users, 'scrypt', args.workers, 's'))
+    report(f'register loop, {CHEAP_METHOD}', args.register_users, run_register(args.register_users, CHEAP_METHOD, 'rc'))
+    report(f'bulk, {CHEAP_METHOD}', args.users, run_bulk(args.users, CHEAP_METHOD, args.workers, 'c'))
+
+
+if __name__ == '__main__':
+    main()
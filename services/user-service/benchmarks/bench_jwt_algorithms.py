@@ -0,0 +1,58 @@
+"""Signing and verification cost of candidate JWT algorithms.
+
+Verification runs on every authenticated request in every service, so it is
+the number that matters; signing only happens at login.
+
+Usage:
+    python benchmarks/bench_jwt_algorithms.py --iterations 2000
+"""
+import argparse
+import os
+import time
+from datetime import datetime, timedelta
+
+import jwt
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519, rsa
+
+
+def candidates():
+    yield 'HS256', 'x' * 32, 'x' * 32
+    for bits in (2048, 3072):
+        key = rsa.generate_private_key(public_exponent=65537, key_size=bits)
+        yield f'RS256 ({bits})', key, key.public_key()
+    key = ec.generate_private_key(ec.SECP256R1())
+    yield 'ES256', key, key.public_key()
+    key = ed25519.Ed25519PrivateKey.generate()
+    yield 'EdDSA (Ed25519)', key, key.public_key()
+
+
+def per_op(fn, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--iterations', type=int, default=2000)
+    args = parser.parse_args()
+
+    now = datetime.utcnow()
+    claims = {
+        'sub': '42', 'type': 'access', 'fresh': False, 'jti': 'bench', 'iat': now, 'nbf': now,
+        'exp': now + timedelta(days=1), 'role': 'customer', 'email': 'bench@example.com',
+        'first_name': 'Bench', 'last_name': 'User'
+    }
+    print(f'{os.cpu_count()} CPU(s), {args.iterations} iterations')
+    print(f'{"algorithm":<18} {"sign":>10} {"verify":>10} {"token bytes":>12}')
+    for label, signing_key, verifying_key in candidates():
+        algorithm = label.split()[0]
+        token = jwt.encode(claims, signing_key, algorithm=algorithm, headers={'kid': 'k1'})
+        sign = per_op(lambda: jwt.encode(claims, signing_key, algorithm=algorithm, headers={'kid': 'k1'}), args.iterations)
+        verify = per_op(lambda: jwt.decode(token, verifying_key, algorithms=[algorithm]), args.iterations)
+        print(f'{label:<18} {sign:8.1f}us {verify:8.1f}us {len(token):12d}')
+
+
+if __name__ == '__main__':
+    main()
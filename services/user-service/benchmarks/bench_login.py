@@ -0,0 +1,84 @@
+"""Login throughput and cheap-request latency with inline vs pooled hashing.
+
+Runs logins from several threads against one app while another thread keeps
+hitting a cheap endpoint, once with hashing inline and once with the process
+pool, and reports login throughput and the cheap endpoint's latency.
+
+Usage:
+    python benchmarks/bench_login.py --threads 8 --logins 64 --workers 0 2
+"""
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import create_app, db
+from app.hashing import PasswordHasher
+from app.models import Role, User
+
+
+def run(workers, threads, logins):
+    app = create_app('test')
+    hasher = PasswordHasher(workers=workers, max_pending=threads * 2)
+    app.extensions['password_hasher'] = hasher
+    with app.app_context():
+        role = Role.query.filter_by(name='customer').first()
+        user = User(email='bench@example.com', first_name='B', last_name='U', role_id=role.id)
+        user.set_password('password123')
+        db.session.add(user)
+        db.session.commit()
+        # Warm the pool so process start-up is not counted
+        hasher.verify(user.password_hash, 'password123')
+
+    done = threading.Event()
+    probe_latencies = []
+
+    def probe():
+        client = app.test_client()
+        while not done.is_set():
+            start = time.perf_counter()
+            client.get('/api/users/metrics/password-hashing')
+            probe_latencies.append(time.perf_counter() - start)
+            time.sleep(0.005)
+
+    def login(_):
+        response = app.test_client().post('/api/users/login', json={
+            'email': 'bench@example.com', 'password': 'password123'
+        })
+        assert response.status_code == 200, response.status_code
+
+    prober = threading.Thread(target=probe)
+    prober.start()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        list(pool.map(login, range(logins)))
+    elapsed = time.perf_counter() - start
+    done.set()
+    prober.join()
+    hasher.shutdown()
+
+    probe_latencies.sort()
+    p95 = probe_latencies[int(len(probe_latencies) * 0.95) - 1]
+    print(f'workers={workers:<3} {logins / elapsed:8.1f} logins/s   '
+          f'cheap request p50 {statistics.median(probe_latencies) * 1000:7.2f}ms  p95 {p95 * 1000:7.2f}ms')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--logins', type=int, default=64)
+    parser.add_argument('--workers', type=int, nargs='+', default=[0, os.cpu_count() or 1])
+    args = parser.parse_args()
+
+    print(f'{os.cpu_count()} CPU(s), {args.threads} request threads, {args.logins} logins')
+    for workers in args.workers:
+        run(workers, args.threads, args.logins)
+
+
+if __name__ == '__main__':
+    main()
@@ -8,6 +8,8 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from app import create_app, db
 from app.models import User, Role
 
+pytest_plugins = ['app.query_budget']
+
 @pytest.fixture(scope='session')
 def app():
     test_config = {
@@ -1,3 +1,4 @@
+import json
 import pytest
 import sys
 import os
@@ -82,4 +83,317 @@ def test_get_profile(client):
     data = response.get_json()
     assert data['email'] == 'test@example.com'
     assert data['first_name'] == 'Test'
-    assert data['last_name'] == 'User' 
\ No newline at end of file
+    assert data['last_name'] == 'User'
+
+
+def test_login_upgrades_legacy_password_hash(app, client):
+    from werkzeug.security import generate_password_hash
+    from app.models import Role
+
+    user = User(email='legacy@example.com', first_name='Legacy', last_name='User',
+                role_id=Role.query.filter_by(name='customer').first().id)
+    user.password_hash = generate_password_hash('password123', 'pbkdf2:sha256:1000')
+    db.session.add(user)
+    db.session.commit()
+
+    response = client.post('/api/users/login', json={
+        'email': 'legacy@example.com',
+        'password': 'password123'
+    })
+
+    assert response.status_code == 200
+    db.session.refresh(user)
+    assert user.password_hash.startswith('scrypt:')
+    assert user.check_password('password123')
+
+def test_login_returns_503_when_hashing_is_saturated(app, client, monkeypatch):
+    from app.hashing import PasswordHasher
+
+    client.post('/api/users/register', json={
+        'email': 'test@example.com',
+        'password': 'password123',
+        'first_name': 'Test',
+        'last_name': 'User',
+        'role': 'customer'
+    })
+    monkeypatch.setitem(app.extensions, 'password_hasher', PasswordHasher(max_pending=0))
+
+    response = client.post('/api/users/login', json={
+        'email': 'test@example.com',
+        'password': 'password123'
+    })
+
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '1'
+    assert app.extensions['password_hasher'].stats()['rejected'] == 1
+
+def test_password_hasher_process_pool():
+    from app.hashing import PasswordHasher
+
+    hasher = PasswordHasher(workers=1, method='pbkdf2:sha256:1000')
+    try:
+        pwhash = hasher.hash('password123')
+        assert hasher.verify(pwhash, 'password123')
+        assert not hasher.verify(pwhash, 'wrong')
+        assert not hasher.needs_rehash(pwhash)
+        assert hasher.stats()['completed'] == 3
+        hashes = hasher.hash_many(['a', 'b', 'c'])
+        assert [hasher.verify(pwhash, password) for pwhash, password in zip(hashes, 'abc')] == [True] * 3
+    finally:
+        hasher.shutdown()
+
+def _register(client, email):
+    return client.post('/api/users/register', json={
+        'email': email,
+        'password': 'password123',
+        'first_name': 'Test',
+        'last_name': 'User',
+        'role': 'customer'
+    }).get_json()['id']
+
+def test_batch_lookup_requires_service_token(client):
+    user_id = _register(client, 'test@example.com')
+
+    assert client.get(f'/api/users?ids={user_id}').status_code == 401
+    response = client.get(f'/api/users?ids={user_id}', headers={'X-Service-Token': 'wrong'})
+    assert response.status_code == 401
+
+def test_password_hashing_metrics_require_service_token(client):
+    assert client.get('/api/users/metrics/password-hashing').status_code == 401
+    response = client.get('/api/users/metrics/password-hashing', headers={'X-Service-Token': 'test-service-token'})
+    assert response.status_code == 200
+    assert 'pending' in response.get_json()
+
+def test_batch_lookup(client):
+    first = _register(client, 'first@example.com')
+    second = _register(client, 'second@example.com')
+    headers = {'X-Service-Token': 'test-service-token'}
+
+    response = client.get(f'/api/users?ids={second},{first},{second},999999', headers=headers)
+    assert response.status_code == 200
+    data = response.get_json()
+    assert [user['id'] for user in data['users']] == [second, first]
+    assert data['users'][0] == {
+        'id': second, 'email': 'second@example.com', 'first_name': 'Test',
+        'last_name': 'User', 'phone_number': None, 'role': 'customer'
+    }
+    assert data['missing'] == [999999]
+    assert response.headers['Cache-Control'].startswith('private, max-age=')
+
+    cached = client.get(f'/api/users?ids={second},{first},{second},999999',
+                        headers={**headers, 'If-None-Match': response.headers['ETag']})
+    assert cached.status_code == 304
+
+    response = client.post('/api/users/batch', json={'ids': [first]}, headers=headers)
+    assert response.status_code == 200
+    assert [user['email'] for user in response.get_json()['users']] == ['first@example.com']
+
+    assert client.post('/api/users/batch', json={'ids': ['x']}, headers=headers).status_code == 400
+    assert client.post('/api/users/batch', json={'ids': list(range(1001))}, headers=headers).status_code == 400
+
+def test_user_serialization_uses_one_query(app, client):
+    from sqlalchemy import event
+
+    for i in range(5):
+        _register(client, f'user{i}@example.com')
+    db.session.expire_all()
+
+    statements = []
+    def count(conn, cursor, statement, *args):
+        statements.append(statement)
+    event.listen(db.engine, 'before_cursor_execute', count)
+    try:
+        users = [user.to_dict() for user in User.query.all()]
+        serialization_statements = len(statements)
+        response = client.post('/api/users/register', json={
+            'email': 'new@example.com',
+            'password': 'password123',
+            'first_name': 'Test',
+            'last_name': 'User',
+            'role': 'customer'
+        })
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', count)
+
+    assert len(users) == 5 and {user['role'] for user in users} == {'customer'}
+    assert response.status_code == 201
+    assert serialization_statements == 1
+    # Signup never queries the roles table
+    assert not any(s.lstrip().upper().startswith('SELECT ROLES') for s in statements)
+
+def test_role_cache_refreshes_on_change(app):
+    from app.models import Role
+    from app.roles import role_id, role_name
+
+    role = Role(name='support')
+    db.session.add(role)
+    db.session.commit()
+    try:
+        assert role_id('support') == role.id
+        assert role_name(role.id) == 'support'
+    finally:
+        db.session.delete(role)
+        db.session.commit()
+    assert role_id('support') is None
+
+def test_logout_revokes_token(client):
+    _register(client, 'test@example.com')
+    access_token = client.post('/api/users/login', json={
+        'email': 'test@example.com',
+        'password': 'password123'
+    }).get_json()['access_token']
+    headers = {'Authorization': f'Bearer {access_token}'}
+
+    assert client.post('/api/users/logout', headers=headers).status_code == 200
+
+    response = client.get('/api/users/profile', headers=headers)
+    assert response.status_code == 401
+    assert response.get_json()['error'] == 'Token has been revoked'
+
+    feed = client.get('/api/users/revocations?since=0', headers={'X-Service-Token': 'test-service-token'})
+    assert feed.status_code == 200
+    assert len(feed.get_json()['revocations']) == 1
+
+def test_revocation_list_sync():
+    from datetime import datetime, timedelta
+    from app.revocation import RevocationList
+
+    now = datetime.utcnow()
+    feed = [
+        {'id': 1, 'jti': 'revoked', 'expires_at': (now + timedelta(hours=1)).isoformat()},
+        {'id': 2, 'jti': 'expired', 'expires_at': (now - timedelta(hours=1)).isoformat()}
+    ]
+    calls = []
+    def fetch(since_id):
+        calls.append(since_id)
+        return [entry for entry in feed if entry['id'] > since_id]
+
+    revocations = RevocationList(fetch=fetch, capacity=10)
+    revocations.sync()
+
+    assert calls == [0, 2]
+    assert revocations.is_revoked('revoked')
+    assert not revocations.is_revoked('expired')
+    assert not revocations.is_revoked('valid')
+    for i in range(20):
+        revocations.add(f'jti-{i}')
+    assert all(revocations.is_revoked(f'jti-{i}') for i in range(20))
+
+def test_revocation_sync_picks_up_late_commits():
+    from app.revocation import RevocationList
+
+    feed = [{'id': 1, 'jti': 'a', 'expires_at': None}, {'id': 3, 'jti': 'c', 'expires_at': None}]
+    def fetch(since_id):
+        return [entry for entry in feed if entry['id'] > since_id]
+
+    revocations = RevocationList(fetch=fetch, overlap=10)
+    revocations.sync()
+    # id 2 was assigned before id 3 but committed after the first sync read past it
+    feed.insert(1, {'id': 2, 'jti': 'b', 'expires_at': None})
+    revocations.sync()
+
+    assert revocations.is_revoked('b')
+    assert len(revocations) == 3
+
+def test_revocation_check_waits_for_first_sync(app):
+    import threading
+    from app.revocation import RevocationList
+
+    released = threading.Event()
+    def fetch(since_id):
+        released.wait(5)
+        return [{'id': 1, 'jti': 'revoked-before-restart', 'expires_at': None}] if since_id == 0 else []
+
+    revocations = RevocationList(fetch=fetch, sync_seconds=60, initial_sync_timeout=5)
+    with app.app_context():
+        threading.Timer(0.1, released.set).start()
+        assert revocations.is_revoked('revoked-before-restart')
+
+def test_asymmetric_signing_and_jwks():
+    import jwt as pyjwt
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import ed25519
+    from flask_jwt_extended import create_access_token
+    from app import create_app, jwt
+    from app.keys import init_signing
+
+    signing_app = create_app('test')
+    signing_app.config['JWT_SIGNING_KEY'] = ed25519.Ed25519PrivateKey.generate().private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    )
+    signing_app.config['JWT_SIGNING_ALGORITHM'] = 'EdDSA'
+    try:
+        init_signing(signing_app, jwt)
+        with signing_app.app_context():
+            token = create_access_token(identity='1')
+
+        header = pyjwt.get_unverified_header(token)
+        assert header['alg'] == 'EdDSA'
+
+        client = signing_app.test_client()
+        jwks = client.get('/api/users/.well-known/jwks.json').get_json()
+        assert [key['kid'] for key in jwks['keys']] == [header['kid']]
+        public_key = pyjwt.PyJWK(jwks['keys'][0]).key
+        assert pyjwt.decode(token, public_key, algorithms=['EdDSA'])['sub'] == '1'
+
+        # Tokens signed with the old shared secret are no longer accepted
+        forged = pyjwt.encode({'sub': '1', 'type': 'access', 'jti': 'x', 'fresh': False},
+                              'super-secret-jwt-key-123', algorithm='HS256')
+        response = client.get('/api/users/profile', headers={'Authorization': f'Bearer {forged}'})
+        assert response.status_code == 422
+    finally:
+        signing_app.extensions['signing_keys'] = None
+
+def test_bulk_provisioning(client):
+    existing = _register(client, 'existing@example.com')
+    rows = [
+        {'email': 'courier1@example.com', 'password': 'pw1', 'first_name': 'A', 'last_name': 'B', 'role': 'delivery_person'},
+        {'email': 'existing@example.com', 'password': 'pw2', 'first_name': 'C', 'last_name': 'D', 'role': 'customer'},
+        {'email': 'courier1@example.com', 'password': 'pw3', 'first_name': 'E', 'last_name': 'F', 'role': 'delivery_person'},
+        {'email': 'bad@example.com', 'password': 'pw4', 'first_name': 'G', 'role': 'pilot'},
+        {'email': 'staff@example.com', 'password': 'pw5', 'first_name': 'H', 'last_name': 'I', 'role': 'restaurant_owner'}
+    ]
+    body = '\n'.join(json.dumps(row) for row in rows) + '\n{not json\n'
+
+    response = client.post('/api/users/bulk', data=body, content_type='application/x-ndjson',
+                           headers={'X-Service-Token': 'test-service-token'})
+
+    assert response.status_code == 200
+    results = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert [result.get('status') for result in results[:-1]] == ['created', 'exists', 'failed', 'failed', 'created', 'failed']
+    assert results[3]['errors'] == {'missing_fields': ['last_name'], 'role': 'Invalid role'}
+    assert results[-1] == {'summary': {'processed': 6, 'created': 2, 'exists': 1, 'failed': 3}}
+
+    login = client.post('/api/users/login', json={'email': 'courier1@example.com', 'password': 'pw1'})
+    assert login.status_code == 200
+    assert login.get_json()['user']['role'] == 'delivery_person'
+    assert db.session.get(User, existing).first_name == 'Test'
+
+def test_bulk_provisioning_chunk_lost_race_entirely(client, monkeypatch):
+    from app import provisioning
+    _register(client, 'first@example.com')
+    _register(client, 'second@example.com')
+    # Both accounts appear between the existence check and the INSERT
+    existing_emails = provisioning._existing_emails
+    calls = []
+
+    def existing_after_first_check(emails):
+        calls.append(emails)
+        return set() if len(calls) == 1 else existing_emails(emails)
+
+    monkeypatch.setattr(provisioning, '_existing_emails', existing_after_first_check)
+    rows = [{'email': email, 'password': 'pw', 'first_name': 'A', 'last_name': 'B', 'role': 'customer'}
+            for email in ('first@example.com', 'second@example.com')]
+
+    response = client.post('/api/users/bulk', data='\n'.join(json.dumps(row) for row in rows),
+                           content_type='application/x-ndjson', headers={'X-Service-Token': 'test-service-token'})
+
+    assert response.status_code == 200
+    results = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert [result.get('status') for result in results[:-1]] == ['exists', 'exists']
+    assert len(calls) == 2
+    assert User.query.count() == 2
+
+def test_bulk_provisioning_requires_service_token(client):
+    response = client.post('/api/users/bulk', data='{}', content_type='application/x-ndjson')
+    assert response.status_code == 401